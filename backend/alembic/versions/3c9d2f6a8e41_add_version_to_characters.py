@@ -0,0 +1,28 @@
+"""add version to characters
+
+Revision ID: 3c9d2f6a8e41
+Revises: e1a7c4f9b2d6
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9d2f6a8e41'
+down_revision: Union[str, Sequence[str], None] = 'e1a7c4f9b2d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("characters") as b:
+        b.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("characters") as b:
+        b.drop_column("version")
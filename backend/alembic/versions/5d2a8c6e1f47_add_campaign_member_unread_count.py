@@ -0,0 +1,44 @@
+"""add campaign_members.unread_count
+
+Revision ID: 5d2a8c6e1f47
+Revises: 7b5e1d3c9a02
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8c6e1f47'
+down_revision: Union[str, Sequence[str], None] = '7b5e1d3c9a02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("campaign_members") as b:
+        b.add_column(sa.Column("unread_count", sa.Integer(), nullable=False, server_default="0"))
+
+    # backfill with what count_unread_campaign_messages used to compute on the
+    # fly (minus the sender's own messages, which send_campaign_message skips)
+    op.execute(
+        """
+        UPDATE campaign_members SET unread_count = (
+            SELECT count(*) FROM campaign_messages
+            WHERE campaign_messages.campaign_id = campaign_members.campaign_id
+              AND campaign_messages.sender_user_id != campaign_members.user_id
+              AND (campaign_messages.target_user_id IS NULL
+                   OR campaign_messages.target_user_id = campaign_members.user_id)
+              AND (campaign_members.last_read_at IS NULL
+                   OR campaign_messages.created_at > campaign_members.last_read_at)
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("campaign_members") as b:
+        b.drop_column("unread_count")
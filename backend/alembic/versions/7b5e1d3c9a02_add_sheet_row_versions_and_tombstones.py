@@ -0,0 +1,57 @@
+"""add per-row sheet versions and sheet_tombstones
+
+Revision ID: 7b5e1d3c9a02
+Revises: 3c9d2f6a8e41
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b5e1d3c9a02'
+down_revision: Union[str, Sequence[str], None] = '3c9d2f6a8e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_CHILD_TABLES = ("items", "spells", "abilities", "states", "summons", "equipment")
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("characters") as b:
+        b.add_column(sa.Column("fields_version", sa.Integer(), nullable=False, server_default="0"))
+        b.add_column(sa.Column("custom_version", sa.Integer(), nullable=False, server_default="0"))
+
+    for table in _CHILD_TABLES:
+        with op.batch_alter_table(table) as b:
+            b.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+
+    op.create_table(
+        "sheet_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("character_id", sa.Integer(), sa.ForeignKey("characters.id"), nullable=False),
+        sa.Column("kind", sa.String(length=20), nullable=False),
+        sa.Column("row_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.create_index(
+        "ix_sheet_tombstones_character_id",
+        "sheet_tombstones",
+        ["character_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sheet_tombstones_character_id", table_name="sheet_tombstones")
+    op.drop_table("sheet_tombstones")
+
+    for table in _CHILD_TABLES:
+        with op.batch_alter_table(table) as b:
+            b.drop_column("version")
+
+    with op.batch_alter_table("characters") as b:
+        b.drop_column("custom_version")
+        b.drop_column("fields_version")
@@ -0,0 +1,29 @@
+"""add (campaign_id, created_at, id) index on campaign_messages
+
+Revision ID: a4f1c7e93b25
+Revises: 5d2a8c6e1f47
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f1c7e93b25'
+down_revision: Union[str, Sequence[str], None] = '5d2a8c6e1f47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_campaign_messages_campaign_created_id",
+        "campaign_messages",
+        ["campaign_id", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_campaign_messages_campaign_created_id", table_name="campaign_messages")
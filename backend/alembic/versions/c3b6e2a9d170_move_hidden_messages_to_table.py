@@ -0,0 +1,92 @@
+"""move campaign_members.hidden_message_ids into campaign_hidden_messages
+
+Revision ID: c3b6e2a9d170
+Revises: a4f1c7e93b25
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b6e2a9d170'
+down_revision: Union[str, Sequence[str], None] = 'a4f1c7e93b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_members = sa.table(
+    "campaign_members",
+    sa.column("id", sa.Integer),
+    sa.column("campaign_id", sa.Integer),
+    sa.column("hidden_message_ids", sa.Text),
+)
+_messages = sa.table(
+    "campaign_messages",
+    sa.column("id", sa.Integer),
+    sa.column("campaign_id", sa.Integer),
+)
+_hidden = sa.table(
+    "campaign_hidden_messages",
+    sa.column("member_id", sa.Integer),
+    sa.column("message_id", sa.Integer),
+)
+
+
+def _parse_ids(raw: str | None) -> set[int]:
+    try:
+        data = json.loads(raw) if raw else []
+    except ValueError:
+        return set()
+    if not isinstance(data, list):
+        return set()
+    return {i for i in data if isinstance(i, int)}
+
+
+def upgrade() -> None:
+    op.create_table(
+        "campaign_hidden_messages",
+        sa.Column("member_id", sa.Integer(), sa.ForeignKey("campaign_members.id"), primary_key=True),
+        sa.Column("message_id", sa.Integer(), sa.ForeignKey("campaign_messages.id"), primary_key=True),
+    )
+
+    bind = op.get_bind()
+    message_campaign = dict(bind.execute(sa.select(_messages.c.id, _messages.c.campaign_id)).all())
+    rows = []
+    for member_id, campaign_id, raw in bind.execute(
+        sa.select(_members.c.id, _members.c.campaign_id, _members.c.hidden_message_ids)
+    ):
+        # ids of deleted messages or of another campaign's messages never matched anything
+        rows += [
+            {"member_id": member_id, "message_id": message_id}
+            for message_id in sorted(_parse_ids(raw))
+            if message_campaign.get(message_id) == campaign_id
+        ]
+    if rows:
+        op.bulk_insert(_hidden, rows)
+
+    with op.batch_alter_table("campaign_members") as b:
+        b.drop_column("hidden_message_ids")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("campaign_members") as b:
+        b.add_column(sa.Column("hidden_message_ids", sa.Text(), nullable=False, server_default=""))
+    with op.batch_alter_table("campaign_members") as b:
+        b.alter_column("hidden_message_ids", server_default=None)
+
+    bind = op.get_bind()
+    hidden: dict[int, list[int]] = {}
+    for member_id, message_id in bind.execute(
+        sa.select(_hidden.c.member_id, _hidden.c.message_id).order_by(_hidden.c.message_id)
+    ):
+        hidden.setdefault(member_id, []).append(message_id)
+    for member_id, ids in hidden.items():
+        bind.execute(
+            _members.update().where(_members.c.id == member_id).values(hidden_message_ids=json.dumps(ids))
+        )
+
+    op.drop_table("campaign_hidden_messages")
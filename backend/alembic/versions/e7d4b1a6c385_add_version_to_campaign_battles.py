@@ -0,0 +1,28 @@
+"""add version to campaign_battles
+
+Revision ID: e7d4b1a6c385
+Revises: c3b6e2a9d170
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d4b1a6c385'
+down_revision: Union[str, Sequence[str], None] = 'c3b6e2a9d170'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("campaign_battles") as b:
+        b.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("campaign_battles") as b:
+        b.drop_column("version")
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .config import settings
+
+
+@dataclass(frozen=True)
+class CharacterHandle:
+    """What a character-scoped route gets when it only needs to know that the
+    caller may touch {ch_id} — no ORM row, no session attached."""
+    id: int
+    owner_user_id: int
+    campaign_id: int | None
+
+
+class AccessCache:
+    """Short-lived cache of positive access decisions, keyed by
+    (user_id, character_id) — see deps.get_character_handle.
+
+    Owner and global-DM grants only go away with the character; campaign-DM
+    grants go away when the character leaves the campaign or the campaign
+    is deleted. crud invalidates on exactly those changes, and the TTL
+    bounds anything that slips past (another worker's change, a race with
+    an uncommitted write) — for reads: deps only consults the cache on GET.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, int], tuple[float, CharacterHandle]] = OrderedDict()
+
+    def get(self, user_id: int, character_id: int) -> CharacterHandle | None:
+        key = (user_id, character_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, user_id: int, handle: CharacterHandle) -> None:
+        key = (user_id, handle.id)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, handle)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_character(self, character_id: int) -> None:
+        for key in [k for k in self._entries if k[1] == character_id]:
+            del self._entries[key]
+
+    def invalidate_campaign(self, campaign_id: int) -> None:
+        for key in [k for k, (_, h) in self._entries.items() if h.campaign_id == campaign_id]:
+            del self._entries[key]
+
+
+access_cache = AccessCache(
+    ttl_seconds=settings.ACCESS_CACHE_TTL_SECONDS,
+    max_entries=settings.ACCESS_CACHE_MAX_ENTRIES,
+)
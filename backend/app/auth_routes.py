@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
 from .db import get_db
+from .deps import run_write
 from . import crud
 from .rate_limit import rate_limit
 from .security import (
@@ -19,7 +20,7 @@ from .security import (
 )
 from .vk_oauth import build_vk_authorize_url, exchange_vk_code, generate_pkce_pair
 
-router = APIRouter()
+router = APIRouter(prefix="/api/auth")
 
 
 class TelegramLoginIn(BaseModel):
@@ -102,8 +103,9 @@ async def vk_callback(
     except ValueError:
         raise HTTPException(401, "VK login failed")
 
-    await crud.get_or_create_user_by_vk(
-        db, vk_id=profile["vk_id"], first_name=profile["first_name"], username=profile["username"]
+    await run_write(
+        db, crud.get_or_create_user_by_vk,
+        vk_id=profile["vk_id"], first_name=profile["first_name"], username=profile["username"],
     )
 
     token = create_session_cookie(
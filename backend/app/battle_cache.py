@@ -0,0 +1,135 @@
+from collections import OrderedDict
+
+from .config import settings
+from .models import CampaignBattle
+from .write_behind import combat_buffer
+
+
+def battle_version(campaign_id: int, version: int) -> int:
+    """The battle version clients see and long-poll on: CampaignBattle.version,
+    plus — with the write-behind buffer on — the campaign's buffer generation,
+    so hp/mana parked in combat_buffer change it without a write. That term is
+    per process, which the buffer already requires (a single worker, checked
+    when it starts). 0 (no battle) stays 0."""
+    if not version or not combat_buffer.enabled:
+        return version
+    return version + combat_buffer.campaign_generation(campaign_id)
+
+
+class BattleSnapshot:
+    """One version of a campaign battle, rendered once for every kind of
+    viewer instead of on every poll.
+
+    `full` is what the DM sees, and every member when the battle reveals
+    resources; `hidden` (only when it doesn't) has no hp/mana/energy. A
+    player's own characters are overlaid onto `hidden` per request — a
+    list copy with a few entries swapped in.
+    """
+
+    __slots__ = ("version", "full", "hidden", "_owned")
+
+    def __init__(self, battle: CampaignBattle):
+        self.version = battle_version(battle.campaign_id, battle.version)
+        full_participants = []
+        hidden_participants = []
+        # owner_user_id -> indexes of their characters in the participant list
+        self._owned: dict[int, list[int]] = {}
+        for i, p in enumerate(battle.participants):
+            ch = p.character
+            combat_buffer.overlay(ch)
+            item = {
+                "character_id": ch.id,
+                "name": ch.name,
+                "initiative": ch.initiative,
+                "is_current_turn": i == battle.turn_index,
+            }
+            hidden_participants.append(item)
+            full_participants.append({
+                **item,
+                "hp": ch.hp, "hp_max": ch.hp_max,
+                "mana": ch.mana, "mana_max": ch.mana_max,
+                "energy": ch.energy, "energy_max": ch.energy_max,
+            })
+            self._owned.setdefault(ch.owner_user_id, []).append(i)
+
+        # out of range only for a battle left broken by an old deletion
+        current = _at(battle.participants, battle.turn_index)
+        head = {
+            "version": self.version,
+            "round": battle.round,
+            "reveal_resources": battle.reveal_resources,
+            "current_turn_character_id": current.character_id if current else None,
+        }
+        self.full = {**head, "participants": full_participants}
+        self.hidden = None if battle.reveal_resources else {**head, "participants": hidden_participants}
+
+    def view(self, viewer_id: int, is_dm: bool) -> dict:
+        if is_dm or self.hidden is None:
+            return self.full
+        own = self._owned.get(viewer_id)
+        if not own:
+            return self.hidden
+        participants = list(self.hidden["participants"])
+        for i in own:
+            participants[i] = self.full["participants"][i]
+        return {**self.hidden, "participants": participants}
+
+    def advanced(self, turn_index: int, round: int, version: int) -> "BattleSnapshot":
+        """This battle a turn later: same participants, new turn pointer —
+        what crud.advance_battle_turn needs, without reloading anything."""
+        snapshot = BattleSnapshot.__new__(BattleSnapshot)
+        snapshot.version = version
+        snapshot._owned = self._owned
+        snapshot.full = _advance_view(self.full, turn_index, round, version)
+        snapshot.hidden = self.hidden and _advance_view(self.hidden, turn_index, round, version)
+        return snapshot
+
+
+def _at(items: list, index: int):
+    return items[index] if 0 <= index < len(items) else None
+
+
+def _advance_view(view: dict, turn_index: int, round: int, version: int) -> dict:
+    participants = [
+        p if p["is_current_turn"] == (i == turn_index) else {**p, "is_current_turn": i == turn_index}
+        for i, p in enumerate(view["participants"])
+    ]
+    return {
+        **view,
+        "version": version,
+        "round": round,
+        "current_turn_character_id": (_at(participants, turn_index) or {}).get("character_id"),
+        "participants": participants,
+    }
+
+
+class BattleCache:
+    """Latest BattleSnapshot per campaign, looked up by (campaign_id,
+    battle_version). Anything that changes what a battle shows bumps the
+    version (crud.advance_battle_turn, crud.touch_battles, or a change parked
+    in the write-behind buffer), so a stale snapshot is simply never asked
+    for again."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, BattleSnapshot] = OrderedDict()
+
+    def get(self, campaign_id: int, version: int) -> BattleSnapshot | None:
+        snapshot = self._entries.get(campaign_id)
+        if snapshot is None or snapshot.version != version:
+            return None
+        self._entries.move_to_end(campaign_id)
+        return snapshot
+
+    def put(self, campaign_id: int, battle: CampaignBattle) -> BattleSnapshot:
+        return self.store(campaign_id, BattleSnapshot(battle))
+
+    def store(self, campaign_id: int, snapshot: BattleSnapshot) -> BattleSnapshot:
+        self._entries[campaign_id] = snapshot
+        self._entries.move_to_end(campaign_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+
+
+battle_cache = BattleCache(max_entries=settings.BATTLE_CACHE_MAX_ENTRIES)
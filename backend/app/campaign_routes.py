@@ -1,25 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .battle_cache import battle_cache, battle_version
+from .config import settings
 from .db import get_db
-from .deps import get_current_user, require_subscription
+from .deps import get_current_user, get_read_db, require_subscription, run_write
+from .events import MESSAGE_CREATED, broker
 from .models import User
 from . import crud, schemas
 
-router = APIRouter()
+router = APIRouter(prefix="/api/campaigns")
+
+# an SSE comment every so often keeps proxies from closing an idle stream
+EVENTS_KEEPALIVE_SECONDS = 15
+# /api/inbox — all of the user's campaign messages in one feed
+inbox_router = APIRouter(prefix="/api/inbox")
 
 
 def _member_label(user: User) -> str:
     return user.first_name or (f"@{user.username}" if user.username else f"Игрок #{user.id}")
 
 
-async def _campaign_out(db: AsyncSession, campaign, viewer_id: int) -> dict:
+def _campaign_out(campaign, viewer_id: int, unread_count: int = 0) -> dict:
     is_dm = campaign.dm_user_id == viewer_id
     out = {
         "id": campaign.id,
         "name": campaign.name,
         "is_dm": is_dm,
-        "unread_count": 0,
+        "unread_count": 0 if is_dm else unread_count,
     }
     if is_dm:
         out["invite_code"] = campaign.invite_code
@@ -28,8 +40,6 @@ async def _campaign_out(db: AsyncSession, campaign, viewer_id: int) -> dict:
             for m in campaign.members
             if m.user_id != campaign.dm_user_id
         ]
-    else:
-        out["unread_count"] = await crud.count_unread_campaign_messages(db, campaign.id, viewer_id)
     return out
 
 
@@ -42,17 +52,18 @@ async def create_campaign(
     name = body.name.strip()
     if not name:
         raise HTTPException(400, "Name is required")
-    campaign = await crud.create_campaign(db, u.id, name)
+    campaign = await run_write(db, crud.create_campaign, u.id, name)
     return {"id": campaign.id, "name": campaign.name, "invite_code": campaign.invite_code}
 
 
 @router.get("")
 async def list_campaigns(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
     campaigns = await crud.list_campaigns_for_user(db, u.id)
-    return [await _campaign_out(db, c, u.id) for c in campaigns]
+    unread = await crud.count_unread_by_campaign(db, u.id)
+    return [_campaign_out(c, u.id, unread.get(c.id, 0)) for c in campaigns]
 
 
 @router.post("/join")
@@ -61,10 +72,11 @@ async def join_campaign(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    campaign = await crud.join_campaign(db, u.id, body.invite_code.strip())
+    campaign = await run_write(db, crud.join_campaign, u.id, body.invite_code.strip())
     if not campaign:
         raise HTTPException(404, "Campaign not found")
-    return await _campaign_out(db, campaign, u.id)
+    unread = await crud.count_unread_campaign_messages(db, campaign.id, u.id)
+    return _campaign_out(campaign, u.id, unread)
 
 
 @router.delete("/{campaign_id}")
@@ -73,7 +85,7 @@ async def delete_campaign(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.delete_campaign(db, u.id, campaign_id)
+    ok = await run_write(db, crud.delete_campaign, u.id, campaign_id)
     if not ok:
         raise HTTPException(404, "Campaign not found")
     return {"status": "ok"}
@@ -85,7 +97,7 @@ async def leave_campaign(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.leave_campaign(db, u.id, campaign_id)
+    ok = await run_write(db, crud.leave_campaign, u.id, campaign_id)
     if not ok:
         raise HTTPException(404, "Not a member of this campaign")
     return {"status": "ok"}
@@ -98,7 +110,7 @@ async def kick_campaign_member(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.kick_campaign_member(db, campaign_id, u.id, user_id)
+    ok = await run_write(db, crud.kick_campaign_member, campaign_id, u.id, user_id)
     if not ok:
         raise HTTPException(404, "Not found")
     return {"status": "ok"}
@@ -107,7 +119,7 @@ async def kick_campaign_member(
 @router.get("/{campaign_id}/characters")
 async def list_campaign_characters(
     campaign_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
     chars = await crud.list_campaign_characters(db, campaign_id, u.id)
@@ -135,33 +147,43 @@ async def send_message(
     if not text:
         raise HTTPException(400, "Text is required")
 
-    msg = await crud.send_campaign_message(db, campaign_id, u.id, body.target_user_id, text)
+    msg = await run_write(db, crud.send_campaign_message, campaign_id, u.id, body.target_user_id, text)
     if not msg:
         raise HTTPException(403, "DM access required, or target is not a campaign member")
     return {"status": "ok", "id": msg.id}
 
 
+def _message_out(m, is_unread: bool) -> dict:
+    return {
+        "id": m.id,
+        "sender_name": _member_label(m.sender),
+        "target_user_id": m.target_user_id,
+        "target_name": _member_label(m.target) if m.target else None,
+        "text": m.text,
+        "created_at": m.created_at.isoformat(),
+        "is_unread": is_unread,
+    }
+
+
 @router.get("/{campaign_id}/messages")
 async def list_messages(
     campaign_id: int,
-    db: AsyncSession = Depends(get_db),
+    before_id: int | None = None,
+    since_id: int | None = None,
+    limit: int | None = Query(default=None, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
-    rows = await crud.list_campaign_messages(db, campaign_id, u.id)
+    """Newest first. Without paging parameters the whole history, as always;
+    with `limit`, that many at a time — page back with `before_id` = the last
+    id of the previous page. Poll for new ones with `since_id` = the newest
+    id the client has."""
+    rows = await crud.list_campaign_messages(
+        db, campaign_id, u.id, before_id=before_id, since_id=since_id, limit=limit
+    )
     if rows is None:
         raise HTTPException(403, "No access")
-    return [
-        {
-            "id": m.id,
-            "sender_name": _member_label(m.sender),
-            "target_user_id": m.target_user_id,
-            "target_name": _member_label(m.target) if m.target else None,
-            "text": m.text,
-            "created_at": m.created_at.isoformat(),
-            "is_unread": is_unread,
-        }
-        for m, is_unread in rows
-    ]
+    return [_message_out(m, is_unread) for m, is_unread in rows]
 
 
 @router.delete("/{campaign_id}/messages/{message_id}")
@@ -171,7 +193,7 @@ async def hide_message(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.hide_campaign_message(db, campaign_id, u.id, message_id)
+    ok = await run_write(db, crud.hide_campaign_message, campaign_id, u.id, message_id)
     if not ok:
         raise HTTPException(404, "Not a member of this campaign")
     return {"status": "ok"}
@@ -183,38 +205,36 @@ async def mark_messages_read(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.mark_campaign_messages_read(db, campaign_id, u.id)
+    ok = await run_write(db, crud.mark_campaign_messages_read, campaign_id, u.id)
     if not ok:
         raise HTTPException(404, "Not a member of this campaign")
     return {"status": "ok"}
 
 
-def _battle_out(battle, viewer_id: int, is_dm: bool) -> dict:
-    participants = []
-    for p in battle.participants:
-        ch = p.character
-        can_see_resources = battle.reveal_resources or is_dm or ch.owner_user_id == viewer_id
-        item = {
-            "character_id": ch.id,
-            "name": ch.name,
-            "initiative": ch.initiative,
-            "is_current_turn": p.order_index == battle.turn_index,
-        }
-        if can_see_resources:
-            item.update({
-                "hp": ch.hp, "hp_max": ch.hp_max,
-                "mana": ch.mana, "mana_max": ch.mana_max,
-                "energy": ch.energy, "energy_max": ch.energy_max,
-            })
-        participants.append(item)
-
-    current = battle.participants[battle.turn_index]
-    return {
-        "round": battle.round,
-        "reveal_resources": battle.reveal_resources,
-        "current_turn_character_id": current.character_id,
-        "participants": participants,
-    }
+@inbox_router.get("")
+async def list_inbox(
+    before_id: int | None = None,
+    limit: int | None = Query(default=None, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
+    u: User = Depends(get_current_user),
+):
+    """Messages from all of the user's campaigns, newest first. Everything
+    without `limit`; with it, that many at a time — page back with
+    `before_id` = the last id of the previous page."""
+    rows = await crud.list_inbox_messages(db, u.id, before_id=before_id, limit=limit)
+    return [
+        {**_message_out(m, is_unread), "campaign_id": m.campaign_id, "campaign_name": campaign_name}
+        for m, campaign_name, is_unread in rows
+    ]
+
+
+@inbox_router.post("/read")
+async def mark_inbox_read(
+    db: AsyncSession = Depends(get_db),
+    u: User = Depends(get_current_user),
+):
+    await run_write(db, crud.mark_all_campaign_messages_read, u.id)
+    return {"status": "ok"}
 
 
 @router.post("/{campaign_id}/battle")
@@ -224,29 +244,78 @@ async def start_battle(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(require_subscription),
 ):
-    battle = await crud.start_campaign_battle(db, campaign_id, u.id, body.character_ids, body.reveal_resources)
+    battle = await run_write(
+        db, crud.start_campaign_battle, campaign_id, u.id, body.character_ids, body.reveal_resources
+    )
     if not battle:
         raise HTTPException(400, "Cannot start battle (not DM, battle already active, or invalid characters)")
-    return _battle_out(battle, u.id, is_dm=True)
+    return battle_cache.put(campaign_id, battle).view(u.id, is_dm=True)
 
 
 @router.get("/{campaign_id}/battle")
 async def get_battle(
     campaign_id: int,
-    db: AsyncSession = Depends(get_db),
+    wait_for_version: int | None = None,
+    timeout: int = Query(default=25, ge=0, le=30),
+    db: AsyncSession = Depends(get_read_db),
+    auth_db: AsyncSession = Depends(get_db),  # the session get_current_user ran on
     u: User = Depends(get_current_user),
 ):
-    campaign = await crud.get_campaign_by_id(db, campaign_id)
-    if not campaign:
+    """The campaign's battle, or null. With `wait_for_version` (the
+    `version` the client already has, 0 for "no battle") this is a long
+    poll: it answers as soon as the version differs, or with 304 after
+    `timeout` seconds of nothing changing.
+
+    Served from battle_cache while the version is unchanged, so a party
+    polling the same battle costs one small query per request."""
+    access = await crud.get_battle_access(db, campaign_id, u.id)
+    if access is None:
         raise HTTPException(404, "Campaign not found")
+    dm_user_id, version, is_member = access
+    version = battle_version(campaign_id, version)
+    is_dm = dm_user_id == u.id
+    if not is_dm and not is_member:
+        raise HTTPException(403, "No access")
 
-    battle = await crud.get_campaign_battle(db, campaign_id, u.id)
-    if battle is None:
-        is_member = campaign.dm_user_id == u.id or any(m.user_id == u.id for m in campaign.members)
-        if not is_member:
-            raise HTTPException(403, "No access")
+    if wait_for_version is not None and version == wait_for_version:
+        # subscribe, then look again, so a change in between still wakes us
+        async with broker.subscribe(campaign_id) as queue:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (
+                version := battle_version(campaign_id, await crud.get_battle_version(db, campaign_id))
+            ) == wait_for_version:
+                # nothing to hold on to while we wait
+                await db.close()
+                await auth_db.close()
+                if not await _wait_for_battle_event(queue, deadline - loop.time()):
+                    return Response(status_code=304)
+
+    if not version:
         return None
-    return _battle_out(battle, u.id, is_dm=campaign.dm_user_id == u.id)
+    snapshot = battle_cache.get(campaign_id, version)
+    if snapshot is None:
+        battle = await crud.get_campaign_battle(db, campaign_id)
+        if battle is None:
+            return None
+        snapshot = battle_cache.put(campaign_id, battle)
+    return snapshot.view(u.id, is_dm)
+
+
+async def _wait_for_battle_event(queue: asyncio.Queue, timeout: float) -> bool:
+    """True once a battle event arrives, False if `timeout` runs out first."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
+        try:
+            _, event_type, _ = await asyncio.wait_for(queue.get(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        if event_type != MESSAGE_CREATED:
+            return True
 
 
 @router.post("/{campaign_id}/battle/next-turn")
@@ -255,11 +324,12 @@ async def next_turn(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    campaign = await crud.get_campaign_by_id(db, campaign_id)
-    battle = await crud.advance_battle_turn(db, campaign_id, u.id)
-    if not battle:
+    advanced = await run_write(db, crud.advance_battle_turn, campaign_id, u.id)
+    if not advanced:
         raise HTTPException(403, "No active battle, or not your turn")
-    return _battle_out(battle, u.id, is_dm=bool(campaign and campaign.dm_user_id == u.id))
+    snapshot, is_dm = advanced
+    # only now is it committed (a writer group commits after its last unit)
+    return battle_cache.store(campaign_id, snapshot).view(u.id, is_dm)
 
 
 @router.delete("/{campaign_id}/battle")
@@ -268,7 +338,82 @@ async def end_battle(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.end_campaign_battle(db, campaign_id, u.id)
+    ok = await run_write(db, crud.end_campaign_battle, campaign_id, u.id)
     if not ok:
         raise HTTPException(403, "DM access required, or no active battle")
     return {"status": "ok"}
+
+
+@router.get("/{campaign_id}/events")
+async def campaign_events(
+    campaign_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    u: User = Depends(get_current_user),
+):
+    """Server-Sent Events for a campaign: message-created, battle-started,
+    turn-advanced, battle-ended, participant-resource-changed. Each event
+    only says what changed; the client re-fetches what it shows. Streams
+    end after EVENTS_STREAM_MAX_SECONDS (which also drops a kicked member)
+    and the client re-syncs on reconnect."""
+    campaign = await crud.get_campaign_by_id(db, campaign_id)
+    if not campaign:
+        raise HTTPException(404, "Campaign not found")
+    is_dm = campaign.dm_user_id == u.id
+    if not is_dm and not any(m.user_id == u.id for m in campaign.members):
+        raise HTTPException(403, "No access")
+    # the stream can stay open for hours — don't keep a pooled connection with it
+    await db.close()
+    return _event_stream(request, u.id, {campaign_id: is_dm})
+
+
+@inbox_router.get("/events")
+async def inbox_events(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    u: User = Depends(get_current_user),
+):
+    """The same events for all of the user's campaigns in one stream (each
+    with its `campaign_id`) — a stream per campaign would eat the browser's
+    handful of connections per origin. Campaigns joined later show up after
+    the client reconnects, which it does when its campaign list changes and
+    at the latest after EVENTS_STREAM_MAX_SECONDS."""
+    roles = await crud.list_campaign_roles(db, u.id)
+    await db.close()
+    return _event_stream(request, u.id, roles)
+
+
+def _event_stream(request: Request, user_id: int, roles: dict[int, bool]) -> StreamingResponse:
+    """SSE response relaying broker events for the campaigns in `roles`
+    ({campaign_id: whether the user is its DM})."""
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        ends_at = loop.time() + settings.EVENTS_STREAM_MAX_SECONDS
+        async with broker.subscribe(*roles) as queue:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                remaining = ends_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    campaign_id, event_type, data = await asyncio.wait_for(
+                        queue.get(), min(EVENTS_KEEPALIVE_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                # a personal message is nobody else's business, not even that it exists
+                if (
+                    event_type == MESSAGE_CREATED
+                    and not roles[campaign_id]
+                    and data.get("target_user_id") not in (None, user_id)
+                ):
+                    continue
+                yield f"event: {event_type}\ndata: {json.dumps({**data, 'campaign_id': campaign_id})}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
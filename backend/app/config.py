@@ -12,6 +12,27 @@ class Settings(BaseSettings):
 
     WEBAPP_URL: str = "https://d4rkli.ru/webapp/"
     SQLITE_PATH: str = "sqlite+aiosqlite:////var/lib/dndsheet/dnd_v2.sqlite3"
+    # "default" — SQLite as it comes (rollback journal, full sync);
+    # "production" — WAL + tuned PRAGMAs on every connection, see db.sqlite_pragmas()
+    SQLITE_PROFILE: str = "default"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_POOL_SIZE: int = 8
+    # off by default: some delete paths (templates still referenced by
+    # characters, campaigns with messages) rely on FKs not being enforced
+    SQLITE_FOREIGN_KEYS: bool = False
+    # route every write (characters, campaigns, battles, users, write-behind
+    # flushes) through one writer connection with group commit
+    # (app/db_writer.py) — per-process, single worker only. Outside it:
+    # init_db at startup, and the rate-limit/event files, which are
+    # separate SQLite databases
+    SQLITE_WRITER_QUEUE: bool = False
+    SQLITE_GROUP_COMMIT_WINDOW_MS: int = 5
+    SQLITE_GROUP_COMMIT_MAX: int = 64
+    # let concurrent identical reads on reader sessions share one query set
+    # (app/single_flight.py) — e.g. a whole party polling the same battle
+    SINGLE_FLIGHT_READS: bool = False
     DM_USER_IDS: str = ""
     DEV_USER_IDS: str = ""
 
@@ -24,6 +45,52 @@ class Settings(BaseSettings):
     VK_APP_SECRET: str = ""
     VK_REDIRECT_URI: str = "https://d4rkli.ru/api/auth/vk/callback"
 
+    # worker processes of this deployment — the variable uvicorn and gunicorn
+    # take their default worker count from
+    WEB_CONCURRENCY: int = 1
+
+    # write-behind buffer for combat HUD fields (app/write_behind.py) —
+    # per-process, so only for single-worker deployments (refuses to start
+    # with WEB_CONCURRENCY > 1)
+    COMBAT_WRITE_BEHIND: bool = False
+    COMBAT_WRITE_BEHIND_INTERVAL_MS: int = 2000
+
+    # login rate limiting (app/rate_limit.py): "memory" — per process,
+    # "sqlite" — one budget shared by all workers on the node
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "/var/lib/dndsheet/rate_limit.sqlite3"
+    RATE_LIMIT_MAX_KEYS: int = 10000
+
+    # resolved users kept by deps.get_current_user (app/identity_cache.py)
+    IDENTITY_CACHE_TTL_SECONDS: int = 60
+    IDENTITY_CACHE_MAX_ENTRIES: int = 4096
+
+    # access decisions kept by deps.get_owned_or_dm_character (app/access_cache.py)
+    ACCESS_CACHE_TTL_SECONDS: int = 30
+    ACCESS_CACHE_MAX_ENTRIES: int = 8192
+
+    # rendered battles kept per campaign (app/battle_cache.py)
+    BATTLE_CACHE_MAX_ENTRIES: int = 1024
+
+    # GET /characters/{id}/changes keeps deletions (sheet_tombstones) for this
+    # many sheet versions; a client further behind gets a full sync
+    SHEET_TOMBSTONE_VERSIONS: int = 500
+
+    # requests kept per route for GET /api/dev/perf (app/perf.py)
+    PERF_SAMPLES_PER_ROUTE: int = 500
+
+    # GET /api/campaigns/{id}/events ends each stream after this long and the
+    # client reconnects: uvicorn waits for open responses on shutdown, and
+    # this has to stay under systemd's stop timeout (90s) or a restart ends
+    # in SIGKILL before the write-behind buffer is flushed
+    EVENTS_STREAM_MAX_SECONDS: int = 55
+    # campaign event bus (app/events.py): "local" — per process, "sqlite" —
+    # a shared event table every worker tails, for multi-worker deployments
+    EVENTS_BACKEND: str = "local"
+    EVENTS_SQLITE_PATH: str = "/var/lib/dndsheet/events.sqlite3"
+    EVENTS_POLL_INTERVAL_MS: int = 100
+    EVENTS_RETENTION_SECONDS: int = 300
+
     def dm_ids(self) -> set[int]:
         if not self.DM_USER_IDS:
             return set()
@@ -2,11 +2,19 @@ import json
 import secrets
 from datetime import datetime, timedelta
 
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, func, delete, update, case, exists
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, joinedload
 
+from .config import settings
 from .schemas import CharacterUpdate
+from .access_cache import access_cache
+from .battle_cache import BattleSnapshot, battle_cache, battle_version
+from . import events
+from .identity_cache import identity_cache
+from .single_flight import coalesced_read
+from .write_behind import combat_buffer
 from .models import (
     User,
     Character,
@@ -20,11 +28,13 @@ from .models import (
     Campaign,
     CampaignMember,
     CampaignMessage,
+    CampaignHiddenMessage,
     CampaignBattle,
     CampaignBattleParticipant,
     FeedbackReport,
     ActionLogEntry,
     AccessCode,
+    SheetTombstone,
 )
 
 # =========================
@@ -42,15 +52,50 @@ def _safe_json_dict(raw: str | None) -> dict:
         return {}
 
 
-def _safe_json_list(raw: str | None) -> list:
-    """Parse JSON string into a list; return [] on any error or non-list."""
-    if not raw:
-        return []
-    try:
-        data = json.loads(raw)
-        return data if isinstance(data, list) else []
-    except Exception:
-        return []
+async def _bump_version(
+    db: AsyncSession, character_id: int, fields: bool = False, custom: bool = False
+) -> int:
+    """Advance Character.version inside the caller's transaction and return the
+    new value. Every sheet mutation goes through this so the version can serve
+    as the sheet's ETag and as the stamp /changes filters child rows by.
+
+    `fields` / `custom` also stamp the character's own fields / custom values
+    (+ template) as changed at this version.
+    """
+    values = {"version": Character.version + 1}
+    if fields:
+        values["fields_version"] = Character.version + 1
+    if custom:
+        values["custom_version"] = Character.version + 1
+    # no_autoflush: the caller's pending row changes get flushed together with
+    # their version stamp at commit, instead of once here and again after
+    with db.no_autoflush:
+        q = await db.execute(
+            update(Character)
+            .where(Character.id == character_id)
+            .values(**values)
+            .returning(Character.version)
+        )
+    return q.scalar_one()
+
+
+async def _delete_sheet_row(db: AsyncSession, obj, kind: str) -> None:
+    """Delete a child row of a sheet, leaving a tombstone for /changes."""
+    version = await _bump_version(db, obj.character_id)
+    db.add(SheetTombstone(character_id=obj.character_id, kind=kind, row_id=obj.id, version=version))
+    await db.delete(obj)
+    await _prune_tombstones(db, obj.character_id, version)
+
+
+async def _prune_tombstones(db: AsyncSession, character_id: int, version: int) -> None:
+    """Drop tombstones that fell out of the /changes window — get_sheet_changes
+    answers a client that far behind with a full sync instead."""
+    await db.execute(
+        delete(SheetTombstone).where(
+            SheetTombstone.character_id == character_id,
+            SheetTombstone.version <= version - settings.SHEET_TOMBSTONE_VERSIONS,
+        )
+    )
 
 
 # Fields used across CRUD updates (avoid copy-paste)
@@ -66,6 +111,11 @@ SUMMON_FIELDS = [
     "steps_ratio", "attack_range_ratio",
     "count",
 ]
+EQUIPMENT_SLOTS = [
+    "head", "armor", "back", "hands", "legs", "feet",
+    "weapon1", "weapon2", "belt",
+    "ring1", "ring2", "ring3", "ring4", "jewelry",
+]
 
 # =========================
 # USERS
@@ -115,6 +165,23 @@ async def get_or_create_user_by_vk(
     return user
 
 
+async def get_user_by_provider_id(db: AsyncSession, provider: str, user_key: int) -> User | None:
+    """Lookup only — the user behind a Telegram ("telegram") or VK ("vk") id."""
+    column = User.vk_id if provider == "vk" else User.tg_id
+    q = await db.execute(select(User).where(column == user_key))
+    return q.scalar_one_or_none()
+
+
+async def update_user_names(
+    db: AsyncSession, user_id: int, first_name: str | None, username: str | None
+) -> None:
+    """Name refresh for a user resolved from the identity cache (no row loaded)."""
+    await db.execute(
+        update(User).where(User.id == user_id).values(first_name=first_name, username=username)
+    )
+    await db.commit()
+
+
 # =========================
 # CHARACTERS
 # =========================
@@ -170,14 +237,12 @@ async def delete_character(db: AsyncSession, user_id: int, character_id: int) ->
 
     # drop battle-participant rows first so deleting a character mid-battle
     # doesn't leave a dangling character_id reference
-    q = await db.execute(
-        select(CampaignBattleParticipant).where(CampaignBattleParticipant.character_id == character_id)
-    )
-    for p in q.scalars().all():
-        await db.delete(p)
+    await _remove_from_battles(db, character_id)
+    await db.execute(delete(SheetTombstone).where(SheetTombstone.character_id == character_id))
 
     await db.delete(ch)
     await db.commit()
+    access_cache.invalidate_character(character_id)
     return True
 
 
@@ -196,14 +261,45 @@ async def update_character(
     actor_user_id: int,
     data: CharacterUpdate,
 ):
+    # HUD autosave that only moved hp/mana/… — parked for the next batched flush
+    if combat_buffer.absorb(ch, data.model_dump(exclude_unset=True)):
+        # nothing to commit: the buffered values are already what reads see,
+        # and the battle version reads fold the buffer generation in
+        if ch.campaign_id is not None:
+            events.broker.publish(ch.campaign_id, events.PARTICIPANT_RESOURCE_CHANGED, {"character_id": ch.id})
+        return ch
+
+    await _apply_character_update(db, ch, actor_user_id, data)
+    await _bump_version(db, ch.id, fields=True)
+    await db.commit()
+    await db.refresh(ch)
+    return ch
+
+
+async def _apply_character_update(
+    db: AsyncSession,
+    ch: Character,
+    actor_user_id: int,
+    data: CharacterUpdate,
+) -> None:
+    """update_character without the version bump/commit — shared with the batch endpoint."""
+    # we're writing the row now — buffered HUD values go with it (the payload
+    # below still wins), instead of a later flush overwriting this write
+    for key, value in (await combat_buffer.take(db, ch.id)).items():
+        setattr(ch, key, value)
+
     payload = data.model_dump(exclude_unset=True)
 
+    if ch.campaign_id is not None and any(field in payload for field in BATTLE_FIELDS):
+        await touch_battles(db, [ch.id])
+
     # campaign_id needs a membership check, not a bare setattr — a character
     # can only be attached to a campaign its owner is DM of or a member of.
     # Only the owner may change it (not a DM editing someone else's sheet).
     if "campaign_id" in payload:
         campaign_id = payload.pop("campaign_id")
         if actor_user_id == ch.owner_user_id:
+            previous_campaign_id = ch.campaign_id
             if campaign_id is None:
                 ch.campaign_id = None
             else:
@@ -214,6 +310,9 @@ async def update_character(
                 )
                 if is_member:
                     ch.campaign_id = campaign_id
+            if ch.campaign_id != previous_campaign_id:
+                # the old campaign's DM loses access to the sheet
+                access_cache.invalidate_character(ch.id)
 
     # Level: minimum 1
     if "level" in payload and payload["level"] is not None:
@@ -247,9 +346,103 @@ async def update_character(
         cur = max(0, int(cur))
         setattr(ch, res, cur)
 
+
+RESOURCE_FIELDS = ("hp", "mana", "energy")
+# what a group battle shows of each participant (battle_cache.BattleSnapshot)
+BATTLE_FIELDS = (*RESOURCE_FIELDS, "hp_max", "mana_max", "energy_max", "name", "initiative")
+
+
+async def touch_battles(db: AsyncSession, character_ids: list[int]) -> None:
+    """Bump the version of every battle these characters take part in and
+    announce participant-resource-changed once the caller commits."""
+    q = await db.execute(
+        select(CampaignBattleParticipant.character_id, CampaignBattle.id, CampaignBattle.campaign_id)
+        .join(CampaignBattle, CampaignBattle.id == CampaignBattleParticipant.battle_id)
+        .where(CampaignBattleParticipant.character_id.in_(character_ids))
+    )
+    rows = q.all()
+    if not rows:
+        return
+    await db.execute(
+        update(CampaignBattle)
+        .where(CampaignBattle.id.in_({battle_id for _, battle_id, _ in rows}))
+        .values(version=CampaignBattle.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    for character_id, _, campaign_id in rows:
+        events.publish_after_commit(
+            db, campaign_id, events.PARTICIPANT_RESOURCE_CHANGED, {"character_id": character_id}
+        )
+
+
+async def _remove_from_battles(db: AsyncSession, character_id: int) -> None:
+    """Take a character out of every battle it is in: the others are
+    renumbered, the turn stays with whoever came next (past the end it
+    wraps into the next round), and a battle with nobody left ends."""
+    q = await db.execute(
+        select(CampaignBattle)
+        .join(CampaignBattleParticipant, CampaignBattleParticipant.battle_id == CampaignBattle.id)
+        .where(CampaignBattleParticipant.character_id == character_id)
+        .options(selectinload(CampaignBattle.participants))
+    )
+    for battle in q.unique().scalars().all():
+        removed_before_turn = 0
+        for i, p in enumerate(list(battle.participants)):
+            if p.character_id == character_id:
+                battle.participants.remove(p)  # delete-orphan
+                removed_before_turn += i < battle.turn_index
+        if not battle.participants:
+            await db.delete(battle)
+            events.publish_after_commit(db, battle.campaign_id, events.BATTLE_ENDED, {})
+            continue
+
+        turn_index = battle.turn_index - removed_before_turn
+        if turn_index >= len(battle.participants):
+            turn_index = 0
+            battle.round += 1
+        for i, p in enumerate(battle.participants):
+            p.order_index = i
+        battle.turn_index = turn_index
+        battle.version = CampaignBattle.version + 1
+        events.publish_after_commit(
+            db, battle.campaign_id, events.PARTICIPANT_RESOURCE_CHANGED, {"character_id": character_id}
+        )
+
+
+async def apply_resource_deltas(db: AsyncSession, character_id: int, deltas: dict[str, int]) -> dict | None:
+    """Relative hp/mana/energy change (e.g. {"hp": -7, "mana": 3}) as one
+    UPDATE … RETURNING — no read-modify-write, so a DM and a player hitting the
+    same character at once both land. Floored at 0 like update_character
+    (no upper clamp: overheal is allowed)."""
+    # write-behind values not flushed yet are the real current state — fold
+    # them into this same statement
+    values = await combat_buffer.take(db, character_id)
+    for res in RESOURCE_FIELDS:
+        d = int(deltas.get(res) or 0)
+        if res in values:
+            values[res] = max(0, values[res] + d)
+        elif d:
+            col = getattr(Character, res)
+            values[res] = case((col + d < 0, 0), else_=col + d)
+    values["version"] = Character.version + 1
+    values["fields_version"] = Character.version + 1
+
+    q = await db.execute(
+        update(Character)
+        .where(Character.id == character_id)
+        .values(**values)
+        .returning(Character.hp, Character.mana, Character.energy, Character.version, Character.campaign_id)
+        .execution_options(synchronize_session=False)
+    )
+    row = q.one_or_none()
+    if row is None:
+        await db.commit()
+        return None
+    out = dict(row._mapping)
+    if out.pop("campaign_id") is not None:
+        await touch_battles(db, [character_id])
     await db.commit()
-    await db.refresh(ch)
-    return ch
+    return out
 
 
 # =========================
@@ -271,6 +464,7 @@ async def create_campaign(db: AsyncSession, dm_user_id: int, name: str) -> Campa
     return campaign
 
 
+@coalesced_read
 async def get_campaign_by_id(db: AsyncSession, campaign_id: int) -> Campaign | None:
     q = await db.execute(
         select(Campaign)
@@ -291,6 +485,15 @@ async def list_campaigns_for_user(db: AsyncSession, user_id: int) -> list[Campai
     return list(q.scalars().all())
 
 
+async def list_campaign_roles(db: AsyncSession, user_id: int) -> dict[int, bool]:
+    """{campaign_id: is_dm} for every campaign the user is in or runs."""
+    is_member = exists().where(CampaignMember.campaign_id == Campaign.id, CampaignMember.user_id == user_id)
+    q = await db.execute(
+        select(Campaign.id, Campaign.dm_user_id).where((Campaign.dm_user_id == user_id) | is_member)
+    )
+    return {campaign_id: dm_user_id == user_id for campaign_id, dm_user_id in q.all()}
+
+
 async def join_campaign(db: AsyncSession, user_id: int, invite_code: str) -> Campaign | None:
     q = await db.execute(select(Campaign).where(Campaign.invite_code == invite_code))
     campaign = q.scalar_one_or_none()
@@ -304,7 +507,14 @@ async def join_campaign(db: AsyncSession, user_id: int, invite_code: str) -> Cam
         )
     )
     if not q.scalar_one_or_none():
-        db.add(CampaignMember(campaign_id=campaign.id, user_id=user_id))
+        # a new member has read nothing yet: everything already visible to them is unread
+        q = await db.execute(
+            select(func.count()).select_from(CampaignMessage).where(
+                CampaignMessage.campaign_id == campaign.id,
+                (CampaignMessage.target_user_id.is_(None)) | (CampaignMessage.target_user_id == user_id),
+            )
+        )
+        db.add(CampaignMember(campaign_id=campaign.id, user_id=user_id, unread_count=q.scalar_one()))
         await db.commit()
 
     # re-fetch with members eager-loaded (needed by the DM-facing response shape)
@@ -312,14 +522,14 @@ async def join_campaign(db: AsyncSession, user_id: int, invite_code: str) -> Cam
 
 
 async def _detach_member_characters(db: AsyncSession, campaign_id: int, user_id: int) -> None:
-    q = await db.execute(
-        select(Character).where(
+    await db.execute(
+        update(Character)
+        .where(
             Character.campaign_id == campaign_id,
             Character.owner_user_id == user_id,
         )
+        .values(campaign_id=None, version=Character.version + 1, fields_version=Character.version + 1)
     )
-    for ch in q.scalars().all():
-        ch.campaign_id = None
 
 
 async def leave_campaign(db: AsyncSession, user_id: int, campaign_id: int) -> bool:
@@ -336,6 +546,7 @@ async def leave_campaign(db: AsyncSession, user_id: int, campaign_id: int) -> bo
     await _detach_member_characters(db, campaign_id, user_id)
     await db.delete(member)
     await db.commit()
+    access_cache.invalidate_campaign(campaign_id)
     return True
 
 
@@ -357,6 +568,7 @@ async def kick_campaign_member(db: AsyncSession, campaign_id: int, dm_user_id: i
     await _detach_member_characters(db, campaign_id, target_user_id)
     await db.delete(member)
     await db.commit()
+    access_cache.invalidate_campaign(campaign_id)
     return True
 
 
@@ -365,15 +577,19 @@ async def delete_campaign(db: AsyncSession, dm_user_id: int, campaign_id: int) -
     if not campaign or campaign.dm_user_id != dm_user_id:
         return False
 
-    q = await db.execute(select(Character).where(Character.campaign_id == campaign_id))
-    for ch in q.scalars().all():
-        ch.campaign_id = None
+    await db.execute(
+        update(Character)
+        .where(Character.campaign_id == campaign_id)
+        .values(campaign_id=None, version=Character.version + 1, fields_version=Character.version + 1)
+    )
 
     await db.delete(campaign)
     await db.commit()
+    access_cache.invalidate_campaign(campaign_id)
     return True
 
 
+@coalesced_read
 async def list_campaign_characters(db: AsyncSession, campaign_id: int, dm_user_id: int) -> list[Character] | None:
     campaign = await get_campaign_by_id(db, campaign_id)
     if not campaign or campaign.dm_user_id != dm_user_id:
@@ -408,16 +624,39 @@ async def send_campaign_message(
         text=text,
     )
     db.add(msg)
+
+    recipients = CampaignMember.campaign_id == campaign_id
+    if target_user_id is not None:
+        recipients &= CampaignMember.user_id == target_user_id
+    else:
+        recipients &= CampaignMember.user_id != sender_user_id
+    await db.execute(
+        update(CampaignMember).where(recipients).values(unread_count=CampaignMember.unread_count + 1)
+    )
+    await db.flush()
+    events.publish_after_commit(
+        db, campaign_id, events.MESSAGE_CREATED, {"id": msg.id, "target_user_id": target_user_id}
+    )
     await db.commit()
     await db.refresh(msg)
     return msg
 
 
 async def list_campaign_messages(
-    db: AsyncSession, campaign_id: int, viewer_user_id: int
+    db: AsyncSession,
+    campaign_id: int,
+    viewer_user_id: int,
+    before_id: int | None = None,
+    since_id: int | None = None,
+    limit: int | None = None,
 ) -> list[tuple[CampaignMessage, bool]] | None:
     """Returns (message, is_unread) pairs, newest first, with the viewer's
-    personally-hidden messages filtered out."""
+    personally-hidden messages filtered out.
+
+    Keyset-paginated on (created_at, id): `before_id` pages back from a
+    message the client already has, `since_id` returns only messages newer
+    than it (polling), `limit` caps the page. A cursor id that isn't in this
+    campaign yields an empty page."""
     campaign = await get_campaign_by_id(db, campaign_id)
     if not campaign:
         return None
@@ -434,7 +673,6 @@ async def list_campaign_messages(
     )
     member = q.scalar_one_or_none()
     last_read_at = member.last_read_at if member else None
-    hidden_ids = set(_safe_json_list(member.hidden_message_ids if member else None))
 
     q = select(CampaignMessage).where(CampaignMessage.campaign_id == campaign_id)
     if not is_dm:
@@ -442,15 +680,47 @@ async def list_campaign_messages(
             (CampaignMessage.target_user_id.is_(None))
             | (CampaignMessage.target_user_id == viewer_user_id)
         )
-    q = q.order_by(CampaignMessage.created_at.desc()).options(
+    if member is not None:
+        # anti-join: the page is cut by LIMIT after hidden messages are gone
+        q = q.where(
+            ~exists().where(
+                CampaignHiddenMessage.member_id == member.id,
+                CampaignHiddenMessage.message_id == CampaignMessage.id,
+            )
+        )
+    if before_id is not None:
+        q = q.where(_message_keyset(campaign_id, before_id, older=True))
+    if since_id is not None:
+        q = q.where(_message_keyset(campaign_id, since_id, older=False))
+    q = q.order_by(CampaignMessage.created_at.desc(), CampaignMessage.id.desc()).options(
         selectinload(CampaignMessage.sender), selectinload(CampaignMessage.target)
     )
+    if limit is not None:
+        q = q.limit(limit)
     result = await db.execute(q)
-    messages = [m for m in result.scalars().all() if m.id not in hidden_ids]
+    messages = result.scalars().all()
 
     return [(m, last_read_at is None or m.created_at > last_read_at) for m in messages]
 
 
+def _message_keyset(campaign_id: int, cursor_id: int, older: bool):
+    """(created_at, id) strictly before/after the cursor message — spelled out
+    instead of a row-value comparison so it works on any SQLite version and
+    still walks ix_campaign_messages_campaign_created_id."""
+    cursor_at = (
+        select(CampaignMessage.created_at)
+        .where(CampaignMessage.id == cursor_id, CampaignMessage.campaign_id == campaign_id)
+        .scalar_subquery()
+    )
+    if older:
+        return (CampaignMessage.created_at < cursor_at) | (
+            (CampaignMessage.created_at == cursor_at) & (CampaignMessage.id < cursor_id)
+        )
+    return (CampaignMessage.created_at > cursor_at) | (
+        (CampaignMessage.created_at == cursor_at) & (CampaignMessage.id > cursor_id)
+    )
+
+
 async def hide_campaign_message(db: AsyncSession, campaign_id: int, user_id: int, message_id: int) -> bool:
     """Personal, per-viewer dismiss — hides the message from this user's own
     inbox without deleting it or affecting other members."""
@@ -464,11 +734,19 @@ async def hide_campaign_message(db: AsyncSession, campaign_id: int, user_id: int
     if not member:
         return False
 
-    hidden = _safe_json_list(member.hidden_message_ids)
-    if message_id not in hidden:
-        hidden.append(message_id)
-    member.hidden_message_ids = json.dumps(hidden)
-    await db.commit()
+    q = await db.execute(
+        select(CampaignMessage.id).where(
+            CampaignMessage.id == message_id,
+            CampaignMessage.campaign_id == campaign_id,
+            ~exists().where(
+                CampaignHiddenMessage.member_id == member.id,
+                CampaignHiddenMessage.message_id == CampaignMessage.id,
+            ),
+        )
+    )
+    if q.scalar_one_or_none() is not None:
+        db.add(CampaignHiddenMessage(member_id=member.id, message_id=message_id))
+        await db.commit()
     return True
 
 
@@ -495,31 +773,114 @@ async def mark_campaign_messages_read(db: AsyncSession, campaign_id: int, user_i
     )
     latest = q.scalar_one_or_none()
     member.last_read_at = latest or datetime.utcnow()
+    member.unread_count = 0
     await db.commit()
     return True
 
 
+async def list_inbox_messages(
+    db: AsyncSession,
+    user_id: int,
+    before_id: int | None = None,
+    limit: int | None = None,
+) -> list[tuple[CampaignMessage, str, bool]]:
+    """The user's inbox across all of their campaigns: (message, campaign
+    name, is_unread) triples, newest first, from a single query. Same
+    visibility as list_campaign_messages (a DM sees everything in their
+    campaigns, players see broadcasts and what's targeted at them, minus
+    personally-hidden messages); `before_id` pages back and `limit` caps the
+    page like they do there. A `before_id` from a campaign the user isn't in
+    gives an empty page."""
+    visible = (
+        (CampaignMessage.target_user_id.is_(None))
+        | (CampaignMessage.target_user_id == user_id)
+        | (Campaign.dm_user_id == user_id)
+    )
+    q = (
+        select(CampaignMessage, Campaign.name, CampaignMember.last_read_at)
+        .join(
+            CampaignMember,
+            (CampaignMember.campaign_id == CampaignMessage.campaign_id) & (CampaignMember.user_id == user_id),
+        )
+        .join(Campaign, Campaign.id == CampaignMessage.campaign_id)
+        .where(
+            visible,
+            ~exists().where(
+                CampaignHiddenMessage.member_id == CampaignMember.id,
+                CampaignHiddenMessage.message_id == CampaignMessage.id,
+            ),
+        )
+    )
+    if before_id is not None:
+        # only the user's own campaigns: a foreign id mustn't reveal when it was sent
+        cursor_at = (
+            select(CampaignMessage.created_at)
+            .join(
+                CampaignMember,
+                (CampaignMember.campaign_id == CampaignMessage.campaign_id) & (CampaignMember.user_id == user_id),
+            )
+            .where(CampaignMessage.id == before_id)
+            .scalar_subquery()
+        )
+        q = q.where(
+            (CampaignMessage.created_at < cursor_at)
+            | ((CampaignMessage.created_at == cursor_at) & (CampaignMessage.id < before_id))
+        )
+    q = q.order_by(CampaignMessage.created_at.desc(), CampaignMessage.id.desc()).options(
+        joinedload(CampaignMessage.sender), joinedload(CampaignMessage.target)
+    )
+    if limit is not None:
+        q = q.limit(limit)
+    result = await db.execute(q)
+    return [
+        (m, campaign_name, last_read_at is None or m.created_at > last_read_at)
+        for m, campaign_name, last_read_at in result.all()
+    ]
+
+
+async def mark_all_campaign_messages_read(db: AsyncSession, user_id: int) -> None:
+    """mark_campaign_messages_read for every membership of the user, as one
+    UPDATE (same anchoring: the latest visible message's created_at)."""
+    latest = (
+        select(func.max(CampaignMessage.created_at))
+        .where(
+            CampaignMessage.campaign_id == CampaignMember.campaign_id,
+            (CampaignMessage.target_user_id.is_(None)) | (CampaignMessage.target_user_id == user_id),
+        )
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(CampaignMember)
+        .where(CampaignMember.user_id == user_id)
+        .values(last_read_at=func.coalesce(latest, CampaignMember.last_read_at), unread_count=0)
+    )
+    await db.commit()
+
+
 async def count_unread_campaign_messages(db: AsyncSession, campaign_id: int, user_id: int) -> int:
     q = await db.execute(
-        select(CampaignMember).where(
+        select(CampaignMember.unread_count).where(
             CampaignMember.campaign_id == campaign_id,
             CampaignMember.user_id == user_id,
         )
     )
-    member = q.scalar_one_or_none()
-    if not member:
-        return 0
+    return q.scalar_one_or_none() or 0
+
 
-    since = member.last_read_at or datetime(1970, 1, 1)
-    q = select(func.count()).select_from(CampaignMessage).where(
-        CampaignMessage.campaign_id == campaign_id,
-        CampaignMessage.created_at > since,
-        (CampaignMessage.target_user_id.is_(None)) | (CampaignMessage.target_user_id == user_id),
+async def count_unread_by_campaign(db: AsyncSession, user_id: int) -> dict[int, int]:
+    """Unread counts for every campaign the user is a member of, as
+    {campaign_id: count} — the materialized CampaignMember.unread_count, one
+    query for all campaigns. Campaigns with nothing unread are absent."""
+    q = await db.execute(
+        select(CampaignMember.campaign_id, CampaignMember.unread_count).where(
+            CampaignMember.user_id == user_id,
+            CampaignMember.unread_count > 0,
+        )
     )
-    result = await db.execute(q)
-    return result.scalar_one()
+    return {campaign_id: count for campaign_id, count in q.all()}
 
 
+@coalesced_read
 async def _get_battle_with_participants(db: AsyncSession, campaign_id: int) -> CampaignBattle | None:
     q = await db.execute(
         select(CampaignBattle)
@@ -566,43 +927,120 @@ async def start_campaign_battle(
     for i, ch in enumerate(chars):
         db.add(CampaignBattleParticipant(battle_id=battle.id, character_id=ch.id, order_index=i))
 
+    events.publish_after_commit(db, campaign_id, events.BATTLE_STARTED, {})
     await db.commit()
     return await _get_battle_with_participants(db, campaign_id)
 
 
-async def get_campaign_battle(db: AsyncSession, campaign_id: int, viewer_user_id: int) -> CampaignBattle | None:
-    campaign = await get_campaign_by_id(db, campaign_id)
-    if not campaign:
-        return None
-    is_dm = campaign.dm_user_id == viewer_user_id
-    if not is_dm and not any(m.user_id == viewer_user_id for m in campaign.members):
-        return None
+async def get_battle_version(db: AsyncSession, campaign_id: int) -> int:
+    """The battle's version, 0 when there is no battle."""
+    q = await db.execute(select(CampaignBattle.version).where(CampaignBattle.campaign_id == campaign_id))
+    return q.scalar_one_or_none() or 0
+
+
+async def get_battle_access(db: AsyncSession, campaign_id: int, user_id: int) -> tuple[int, int, bool] | None:
+    """(dm_user_id, battle version or 0, whether user_id is a member) in one
+    indexed query — everything a battle read needs before the snapshot
+    cache. None if the campaign doesn't exist."""
+    is_member = exists().where(CampaignMember.campaign_id == campaign_id, CampaignMember.user_id == user_id)
+    q = await db.execute(
+        select(Campaign.dm_user_id, func.coalesce(CampaignBattle.version, 0), is_member)
+        .outerjoin(CampaignBattle, CampaignBattle.campaign_id == Campaign.id)
+        .where(Campaign.id == campaign_id)
+    )
+    row = q.one_or_none()
+    return (row[0], row[1], bool(row[2])) if row else None
+
 
+async def get_campaign_battle(db: AsyncSession, campaign_id: int) -> CampaignBattle | None:
+    """The battle with participants and their characters; access is the
+    caller's business (see get_battle_access)."""
     return await _get_battle_with_participants(db, campaign_id)
 
 
-async def advance_battle_turn(db: AsyncSession, campaign_id: int, actor_user_id: int) -> CampaignBattle | None:
-    campaign = await get_campaign_by_id(db, campaign_id)
-    if not campaign:
-        return None
+async def advance_battle_turn(
+    db: AsyncSession, campaign_id: int, actor_user_id: int
+) -> tuple[BattleSnapshot, bool] | None:
+    """Pass the turn on, as the DM or the owner of the current participant.
+    Returns the new snapshot — for the caller to cache once committed — and
+    whether the actor is the DM.
 
-    battle = await _get_battle_with_participants(db, campaign_id)
-    if not battle or not battle.participants:
+    One indexed lookup (battle, DM and participant owners in order), then a
+    compare-and-swap UPDATE on the turn pointer that was checked: of two
+    clicks racing on the same turn only one advances, the other gets None
+    (also when SQLite reports the race as "database is locked").
+    The new snapshot is the cached one with the pointer moved, unless
+    something else changed the battle in between."""
+    q = await db.execute(
+        select(
+            CampaignBattle.id, CampaignBattle.turn_index, CampaignBattle.round, CampaignBattle.version,
+            Campaign.dm_user_id, Character.owner_user_id,
+        )
+        .join(Campaign, Campaign.id == CampaignBattle.campaign_id)
+        .join(CampaignBattleParticipant, CampaignBattleParticipant.battle_id == CampaignBattle.id)
+        .join(Character, Character.id == CampaignBattleParticipant.character_id)
+        .where(CampaignBattle.campaign_id == campaign_id)
+        .order_by(CampaignBattleParticipant.order_index)
+    )
+    rows = q.all()
+    if not rows:
         return None
 
-    is_dm = campaign.dm_user_id == actor_user_id
-    current = battle.participants[battle.turn_index]
-    if not is_dm and current.character.owner_user_id != actor_user_id:
+    battle_id, turn_index, current_round, version, dm_user_id, _ = rows[0]
+    is_dm = dm_user_id == actor_user_id
+    # (a pointer past the end — a battle broken before deletions renumbered
+    # it — is only the DM's to move on, into the next round)
+    if not is_dm and (turn_index >= len(rows) or rows[turn_index].owner_user_id != actor_user_id):
         return None
 
-    next_index = battle.turn_index + 1
-    if next_index >= len(battle.participants):
+    next_index = turn_index + 1
+    next_round = current_round
+    if next_index >= len(rows):
         next_index = 0
-        battle.round += 1
-    battle.turn_index = next_index
+        next_round += 1
+    try:
+        q = await db.execute(
+            update(CampaignBattle)
+            .where(
+                CampaignBattle.id == battle_id,
+                CampaignBattle.turn_index == turn_index,
+                CampaignBattle.round == current_round,
+            )
+            .values(turn_index=next_index, round=next_round, version=CampaignBattle.version + 1)
+            .returning(CampaignBattle.version)
+            .execution_options(synchronize_session=False)
+        )
+    except OperationalError as e:
+        # SQLite without the writer queue: a transaction that has read can't
+        # always get the write lock, and another advance holding it is the
+        # same lost race as the WHERE above — not a server error
+        if "locked" not in str(e.orig):
+            raise
+        await db.rollback()
+        return None
+    new_version = q.scalar_one_or_none()
+    if new_version is None:
+        # someone else moved the turn on first
+        await db.rollback()
+        return None
 
+    cached = (
+        battle_cache.get(campaign_id, battle_version(campaign_id, version))
+        if new_version == version + 1
+        else None
+    )
+    if cached is not None:
+        snapshot = cached.advanced(next_index, next_round, battle_version(campaign_id, new_version))
+    else:
+        # not cached, or changed in between: render it (our update included)
+        snapshot = BattleSnapshot(await _get_battle_with_participants(db, campaign_id))
+
+    events.publish_after_commit(db, campaign_id, events.TURN_ADVANCED, {
+        "round": next_round,
+        "current_turn_character_id": snapshot.full["current_turn_character_id"],
+    })
     await db.commit()
-    return await _get_battle_with_participants(db, campaign_id)
+    return snapshot, is_dm
 
 
 async def end_campaign_battle(db: AsyncSession, campaign_id: int, dm_user_id: int) -> bool:
@@ -615,6 +1053,7 @@ async def end_campaign_battle(db: AsyncSession, campaign_id: int, dm_user_id: in
         return False
 
     await db.delete(battle)
+    events.publish_after_commit(db, campaign_id, events.BATTLE_ENDED, {})
     await db.commit()
     return True
 
@@ -670,6 +1109,8 @@ async def redeem_access_code(db: AsyncSession, user_id: int, code: str) -> tuple
     entry.redeemed_at = datetime.utcnow()
 
     await db.commit()
+    # the cached identity still carries the old expiry
+    identity_cache.invalidate_user(user_id)
     return True, user.subscription_expires_at.isoformat()
 
 
@@ -698,6 +1139,7 @@ async def add_item(
         qty=qty,
     )
     db.add(it)
+    it.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(it)
     return it
@@ -708,7 +1150,7 @@ async def delete_item(db: AsyncSession, item_id: int) -> bool:
     item = q.scalar_one_or_none()
     if not item:
         return False
-    await db.delete(item)
+    await _delete_sheet_row(db, item, "items")
     await db.commit()
     return True
 
@@ -723,6 +1165,7 @@ async def update_item(db: AsyncSession, ch_id: int, item_id: int, data):
         if v is not None:
             setattr(item, field, v)
 
+    item.version = await _bump_version(db, ch_id)
     await db.commit()
     await db.refresh(item)
     return item
@@ -735,6 +1178,7 @@ async def update_item(db: AsyncSession, ch_id: int, item_id: int, data):
 async def add_spell(db: AsyncSession, character_id: int, payload: dict) -> Spell:
     sp = Spell(character_id=character_id, **payload)
     db.add(sp)
+    sp.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(sp)
     return sp
@@ -747,6 +1191,7 @@ async def add_spell(db: AsyncSession, character_id: int, payload: dict) -> Spell
 async def add_ability(db: AsyncSession, character_id: int, payload: dict) -> Ability:
     ab = Ability(character_id=character_id, **payload)
     db.add(ab)
+    ab.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(ab)
     return ab
@@ -759,6 +1204,7 @@ async def add_ability(db: AsyncSession, character_id: int, payload: dict) -> Abi
 async def add_state(db: AsyncSession, character_id: int, payload: dict) -> State:
     st = State(character_id=character_id, **payload)
     db.add(st)
+    st.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(st)
     return st
@@ -768,6 +1214,11 @@ async def add_state(db: AsyncSession, character_id: int, payload: dict) -> State
 # EQUIPMENT
 # =========================
 
+async def get_equipment(db: AsyncSession, character_id: int) -> Equipment | None:
+    q = await db.execute(select(Equipment).where(Equipment.character_id == character_id))
+    return q.scalar_one_or_none()
+
+
 async def get_or_create_equipment(db: AsyncSession, character_id: int) -> Equipment:
     q = await db.execute(select(Equipment).where(Equipment.character_id == character_id))
     eq = q.scalar_one_or_none()
@@ -785,6 +1236,7 @@ async def update_equipment(db: AsyncSession, character_id: int, payload: dict) -
     for key, value in payload.items():
         if hasattr(eq, key) and value is not None:
             setattr(eq, key, str(value))
+    eq.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(eq)
     return eq
@@ -804,7 +1256,7 @@ async def delete_spell(db: AsyncSession, spell_id: int) -> bool:
     sp = q.scalar_one_or_none()
     if not sp:
         return False
-    await db.delete(sp)
+    await _delete_sheet_row(db, sp, "spells")
     await db.commit()
     return True
 
@@ -819,7 +1271,7 @@ async def delete_ability(db: AsyncSession, ability_id: int) -> bool:
     ab = q.scalar_one_or_none()
     if not ab:
         return False
-    await db.delete(ab)
+    await _delete_sheet_row(db, ab, "abilities")
     await db.commit()
     return True
 
@@ -834,7 +1286,7 @@ async def delete_state(db: AsyncSession, state_id: int) -> bool:
     st = q.scalar_one_or_none()
     if not st:
         return False
-    await db.delete(st)
+    await _delete_sheet_row(db, st, "states")
     await db.commit()
     return True
 
@@ -849,6 +1301,7 @@ async def update_spell(db: AsyncSession, ch_id: int, spell_id: int, data):
         if v is not None:
             setattr(obj, f, v)
 
+    obj.version = await _bump_version(db, ch_id)
     await db.commit()
     await db.refresh(obj)
     return obj
@@ -864,6 +1317,7 @@ async def update_ability(db: AsyncSession, ch_id: int, ability_id: int, data):
         if v is not None:
             setattr(obj, f, v)
 
+    obj.version = await _bump_version(db, ch_id)
     await db.commit()
     await db.refresh(obj)
     return obj
@@ -879,6 +1333,7 @@ async def update_state(db: AsyncSession, ch_id: int, state_id: int, data):
         if v is not None:
             setattr(obj, f, v)
 
+    obj.version = await _bump_version(db, ch_id)
     await db.commit()
     await db.refresh(obj)
     return obj
@@ -896,6 +1351,7 @@ async def list_summons(db: AsyncSession, character_id: int) -> list[Summon]:
 async def add_summon(db: AsyncSession, character_id: int, payload: dict) -> Summon:
     obj = Summon(character_id=character_id, **payload)
     db.add(obj)
+    obj.version = await _bump_version(db, character_id)
     await db.commit()
     await db.refresh(obj)
     return obj
@@ -911,6 +1367,7 @@ async def update_summon(db: AsyncSession, ch_id: int, summon_id: int, data) -> S
         if v is not None:
             setattr(obj, field, v)
 
+    obj.version = await _bump_version(db, ch_id)
     await db.commit()
     await db.refresh(obj)
     return obj
@@ -920,7 +1377,7 @@ async def delete_summon(db: AsyncSession, summon_id: int) -> bool:
     obj = await db.get(Summon, summon_id)
     if not obj:
         return False
-    await db.delete(obj)
+    await _delete_sheet_row(db, obj, "summons")
     await db.commit()
     return True
 
@@ -935,9 +1392,14 @@ ACTION_LOG_MAX_ENTRIES = 500
 async def add_action_log(db: AsyncSession, character_id: int, text: str) -> ActionLogEntry:
     entry = ActionLogEntry(character_id=character_id, text=text[:500])
     db.add(entry)
+    await db.flush()
+    await _trim_action_log(db, character_id)
     await db.commit()
     await db.refresh(entry)
+    return entry
 
+
+async def _trim_action_log(db: AsyncSession, character_id: int) -> None:
     # keep the table bounded — trim anything past the cap for this character
     q = await db.execute(
         select(ActionLogEntry.id)
@@ -948,9 +1410,6 @@ async def add_action_log(db: AsyncSession, character_id: int, text: str) -> Acti
     stale_ids = [row[0] for row in q.all()]
     if stale_ids:
         await db.execute(delete(ActionLogEntry).where(ActionLogEntry.id.in_(stale_ids)))
-        await db.commit()
-
-    return entry
 
 
 async def list_action_log(db: AsyncSession, character_id: int, limit: int = 200) -> list[ActionLogEntry]:
@@ -995,6 +1454,12 @@ async def delete_template(db: AsyncSession, user_id: int, template_id: int) -> b
     tpl = q.scalar_one_or_none()
     if not tpl:
         return False
+    # sheets that embed this template change shape once it's gone
+    await db.execute(
+        update(Character)
+        .where(Character.template_id == template_id)
+        .values(version=Character.version + 1, custom_version=Character.version + 1)
+    )
     await db.delete(tpl)
     await db.commit()
     return True
@@ -1043,6 +1508,7 @@ async def apply_template_to_character(
     ch.template_id = tpl.id
     ch.custom_values = json.dumps(cur, ensure_ascii=False)
 
+    await _bump_version(db, ch.id, custom=True)
     await db.commit()
     await db.refresh(ch)
     return ch
@@ -1078,6 +1544,7 @@ async def update_custom_values(db: AsyncSession, character_id: int, user_id: int
         cur[str(k)] = v
 
     ch.custom_values = json.dumps(cur, ensure_ascii=False)
+    await _bump_version(db, ch.id, custom=True)
     await db.commit()
     return True
 
@@ -1090,37 +1557,217 @@ async def get_sheet(db: AsyncSession, character_id: int, user_id: int) -> dict |
     ch = await get_character_for_user(db, character_id, user_id)
     if not ch:
         return None
+    return await load_sheet(db, ch)
 
-    items = await list_items(db, character_id)
-    spells = await list_spells(db, character_id)
-    abilities = await list_abilities(db, character_id)
-    states = await list_states(db, character_id)
-    summons = await list_summons(db, character_id)
-    eq = await get_or_create_equipment(db, character_id)
 
-    tpl = None
-    config = None
-    if ch.template_id:
-        q = await db.execute(select(SheetTemplate).where(SheetTemplate.id == ch.template_id))
-        tpl = q.scalar_one_or_none()
-        if tpl:
-            config = _safe_json_dict(tpl.config_json)
+async def load_sheet(db: AsyncSession, ch: Character) -> dict:
+    """Sheet for an already-resolved character (e.g. from get_owned_or_dm_character).
+
+    One round of eager loading instead of a query per section: the character
+    row with equipment + template joined in, plus one selectin query per child
+    collection — a fixed 6 queries no matter how big the inventory is.
+    """
+    q = await db.execute(
+        select(Character)
+        .where(Character.id == ch.id)
+        .options(
+            joinedload(Character.equipment),
+            joinedload(Character.template),
+            selectinload(Character.items),
+            selectinload(Character.spells),
+            selectinload(Character.abilities),
+            selectinload(Character.states),
+            selectinload(Character.summons),
+        )
+        .execution_options(populate_existing=True)
+    )
+    ch = q.unique().scalar_one()
+    combat_buffer.overlay(ch)
+
+    eq = ch.equipment
+    if eq is None and db.info.get("read_only"):
+        # fresh character read through a reader session: show empty slots, the
+        # row gets created by the first equipment PATCH
+        eq = Equipment(character_id=ch.id, **{slot: "" for slot in EQUIPMENT_SLOTS})
+    elif eq is None:
+        # first open of a fresh character — the only case that still writes
+        eq = await get_or_create_equipment(db, ch.id)
+
+    tpl = ch.template
+    config = _safe_json_dict(tpl.config_json) if tpl else None
 
     custom = _safe_json_dict(ch.custom_values)
 
     return {
         "character": ch,
-        "items": items,
-        "spells": spells,
-        "abilities": abilities,
-        "states": states,
-        "summons": summons,
+        "items": list(ch.items),
+        "spells": list(ch.spells),
+        "abilities": list(ch.abilities),
+        "states": list(ch.states),
+        "summons": list(ch.summons),
         "equipment": eq,
         "template": {"id": tpl.id, "name": tpl.name, "config": config} if tpl else None,
         "custom_values": custom,
     }
 
 
+SHEET_CHILD_MODELS = {
+    "items": Item,
+    "spells": Spell,
+    "abilities": Ability,
+    "states": State,
+    "summons": Summon,
+}
+
+SHEET_CHILD_FIELDS = {
+    "items": ITEM_FIELDS,
+    "spells": SPELL_FIELDS,
+    "abilities": ABILITY_FIELDS,
+    "states": STATE_FIELDS,
+    "summons": SUMMON_FIELDS,
+}
+
+
+async def get_sheet_changes(db: AsyncSession, ch: Character, since: int) -> dict:
+    """Everything about the sheet that changed after version `since`: sections
+    are only present when touched, child lists only carry changed rows, and
+    `deleted` lists ids removed since then. An up-to-date client costs no
+    queries beyond the access check that already loaded `ch`.
+
+    A client with nothing to go on (`since` < 1 — also rows from before
+    per-row versions carry 0) or further behind than the tombstones kept
+    (settings.SHEET_TOMBSTONE_VERSIONS) gets the whole sheet, marked `full`."""
+    if since < 1 or since < ch.version - settings.SHEET_TOMBSTONE_VERSIONS:
+        sheet = await load_sheet(db, ch)
+        return {
+            **sheet,
+            "version": sheet["character"].version,
+            "full": True,
+            "deleted": {kind: [] for kind in SHEET_CHILD_MODELS},
+        }
+
+    changes: dict = {"version": ch.version}
+    buffered = combat_buffer.generation(ch.id) is not None
+    if since >= ch.version and not buffered:
+        return changes
+
+    if ch.fields_version > since or buffered:
+        combat_buffer.overlay(ch)
+        changes["character"] = ch
+    if ch.custom_version > since:
+        tpl = await db.get(SheetTemplate, ch.template_id) if ch.template_id else None
+        changes["template"] = (
+            {"id": tpl.id, "name": tpl.name, "config": _safe_json_dict(tpl.config_json)} if tpl else None
+        )
+        changes["custom_values"] = _safe_json_dict(ch.custom_values)
+
+    for kind, model in SHEET_CHILD_MODELS.items():
+        q = await db.execute(
+            select(model).where(model.character_id == ch.id, model.version > since)
+        )
+        changes[kind] = list(q.scalars().all())
+
+    q = await db.execute(
+        select(Equipment).where(Equipment.character_id == ch.id, Equipment.version > since)
+    )
+    eq = q.scalar_one_or_none()
+    if eq:
+        changes["equipment"] = eq
+
+    q = await db.execute(
+        select(SheetTombstone.kind, SheetTombstone.row_id).where(
+            SheetTombstone.character_id == ch.id,
+            SheetTombstone.version > since,
+        )
+    )
+    deleted: dict[str, list[int]] = {kind: [] for kind in SHEET_CHILD_MODELS}
+    for kind, row_id in q.all():
+        deleted.setdefault(kind, []).append(row_id)
+    changes["deleted"] = deleted
+
+    return changes
+
+
+# =========================
+# BATCH (combat HUD: one round trip per user action)
+# =========================
+
+async def apply_sheet_batch(
+    db: AsyncSession,
+    ch: Character,
+    actor_user_id: int,
+    ops: list[dict],
+) -> tuple[bool, list[dict] | str]:
+    """Apply already-validated ops in order, in one transaction with a single
+    version bump and a single commit. All-or-nothing: the first op that
+    points at a missing row rolls the whole batch back.
+
+    Each op is {"op": "patch_character", "data": CharacterUpdate},
+    {"op": "add"|"update"|"delete", "kind": <SHEET_CHILD_MODELS key>, "id", "data"}
+    or {"op": "log", "text"}.
+    Returns (True, per-op results) or (False, error message).
+    """
+    touches_sheet = any(op["op"] != "log" for op in ops)
+    version = None
+    if touches_sheet:
+        version = await _bump_version(
+            db, ch.id, fields=any(op["op"] == "patch_character" for op in ops)
+        )
+
+    results: list[dict] = []
+    logged = False
+    added: list[tuple[int, object]] = []
+    deleted_any = False
+
+    for i, op in enumerate(ops):
+        kind = op.get("kind")
+        model = SHEET_CHILD_MODELS.get(kind)
+
+        if op["op"] == "patch_character":
+            await _apply_character_update(db, ch, actor_user_id, op["data"])
+            results.append({"status": "ok"})
+
+        elif op["op"] == "add":
+            obj = model(character_id=ch.id, version=version, **op["data"].model_dump())
+            db.add(obj)
+            added.append((i, obj))
+            results.append({})  # id is only known after flush
+
+        elif op["op"] in ("update", "delete"):
+            obj = await db.get(model, op["id"])
+            if not obj or obj.character_id != ch.id:
+                await db.rollback()
+                return False, f"ops[{i}]: {kind} #{op['id']} not found"
+
+            if op["op"] == "update":
+                for field in SHEET_CHILD_FIELDS[kind]:
+                    v = getattr(op["data"], field, None)
+                    if v is not None:
+                        setattr(obj, field, v)
+                obj.version = version
+            else:
+                db.add(SheetTombstone(character_id=ch.id, kind=kind, row_id=obj.id, version=version))
+                await db.delete(obj)
+                deleted_any = True
+            results.append({"status": "ok"})
+
+        elif op["op"] == "log":
+            db.add(ActionLogEntry(character_id=ch.id, text=op["text"][:500]))
+            logged = True
+            results.append({"status": "ok"})
+
+    await db.flush()
+    for i, obj in added:
+        results[i] = {"id": obj.id}
+    if logged:
+        await _trim_action_log(db, ch.id)
+    if deleted_any:
+        await _prune_tombstones(db, ch.id, version)
+
+    await db.commit()
+    return True, results
+
+
 # =========================
 # IMPORT / EXPORT
 # =========================
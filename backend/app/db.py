@@ -1,8 +1,10 @@
 import os
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from .config import settings
+from .perf import install_query_hooks
 from .models import Base  # ВАЖНО: используем Base из models.py
 
 
@@ -15,9 +17,144 @@ def _db_url() -> str:
     return settings.SQLITE_PATH
 
 
-engine = create_async_engine(_db_url(), echo=False)
+def _replica_url() -> str | None:
+    url = os.getenv("DATABASE_REPLICA_URL")
+    if url:
+        url = url.replace("postgres://", "postgresql+asyncpg://")
+        url = url.replace("postgresql://", "postgresql+asyncpg://")
+    return url or None
+
+
+def sqlite_pragmas() -> dict[str, str | int]:
+    """PRAGMAs of the "production" SQLITE_PROFILE, applied to every new connection.
+
+    WAL lets readers run alongside the (single) writer instead of blocking on
+    it; synchronous=NORMAL is durable under WAL except for the last commits
+    on power loss; busy_timeout makes a second writer wait inside SQLite
+    instead of failing with "database is locked".
+    """
+    pragmas: dict[str, str | int] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        # negative = size in KiB rather than in pages
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+        "temp_store": "MEMORY",
+    }
+    if settings.SQLITE_FOREIGN_KEYS:
+        pragmas["foreign_keys"] = "ON"
+    return pragmas
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict[str, str | int]) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _make_engine(url: str):
+    if not url.startswith("sqlite") or settings.SQLITE_PROFILE != "production":
+        return create_async_engine(url, echo=False)
+
+    # enough connections for concurrent readers — under WAL they don't
+    # block each other or the writer
+    engine = create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.SQLITE_POOL_SIZE,
+        max_overflow=settings.SQLITE_POOL_SIZE,
+    )
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
+
+def _make_writer_engine(url: str):
+    """The one connection app.db_writer funnels all queued writes through."""
+    engine = create_async_engine(url, echo=False, pool_size=1, max_overflow=0)
+    pragmas = sqlite_pragmas() if settings.SQLITE_PROFILE == "production" else {}
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+        # take over BEGIN from the driver — pysqlite's implicit transactions
+        # break SAVEPOINT, which group commit relies on
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_begin(conn):
+        # grab the write lock up front instead of failing to upgrade later
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+def _make_read_engine(url: str):
+    """Engine behind ReadSessionLocal (GET routes).
+
+    SQLite: its own pool whose connections are query_only, so a read can
+    never take the write lock. Postgres: DATABASE_REPLICA_URL when set,
+    otherwise the primary's pool with read-only transactions.
+    """
+    if not url.startswith("sqlite"):
+        replica = _replica_url()
+        if replica:
+            return create_async_engine(replica, echo=False)
+        return engine.execution_options(postgresql_readonly=True)
+
+    if settings.SQLITE_PROFILE == "production":
+        read_engine = create_async_engine(
+            url,
+            echo=False,
+            pool_size=settings.SQLITE_POOL_SIZE,
+            max_overflow=settings.SQLITE_POOL_SIZE,
+        )
+        pragmas = {**sqlite_pragmas(), "query_only": "ON"}
+    else:
+        read_engine = create_async_engine(url, echo=False)
+        pragmas = {"query_only": "ON"}
+
+    @event.listens_for(read_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return read_engine
+
+
+engine = _make_engine(_db_url())
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+read_engine = _make_read_engine(_db_url())
+# info["read_only"] lets crud skip the few lazy writes a read would do
+# (see crud.load_sheet)
+ReadSessionLocal = async_sessionmaker(
+    read_engine, expire_on_commit=False, class_=AsyncSession, info={"read_only": True},
+)
+
+# SQLITE_WRITER_QUEUE — see app/db_writer.py
+writer_engine = (
+    _make_writer_engine(_db_url())
+    if settings.SQLITE_WRITER_QUEUE and _db_url().startswith("sqlite")
+    else None
+)
+
+# per-request query counts/timings for Server-Timing and /api/dev/perf
+install_query_hooks(engine.sync_engine)
+if read_engine.sync_engine.pool is not engine.sync_engine.pool:
+    # (the Postgres no-replica reader is the primary engine with options —
+    # it already shares its hooks)
+    install_query_hooks(read_engine.sync_engine)
+if writer_engine is not None:
+    install_query_hooks(writer_engine.sync_engine)
+
 
 async def get_db():
     async with SessionLocal() as session:
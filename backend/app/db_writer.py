@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncSessionTransaction, async_sessionmaker
+
+from .config import settings
+from .db import writer_engine
+from .events import drop_pending_events_since, pending_events_mark
+from .perf import RequestStats, attribute_to, current_stats
+
+log = logging.getLogger("dnd.db_writer")
+
+WriteUnit = Callable[[AsyncSession], Awaitable[Any]]
+# a queued unit, the caller's future and the caller's perf stats
+_Entry = tuple[WriteUnit, asyncio.Future, RequestStats | None]
+
+
+class _UnitSession(AsyncSession):
+    """Writer session as seen by the crud function running one unit.
+
+    crud functions commit (and occasionally roll back) on their own; inside
+    a unit that would end the whole group, so commit() only flushes and
+    rollback() only rewinds this unit's savepoint — and drops the events the
+    unit queued, which would otherwise go out with the group's commit, and
+    gives back the write-behind values it took. The writer commits the group
+    once every unit of it has run.
+    """
+
+    unit: AsyncSessionTransaction | None = None
+    # len(pending_events) and write_behind.taken_mark when the unit began
+    unit_events_mark = 0
+    unit_taken_mark = 0
+
+    async def begin_unit(self) -> None:
+        # write_behind queues its flushes here, hence the late import
+        from .write_behind import taken_mark
+
+        self.unit = await self.begin_nested()
+        self.unit_events_mark = pending_events_mark(self)
+        self.unit_taken_mark = taken_mark(self)
+
+    async def rewind_unit(self) -> None:
+        from .write_behind import give_back_taken_since
+
+        if self.unit.is_active:
+            await self.unit.rollback()
+        drop_pending_events_since(self, self.unit_events_mark)
+        give_back_taken_since(self, self.unit_taken_mark)
+
+    async def commit(self) -> None:
+        if self.unit is None:
+            return await super().commit()
+        await self.flush()
+
+    async def rollback(self) -> None:
+        if self.unit is None:
+            return await super().rollback()
+        await self.rewind_unit()
+        await self.begin_unit()
+
+
+class GroupCommitWriter:
+    """Single-writer queue with group commit for SQLite.
+
+    SQLite runs one write transaction at a time, so concurrent autosaves
+    used to queue on the file lock, each with its own BEGIN/COMMIT (and
+    fsync). Here they queue in-process instead: one task owns the writer
+    connection, runs every unit that arrives within `window_seconds` of the
+    first one in its own SAVEPOINT, and commits them all at once. A unit
+    that raises only loses its savepoint — its caller gets the exception,
+    the rest of the group still commits.
+
+    Results are detached from the writer session after the commit, with
+    everything the unit loaded still readable.
+    """
+
+    def __init__(self, session_factory, window_seconds: float, max_group: int):
+        self.session_factory = session_factory
+        self.window_seconds = window_seconds
+        self.max_group = max_group
+        self._queue: asyncio.Queue[_Entry] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_factory is not None
+
+    async def run(self, unit: WriteUnit) -> Any:
+        """Queue `unit(session)` and wait until the group it ended up in is committed."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((unit, future, current_stats()))
+        return await future
+
+    async def _next_group(self) -> list[_Entry]:
+        group = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window_seconds
+        while len(group) < self.max_group:
+            try:
+                group.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                group.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return group
+
+    async def _commit_group(self, group: list[_Entry]) -> None:
+        done: list[tuple[asyncio.Future, Any]] = []
+        async with self.session_factory() as db:
+            for unit, future, stats in group:
+                if future.done():  # caller went away (request cancelled)
+                    continue
+                await db.begin_unit()
+                try:
+                    # the unit's queries show up in its request's Server-Timing
+                    with attribute_to(stats):
+                        result = await unit(db)
+                        if db.unit.is_active:
+                            await db.unit.commit()
+                except Exception as e:
+                    await db.rewind_unit()
+                    future.set_exception(e)
+                    continue
+                finally:
+                    db.unit = None
+                done.append((future, result))
+
+            try:
+                await db.commit()
+            except Exception as e:
+                log.exception("group commit of %d units failed", len(done))
+                for future, _ in done:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            db.expunge_all()
+
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self) -> None:
+        while True:
+            group = await self._next_group()
+            try:
+                await self._commit_group(group)
+            except Exception as e:
+                # connection-level failure — fail the whole group, keep serving
+                log.exception("writer failed")
+                for _, future, _ in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("writer stopped"))
+
+
+sqlite_writer = GroupCommitWriter(
+    session_factory=(
+        async_sessionmaker(writer_engine, expire_on_commit=False, class_=_UnitSession)
+        if writer_engine is not None
+        else None
+    ),
+    window_seconds=settings.SQLITE_GROUP_COMMIT_WINDOW_MS / 1000,
+    max_group=settings.SQLITE_GROUP_COMMIT_MAX,
+)
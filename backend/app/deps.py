@@ -1,15 +1,30 @@
 import json
 
-from fastapi import Depends, Header, HTTPException, Request
+from fastapi import BackgroundTasks, Depends, Header, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .access_cache import CharacterHandle, access_cache
 from .config import settings
-from .db import get_db
+from .db import ReadSessionLocal, SessionLocal, get_db
+from .db_writer import sqlite_writer
+from .identity_cache import identity_cache
+from .single_flight import READ_ONLY
 from .security import SESSION_COOKIE_NAME, read_session_cookie, verify_telegram_init_data
 from .models import Character, User
 from . import crud
 
 
+async def get_read_db():
+    """Session for GET routes: reader pool (query_only on SQLite, the replica
+    on Postgres when configured), so polling never contends with writers.
+    Only for routes that don't write; get_current_user looks users up here
+    too, and the access checks of GET requests. Marked read-only, so
+    @coalesced_read crud calls may share results."""
+    async with ReadSessionLocal() as session:
+        session.info[READ_ONLY] = True
+        yield session
+
+
 async def resolve_auth_profile(
     request: Request,
     x_tg_init_data: str | None = Header(default=None, alias="X-TG-INIT-DATA"),
@@ -46,41 +61,125 @@ async def resolve_auth_profile(
     return profile
 
 
+async def _save_profile_names(user_id: int, first_name: str | None, username: str | None) -> None:
+    async with SessionLocal() as db:
+        await run_write(db, crud.update_user_names, user_id, first_name, username)
+
+
+async def _create_user(provider: str, user_key: int, first_name: str | None, username: str | None) -> User:
+    """First login: the one write get_current_user can't avoid, on a write
+    session of its own (get_or_create, in case a parallel request won)."""
+    async with SessionLocal() as db:
+        if provider == "vk":
+            return await run_write(
+                db, crud.get_or_create_user_by_vk, vk_id=user_key, first_name=first_name, username=username
+            )
+        return await run_write(
+            db, crud.get_or_create_user, tg_id=user_key, first_name=first_name, username=username
+        )
+
+
 async def get_current_user(
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_read_db),
     profile: dict = Depends(resolve_auth_profile),
 ) -> User:
+    """The User behind the request, detached (see identity_cache). A cache hit
+    costs no queries, a miss one lookup on the reader session; only a first
+    login writes, and a changed Telegram/VK name is saved after the response."""
+    provider = "vk" if profile["provider"] == "vk" else "telegram"
     first_name = profile.get("first_name")
     username = profile.get("username")
-    if profile["provider"] == "vk":
-        return await crud.get_or_create_user_by_vk(db, vk_id=profile["user_key"], first_name=first_name, username=username)
-    return await crud.get_or_create_user(db, tg_id=profile["user_key"], first_name=first_name, username=username)
+
+    cached = identity_cache.get(provider, profile["user_key"])
+    if cached is None:
+        user = await crud.get_user_by_provider_id(db, provider, profile["user_key"])
+        if user is None:
+            user = await _create_user(provider, profile["user_key"], first_name, username)
+        cached = identity_cache.put(provider, user)
+
+    if (first_name and first_name != cached.first_name) or (username and username != cached.username):
+        cached.first_name = first_name or cached.first_name
+        cached.username = username or cached.username
+        background_tasks.add_task(_save_profile_names, cached.user_id, cached.first_name, cached.username)
+    return cached.to_user()
+
+
+async def _check_character_access(db: AsyncSession, ch_id: int, u: User) -> Character:
+    ch = await crud.get_character_by_id(db, ch_id)
+    if not ch:
+        raise HTTPException(404, "Character not found")
+
+    if ch.owner_user_id != u.id:
+        # DEV_USER_IDS/DM_USER_IDS are lists of trusted external ids — checked
+        # against whichever provider id the user actually logged in with (VK
+        # users have tg_id=None and vice versa), so either match grants access.
+        is_global_dm = u.tg_id in settings.dm_ids() or u.vk_id in settings.dm_ids()
+        is_campaign_dm = ch.campaign is not None and ch.campaign.dm_user_id == u.id
+        if not is_global_dm and not is_campaign_dm:
+            raise HTTPException(403, "No access")
+
+    access_cache.put(u.id, CharacterHandle(ch.id, ch.owner_user_id, ch.campaign_id))
+    return ch
+
+
+def _is_read(request: Request) -> bool:
+    return request.method in ("GET", "HEAD")
+
+
+def _cached_access(request: Request, user_id: int, ch_id: int) -> CharacterHandle | None:
+    """A cached decision, for reads only. access_cache is per process, so a
+    grant revoked through another worker can outlive the change by up to the
+    TTL — writes always check afresh."""
+    if not _is_read(request):
+        return None
+    return access_cache.get(user_id, ch_id)
+
+
+def _access_db(request: Request, db: AsyncSession, read_db: AsyncSession) -> AsyncSession:
+    """Where the access check runs: the reader session for reads; writes
+    check on the primary (a replica may lag behind a revocation) and get the
+    row in the session they write with. Sessions only take a connection
+    once queried, so the one not picked costs nothing."""
+    return read_db if _is_read(request) else db
 
 
 async def get_owned_or_dm_character(
     ch_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ) -> Character:
     """Resolve {ch_id} from the URL path and check the current user may
     access it (owner, or one of settings.DM_USER_IDS). Shared by every
-    route that used to repeat this 404/403 check by hand."""
-    ch = await crud.get_character_by_id(db, ch_id)
-    if not ch:
-        raise HTTPException(404, "Character not found")
+    route that used to repeat this 404/403 check by hand.
 
-    if ch.owner_user_id == u.id:
-        return ch
+    With a cached decision (access_cache) only the row itself is loaded —
+    the same way as after a full check; routes that don't need the row take
+    get_character_handle instead."""
+    db = _access_db(request, db, read_db)
+    if _cached_access(request, u.id, ch_id) is not None:
+        ch = await crud.get_character_by_id(db, ch_id)
+        if ch is not None:
+            return ch
+    return await _check_character_access(db, ch_id, u)
 
-    # DEV_USER_IDS/DM_USER_IDS are lists of trusted external ids — checked
-    # against whichever provider id the user actually logged in with (VK
-    # users have tg_id=None and vice versa), so either match grants access.
-    is_global_dm = u.tg_id in settings.dm_ids() or u.vk_id in settings.dm_ids()
-    is_campaign_dm = ch.campaign is not None and ch.campaign.dm_user_id == u.id
-    if not is_global_dm and not is_campaign_dm:
-        raise HTTPException(403, "No access")
 
-    return ch
+async def get_character_handle(
+    ch_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    u: User = Depends(get_current_user),
+) -> CharacterHandle:
+    """get_owned_or_dm_character for routes that only need the access check
+    (they work by ch_id): no queries at all while a read's decision is cached."""
+    handle = _cached_access(request, u.id, ch_id)
+    if handle is None:
+        ch = await _check_character_access(_access_db(request, db, read_db), ch_id, u)
+        handle = CharacterHandle(ch.id, ch.owner_user_id, ch.campaign_id)
+    return handle
 
 
 async def require_dev(u: User = Depends(get_current_user)) -> User:
@@ -96,3 +195,25 @@ async def require_subscription(u: User = Depends(get_current_user)) -> User:
     if is_dev or crud.is_subscription_active(u):
         return u
     raise HTTPException(402, "Subscription required")
+
+
+async def run_write(db: AsyncSession, fn, *args, **kwargs):
+    """Run the write `fn(session, *args, **kwargs)` — on the request's own
+    session, or through the group-commit writer when SQLITE_WRITER_QUEUE is
+    on. A Character argument (typically from get_owned_or_dm_character) is
+    re-loaded in the writer's session there, since ORM objects can't move
+    between sessions."""
+    if not sqlite_writer.enabled:
+        return await fn(db, *args, **kwargs)
+
+    async def unit(wdb: AsyncSession):
+        bound = []
+        for arg in args:
+            if isinstance(arg, Character):
+                arg = await crud.get_character_by_id(wdb, arg.id)
+                if arg is None:
+                    raise HTTPException(404, "Character not found")
+            bound.append(arg)
+        return await fn(wdb, *bound, **kwargs)
+
+    return await sqlite_writer.run(unit)
@@ -7,8 +7,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from .db import get_db
-from .deps import require_dev
+from .deps import require_dev, run_write
+from . import perf
 from .rate_limit import rate_limit
+from .single_flight import single_flight
 from .security import SESSION_COOKIE_NAME, create_session_cookie
 from .config import settings
 from .models import (
@@ -22,7 +24,7 @@ from .models import (
 )
 from . import crud, schemas
 
-router = APIRouter()
+router = APIRouter(prefix="/api/dev")
 
 audit_log = logging.getLogger("dnd.audit")
 
@@ -46,6 +48,13 @@ async def dev_stats(db: AsyncSession = Depends(get_db)):
     return stats
 
 
+@router.get("/perf", dependencies=[Depends(require_dev)])
+async def dev_perf():
+    """Rolling per-route latency/DB stats from app/perf.py, plus single-flight
+    hit/miss counters (this worker only)."""
+    return {**perf.snapshot(), "single_flight": single_flight.stats()}
+
+
 @router.get("/info", dependencies=[Depends(require_dev)])
 async def dev_info(db: AsyncSession = Depends(get_db)):
     try:
@@ -69,7 +78,7 @@ async def login_as(
     db: AsyncSession = Depends(get_db),
     dev: User = Depends(require_dev),
 ):
-    user = await crud.get_or_create_user(db, tg_id=body.tg_id, first_name=body.first_name)
+    user = await run_write(db, crud.get_or_create_user, tg_id=body.tg_id, first_name=body.first_name)
 
     audit_log.warning(
         "login-as: dev tg_id=%s vk_id=%s (user #%s) impersonated tg_id=%s (user #%s) at %s",
@@ -96,7 +105,7 @@ async def create_access_code(
     db: AsyncSession = Depends(get_db),
     dev: User = Depends(require_dev),
 ):
-    entry = await crud.generate_access_code(db, dev.id, body.duration_days)
+    entry = await run_write(db, crud.generate_access_code, dev.id, body.duration_days)
     return {"code": entry.code, "duration_days": entry.duration_days}
 
 
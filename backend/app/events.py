@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+log = logging.getLogger("dnd.events")
+
+# Campaign event types pushed to GET /api/campaigns/{id}/events. Payloads are
+# deliberately thin (ids, turn pointer) — clients re-fetch through the normal
+# endpoints, which apply the per-viewer visibility rules.
+MESSAGE_CREATED = "message-created"
+BATTLE_STARTED = "battle-started"
+TURN_ADVANCED = "turn-advanced"
+BATTLE_ENDED = "battle-ended"
+PARTICIPANT_RESOURCE_CHANGED = "participant-resource-changed"
+
+
+class EventBroker:
+    """In-process async pub/sub, one channel per campaign — the "local"
+    backend, enough for a single worker.
+
+    Each subscriber gets its own bounded queue; a subscriber that falls
+    behind loses its oldest events rather than holding up publishers (the
+    events only say "something changed, re-fetch", so dropping is safe).
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def publish(self, campaign_id: int, event_type: str, data: dict) -> None:
+        self._deliver(campaign_id, event_type, data)
+
+    def _deliver(self, campaign_id: int, event_type: str, data: dict) -> None:
+        for queue in self._subscribers.get(campaign_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((campaign_id, event_type, data))
+
+    @asynccontextmanager
+    async def subscribe(self, *campaign_ids: int):
+        """One queue of (campaign_id, event_type, data) for all of these campaigns."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for campaign_id in campaign_ids:
+            self._subscribers.setdefault(campaign_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for campaign_id in campaign_ids:
+                subscribers = self._subscribers.get(campaign_id)
+                if subscribers is not None:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[campaign_id]
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class SqliteEventBroker(EventBroker):
+    """Cross-worker backend: every worker appends its events to one small
+    SQLite file and tails it from its own high-water mark, delivering what
+    it reads to its local subscribers — its own events included, so there
+    is a single delivery path and one order for everyone.
+
+    The high-water mark is safe because SQLite has a single writer: ids are
+    handed out under the write lock, so a reader can never see id N+1
+    committed while N is still in flight. AUTOINCREMENT keeps ids growing
+    after old rows are pruned.
+    """
+
+    def __init__(self, path: str, poll_interval: float, retention_seconds: float, queue_size: int = 100):
+        super().__init__(queue_size)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._outbox: list[tuple[int, str, dict]] = []
+        self._wake = asyncio.Event()
+        self._conn: sqlite3.Connection | None = None
+        self._high_water = 0
+        self._next_prune = 0.0
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def publish(self, campaign_id: int, event_type: str, data: dict) -> None:
+        if self._task is None:
+            # not started (scripts, one-off tools): nobody else to tell
+            self._deliver(campaign_id, event_type, data)
+            return
+        self._outbox.append((campaign_id, event_type, data))
+        self._wake.set()
+
+    def _connect(self) -> sqlite3.Connection:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # only ever used by the tailer task, one to_thread call at a time
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")  # events are only hints; a crash may drop some
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS campaign_events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, campaign_id INTEGER NOT NULL,"
+            " type TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_campaign_events_created_at ON campaign_events (created_at)")
+        return conn
+
+    def _exchange(self, outbox: list[tuple[int, str, dict]]) -> list[tuple]:
+        """Append our events, then read everything past the high-water mark."""
+        conn = self._conn
+        now = time.time()
+        if outbox:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO campaign_events (campaign_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+                    [(campaign_id, event_type, json.dumps(data), now) for campaign_id, event_type, data in outbox],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if now >= self._next_prune:
+            conn.execute("DELETE FROM campaign_events WHERE created_at < ?", (now - self.retention_seconds,))
+            self._next_prune = now + 60
+        rows = conn.execute(
+            "SELECT id, campaign_id, type, data FROM campaign_events WHERE id > ? ORDER BY id",
+            (self._high_water,),
+        ).fetchall()
+        if rows:
+            self._high_water = rows[-1][0]
+        return rows
+
+    async def _run(self) -> None:
+        while not (self._stopping and not self._outbox):
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            outbox, self._outbox = self._outbox, []
+            try:
+                rows = await asyncio.to_thread(self._exchange, outbox)
+            except Exception:
+                # keep our events for the next round
+                self._outbox[:0] = outbox
+                log.exception("event tail failed")
+                continue
+            for _, campaign_id, event_type, data in rows:
+                self._deliver(campaign_id, event_type, json.loads(data))
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._conn = await asyncio.to_thread(self._connect)
+        # only what's published from now on — subscribers re-fetch on connect anyway
+        row = await asyncio.to_thread(lambda: self._conn.execute("SELECT max(id) FROM campaign_events").fetchone())
+        self._high_water = row[0] or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # one last round hands what we still hold to the other workers
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except asyncio.TimeoutError:
+            log.warning("dropping %d events on shutdown", len(self._outbox))
+        self._task = None
+        self._conn.close()
+        self._conn = None
+
+
+def _make_broker() -> EventBroker:
+    if settings.EVENTS_BACKEND == "sqlite":
+        return SqliteEventBroker(
+            settings.EVENTS_SQLITE_PATH,
+            poll_interval=settings.EVENTS_POLL_INTERVAL_MS / 1000,
+            retention_seconds=settings.EVENTS_RETENTION_SECONDS,
+        )
+    return EventBroker()
+
+
+broker = _make_broker()
+
+
+def publish_after_commit(db: AsyncSession, campaign_id: int, event_type: str, data: dict) -> None:
+    """Queue an event on the session and publish it once the transaction
+    really commits — so a subscriber that re-fetches sees the change, and
+    nothing goes out for a rolled-back write. Inside the group-commit writer
+    (db_writer) that is the group's commit, not the unit's."""
+    db.info.setdefault("pending_events", []).append((campaign_id, event_type, data))
+
+
+def pending_events_mark(db: AsyncSession) -> int:
+    """Position in the session's queued events, for drop_pending_events_since."""
+    return len(db.info.get("pending_events", ()))
+
+
+def drop_pending_events_since(db: AsyncSession, mark: int) -> None:
+    """Forget events queued after `mark` — for a rewound SAVEPOINT whose
+    outer transaction goes on to commit."""
+    del db.info.get("pending_events", [])[mark:]
+
+
+# SQLAlchemy fires after_commit/after_rollback for SAVEPOINTs too: only the
+# outermost transaction publishes or drops (a writer unit's savepoint is
+# released long before its group commits)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    if session.in_nested_transaction():
+        return
+    for campaign_id, event_type, data in session.info.pop("pending_events", ()):
+        try:
+            broker.publish(campaign_id, event_type, data)
+        except Exception:
+            log.exception("failed to publish %s for campaign %s", event_type, campaign_id)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending(session: Session, transaction) -> None:
+    # after_commit has already emptied the list if it committed; a rewound
+    # unit trims its own with drop_pending_events_since
+    if transaction.parent is None:
+        session.info.pop("pending_events", None)
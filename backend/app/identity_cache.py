@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from .config import settings
+from .models import User
+
+
+@dataclass
+class CachedIdentity:
+    user_id: int
+    tg_id: int | None
+    vk_id: int | None
+    first_name: str | None
+    username: str | None
+    subscription_expires_at: datetime | None
+    expires_at: float
+
+    def to_user(self) -> User:
+        """A fresh detached User per request — never shared between requests,
+        and no lazy loads (nothing hands it back to a session)."""
+        user = User(
+            id=self.user_id,
+            tg_id=self.tg_id,
+            vk_id=self.vk_id,
+            first_name=self.first_name,
+            username=self.username,
+            subscription_expires_at=self.subscription_expires_at,
+        )
+        make_transient_to_detached(user)
+        return user
+
+
+class IdentityCache:
+    """Bounded TTL/LRU cache of resolved users, keyed by (provider, user_key).
+
+    get_current_user runs on every authenticated request and used to cost a
+    users SELECT each time (plus a commit whenever the Telegram name
+    changed). With a hit it costs nothing. Role flags derive from
+    tg_id/vk_id (settings.DM_USER_IDS / DEV_USER_IDS), so caching the ids is
+    enough for require_dev & co.
+
+    Per-process: a subscription redeemed through another worker shows up
+    here after at most `ttl_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, int], CachedIdentity] = OrderedDict()
+
+    def get(self, provider: str, user_key: int) -> CachedIdentity | None:
+        key = (provider, user_key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, provider: str, user: User) -> CachedIdentity:
+        user_key = user.vk_id if provider == "vk" else user.tg_id
+        entry = CachedIdentity(
+            user_id=user.id,
+            tg_id=user.tg_id,
+            vk_id=user.vk_id,
+            first_name=user.first_name,
+            username=user.username,
+            subscription_expires_at=user.subscription_expires_at,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        key = (provider, user_key)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every entry for a user whose row just changed (e.g. subscription)."""
+        for key in [k for k, e in self._entries.items() if e.user_id == user_id]:
+            del self._entries[key]
+
+
+identity_cache = IdentityCache(
+    ttl_seconds=settings.IDENTITY_CACHE_TTL_SECONDS,
+    max_entries=settings.IDENTITY_CACHE_MAX_ENTRIES,
+)
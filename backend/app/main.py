@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
@@ -6,10 +8,29 @@ from fastapi.responses import Response
 from app.db import init_db
 from app.routes import router
 from app.auth_routes import router as auth_router
-from app.campaign_routes import router as campaign_router
+from app.campaign_routes import router as campaign_router, inbox_router
 from app.dev_routes import router as dev_router
+from app.perf import PerfMiddleware
+from app.db_writer import sqlite_writer
+from app.events import broker
+from app.write_behind import combat_buffer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    sqlite_writer.start()
+    combat_buffer.start()
+    await broker.start()
+    yield
+    # don't lose buffered HUD values on restart/deploy
+    await combat_buffer.stop()
+    await sqlite_writer.stop()
+    await broker.stop()
 
-app = FastAPI(title="DnD TG WebApp")
+
+app = FastAPI(title="DnD TG WebApp", lifespan=lifespan)
+app.add_middleware(PerfMiddleware)
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -28,10 +49,6 @@ app.add_middleware(
 
 from datetime import datetime
 
-@app.on_event("startup")
-async def on_startup():
-    await init_db()
-
 @app.get("/api/version")
 def version():
     return {"deployed_at": datetime.utcnow().isoformat() + "Z"}
@@ -52,10 +69,13 @@ def root():
 def health():
     return {"status": "ok"}
 
-app.include_router(router, prefix="/api")
-app.include_router(auth_router, prefix="/api/auth")
-app.include_router(campaign_router, prefix="/api/campaigns")
-app.include_router(dev_router, prefix="/api/dev")
+# prefixes live on the routers themselves, so a matched route's path_format
+# is the full path (perf's per-route stats key on it)
+app.include_router(router)
+app.include_router(auth_router)
+app.include_router(campaign_router)
+app.include_router(inbox_router)
+app.include_router(dev_router)
 
 # Раздаём webapp (папка рядом с backend/)
 app.mount("/webapp", StaticFiles(directory="../webapp", html=True), name="webapp")
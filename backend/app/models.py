@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Text, DateTime, ForeignKey, Boolean, UniqueConstraint
+from sqlalchemy import String, Integer, Text, DateTime, ForeignKey, Boolean, Index, UniqueConstraint
 
 class Base(DeclarativeBase):
     pass
@@ -51,16 +51,24 @@ class CampaignMember(Base):
     campaign_id: Mapped[int] = mapped_column(ForeignKey("campaigns.id"), index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     last_read_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
-    # JSON array of campaign_messages.id this member has personally hidden
-    # from their own inbox (doesn't affect other members' view of the message)
-    hidden_message_ids: Mapped[str] = mapped_column(Text, default="")
+    # сколько видимых участнику сообщений пришло после last_read_at — ведётся
+    # send_campaign_message / mark_campaign_messages_read, чтобы бейдж не
+    # требовал COUNT(*) по campaign_messages
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     campaign: Mapped["Campaign"] = relationship(back_populates="members")
     user: Mapped["User"] = relationship()
+    hidden_messages: Mapped[list["CampaignHiddenMessage"]] = relationship(
+        cascade="all, delete-orphan",
+    )
 
 
 class CampaignMessage(Base):
     __tablename__ = "campaign_messages"
+    # ключ курсора ленты сообщений (list_campaign_messages): новые первыми
+    __table_args__ = (
+        Index("ix_campaign_messages_campaign_created_id", "campaign_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     campaign_id: Mapped[int] = mapped_column(ForeignKey("campaigns.id"), index=True)
@@ -77,6 +85,15 @@ class CampaignMessage(Base):
     target: Mapped["User | None"] = relationship(foreign_keys=[target_user_id])
 
 
+class CampaignHiddenMessage(Base):
+    """A message this member has personally hidden from their own inbox
+    (doesn't affect other members' view of the message)."""
+    __tablename__ = "campaign_hidden_messages"
+
+    member_id: Mapped[int] = mapped_column(ForeignKey("campaign_members.id"), primary_key=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey("campaign_messages.id"), primary_key=True)
+
+
 class CampaignBattle(Base):
     __tablename__ = "campaign_battles"
 
@@ -85,6 +102,9 @@ class CampaignBattle(Base):
     round: Mapped[int] = mapped_column(Integer, default=1)
     turn_index: Mapped[int] = mapped_column(Integer, default=0)
     reveal_resources: Mapped[bool] = mapped_column(Boolean, default=True)
+    # растёт при смене хода и при изменении показываемых полей участников —
+    # по нему ждёт long-poll GET /campaigns/{id}/battle?wait_for_version=
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
 
     campaign: Mapped["Campaign"] = relationship()
     participants: Mapped[list["CampaignBattleParticipant"]] = relationship(
@@ -170,6 +190,14 @@ class Character(Base):
 
     level_up_rules: Mapped[str] = mapped_column(Text, default="")
 
+    # монотонный счётчик правок листа: растёт при любой мутации самого
+    # персонажа или его дочерних строк — используется как ETag для /sheet
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    # версия, на которой последний раз менялись поля самого персонажа /
+    # custom_values+шаблон — по ним /changes решает, слать ли эти секции
+    fields_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    custom_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
     owner: Mapped["User"] = relationship(back_populates="characters")
     campaign: Mapped["Campaign | None"] = relationship(back_populates="characters", foreign_keys=[campaign_id])
     items: Mapped[list["Item"]] = relationship(back_populates="character", cascade="all, delete-orphan")
@@ -181,6 +209,8 @@ class Character(Base):
 
     action_log: Mapped[list["ActionLogEntry"]] = relationship(back_populates="character", cascade="all, delete-orphan")
 
+    tombstones: Mapped[list["SheetTombstone"]] = relationship(cascade="all, delete-orphan")
+
     equipment: Mapped["Equipment"] = relationship(
         back_populates="character",
         cascade="all, delete-orphan",
@@ -225,6 +255,8 @@ class Item(Base):
     description: Mapped[str] = mapped_column(Text, default="")
     stats: Mapped[str] = mapped_column(Text, default="")  # можно JSON-строкой
     qty: Mapped[int] = mapped_column(Integer, default=1)
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="items")
 
@@ -240,6 +272,8 @@ class Spell(Base):
     cost: Mapped[str] = mapped_column(String(120), default="")  # “мана = x*10” и т.д.
     level: Mapped[int] = mapped_column(Integer, default=0)
     ap_cost: Mapped[int] = mapped_column(Integer, default=5)
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="spells")
 
@@ -255,6 +289,8 @@ class Ability(Base):
     cost: Mapped[str] = mapped_column(String(120), default="")
     level: Mapped[int] = mapped_column(Integer, default=0)
     ap_cost: Mapped[int] = mapped_column(Integer, default=1)
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="abilities")
 
@@ -268,6 +304,8 @@ class State(Base):
     hp_cost: Mapped[int] = mapped_column(Integer, default=0)
     duration: Mapped[str] = mapped_column(String(80), default="")
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="states")
 
@@ -290,6 +328,8 @@ class Equipment(Base):
     ring3: Mapped[str] = mapped_column(String(120), default="")
     ring4: Mapped[str] = mapped_column(String(120), default="")
     jewelry: Mapped[str] = mapped_column(String(120), default="")
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="equipment")
 
@@ -315,10 +355,24 @@ class Summon(Base):
     attack_range_ratio: Mapped[str] = mapped_column(String(40), default="0")
 
     count: Mapped[int] = mapped_column(Integer, default=1)
+    # Character.version на момент последней правки строки (для /changes)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     character: Mapped["Character"] = relationship(back_populates="summons")
 
 
+class SheetTombstone(Base):
+    """Marks a deleted child row of a sheet (item/spell/…) so /changes can tell
+    a client which ids to drop — the row itself is gone by then."""
+    __tablename__ = "sheet_tombstones"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    character_id: Mapped[int] = mapped_column(ForeignKey("characters.id"), index=True)
+    kind: Mapped[str] = mapped_column(String(20))  # "items" | "spells" | "abilities" | "states" | "summons"
+    row_id: Mapped[int] = mapped_column(Integer)
+    version: Mapped[int] = mapped_column(Integer)
+
+
 class ActionLogEntry(Base):
     __tablename__ = "action_log_entries"
 
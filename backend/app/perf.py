@@ -0,0 +1,154 @@
+"""Per-request DB/timing instrumentation.
+
+PerfMiddleware opens a RequestStats for every HTTP request; the cursor hooks
+installed on each engine (see db.py) add every statement's count, time and
+rows written to whichever RequestStats is current. At response start the totals go
+out as a Server-Timing header and into a rolling per-route window that
+GET /api/dev/perf summarizes.
+"""
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .config import settings
+
+# upper bounds (ms) of the latency histogram buckets; the last one is open
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("perf_request_stats", default=None)
+
+# "GET /api/characters/{ch_id}/sheet" -> recent (total_ms, db_ms, queries, rows written)
+_samples: dict[str, deque[tuple[float, float, int, int]]] = {}
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def attribute_to(stats: RequestStats | None):
+    """Count queries run here against `stats` — for work done on a request's
+    behalf outside its own task (the group-commit writer)."""
+    token = _current.set(stats)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def install_query_hooks(sync_engine) -> None:
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("perf_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["perf_started"].pop()
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+        # DB-API rowcount: rows written; SELECTs report -1 and count as 0
+        stats.rows += max(cursor.rowcount, 0)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(exception_context):
+        # a statement that raised never reaches _after
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("perf_started", None)
+
+
+def _route_key(scope) -> str:
+    # the routers carry their prefixes (main.py), so this is the full template
+    template = getattr(scope.get("route"), "path_format", None)
+    if template is None:
+        return f"{scope['method']} (unmatched)"
+    return f"{scope['method']} {template}"
+
+
+def _record(key: str, total_ms: float, stats: RequestStats) -> None:
+    window = _samples.get(key)
+    if window is None:
+        window = _samples[key] = deque(maxlen=settings.PERF_SAMPLES_PER_ROUTE)
+    window.append((total_ms, stats.db_seconds * 1000, stats.queries, stats.rows))
+
+
+class PerfMiddleware:
+    """Plain ASGI middleware (not BaseHTTPMiddleware) so the header can be
+    added at response start without buffering the body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = stats.db_seconds * 1000
+                timing = (
+                    f'db;dur={db_ms:.1f};desc="{stats.queries} queries, {stats.rows} rows written", '
+                    f"total;dur={total_ms:.1f}"
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+                _record(_route_key(scope), total_ms, stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def snapshot() -> dict:
+    """Per-route summary of the rolling windows, slowest p95 first."""
+    routes = []
+    for key, window in list(_samples.items()):
+        samples = list(window)
+        totals = sorted(s[0] for s in samples)
+        n = len(samples)
+        histogram = {f"le_{bound}ms": 0 for bound in HISTOGRAM_BUCKETS_MS}
+        histogram["inf"] = 0
+        for total in totals:
+            bucket = next((f"le_{b}ms" for b in HISTOGRAM_BUCKETS_MS if total <= b), "inf")
+            histogram[bucket] += 1
+        routes.append({
+            "route": key,
+            "count": n,
+            "p50_ms": round(_percentile(totals, 0.50), 2),
+            "p95_ms": round(_percentile(totals, 0.95), 2),
+            "p99_ms": round(_percentile(totals, 0.99), 2),
+            "max_ms": round(totals[-1], 2),
+            "avg_db_ms": round(sum(s[1] for s in samples) / n, 2),
+            "avg_queries": round(sum(s[2] for s in samples) / n, 2),
+            "avg_rows_written": round(sum(s[3] for s in samples) / n, 2),
+            "histogram": histogram,
+        })
+    routes.sort(key=lambda r: r["p95_ms"], reverse=True)
+    return {"window": settings.PERF_SAMPLES_PER_ROUTE, "routes": routes}
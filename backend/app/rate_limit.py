@@ -1,14 +1,135 @@
+import os
+import sqlite3
+import threading
 import time
-from collections import defaultdict, deque
+from collections import OrderedDict
 
 from fastapi import HTTPException, Request
 
-# In-memory per-process sliding-window rate limiter. Good enough for a
-# single-instance deployment; resets on restart and doesn't share state
-# across workers, but that's an acceptable tradeoff for blunting
-# brute-force/forged-auth attempts on login endpoints without adding a
-# Redis dependency.
-_hits: dict[tuple[str, str], deque] = defaultdict(deque)
+from .config import settings
+
+# Token-bucket rate limiting for the login endpoints: each (bucket, client IP)
+# key holds up to `limit` tokens, refilled at limit/window per second. Two
+# backends — pick with RATE_LIMIT_BACKEND:
+#   "memory" — per process, bounded (idle keys are swept, hard key cap);
+#   "sqlite" — one small SQLite file shared by every worker on the node, so
+#              N uvicorn workers enforce one budget instead of N.
+# Either way no Redis dependency.
+
+
+class MemoryRateLimiter:
+    def __init__(self, max_keys: int, sweep_interval: float = 60.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # key -> (tokens, last refill, refilled-to-full-by)
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._lock = threading.Lock()  # sync dependencies run in the threadpool
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, key: str, limit: int, window_seconds: float) -> bool:
+        now = time.monotonic()
+        rate = limit / window_seconds
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            tokens, last, _ = self._buckets.pop(key, (limit, now, now))
+            tokens = min(limit, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (limit - tokens) / rate)
+            if len(self._buckets) > self.max_keys:
+                # the least recently seen key just gets a fresh bucket later
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def _sweep(self, now: float) -> None:
+        # a bucket that has refilled completely is the same as no bucket
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+
+class SqliteRateLimiter:
+    def __init__(self, path: str, max_keys: int, sweep_interval: float = 60.0):
+        self.path = path
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+                " updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_full_at ON rate_limits (full_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_updated_at ON rate_limits (updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a few hits on a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self._count(self._connect())
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT count(*) FROM rate_limits").fetchone()[0]
+
+    def hit(self, key: str, limit: int, window_seconds: float) -> bool:
+        # wall clock, not monotonic: the timestamps are compared across processes
+        now = time.time()
+        rate = limit / window_seconds
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tokens = limit if row is None else min(limit, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (limit - tokens) / rate),
+            )
+            if row is None and self._count(conn) > self.max_keys:
+                # hard cap, as in memory: the least recently seen key just
+                # gets a fresh bucket later
+                conn.execute(
+                    "DELETE FROM rate_limits WHERE key ="
+                    " (SELECT key FROM rate_limits ORDER BY updated_at LIMIT 1)"
+                )
+            if now >= self._next_sweep:
+                self._sweep(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def _sweep(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM rate_limits WHERE full_at <= ?", (now,))
+        self._next_sweep = now + self.sweep_interval
+
+
+def _make_limiter():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SqliteRateLimiter(settings.RATE_LIMIT_SQLITE_PATH, settings.RATE_LIMIT_MAX_KEYS)
+    return MemoryRateLimiter(settings.RATE_LIMIT_MAX_KEYS)
+
+
+limiter = _make_limiter()
 
 
 def _client_ip(request: Request) -> str:
@@ -20,17 +141,11 @@ def _client_ip(request: Request) -> str:
 
 def rate_limit(bucket: str, limit: int, window_seconds: int):
     """FastAPI dependency: at most `limit` requests per `window_seconds` per
-    client IP, within a given named `bucket` (so different endpoints don't
-    share a budget)."""
+    client IP (bursts up to `limit`, then refilling evenly), within a given
+    named `bucket` (so different endpoints don't share a budget)."""
 
     def dependency(request: Request) -> None:
-        key = (bucket, _client_ip(request))
-        now = time.monotonic()
-        hits = _hits[key]
-        while hits and now - hits[0] > window_seconds:
-            hits.popleft()
-        if len(hits) >= limit:
+        if not limiter.hit(f"{bucket}:{_client_ip(request)}", limit, window_seconds):
             raise HTTPException(429, "Too many requests, try again later")
-        hits.append(now)
 
     return dependency
@@ -1,15 +1,50 @@
 import asyncio
 import json
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from .db import get_db
-from .deps import get_current_user, get_owned_or_dm_character, resolve_auth_profile, require_subscription
+from .access_cache import CharacterHandle
+from .deps import (
+    get_character_handle, get_current_user, get_owned_or_dm_character, get_read_db,
+    resolve_auth_profile, require_subscription, run_write,
+)
 from .models import Character, User
 from .config import settings
+from .write_behind import combat_buffer
 from . import crud, schemas
 
-router = APIRouter()
+router = APIRouter(prefix="/api")
+
+
+def _character_etag(ch: Character) -> str:
+    buffered = combat_buffer.generation(ch.id)
+    if buffered is not None:
+        # write-behind values change the response without bumping the version
+        return f'"{ch.id}-{ch.version}.{buffered}"'
+    return f'"{ch.id}-{ch.version}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison (RFC 9110 13.1.2): a W/ prefix doesn't matter for GETs
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def _not_modified_or_tag(response: Response, ch: Character, if_none_match: str | None) -> Response | None:
+    """Answer a conditional GET from Character.version alone, before any child
+    table is touched. Returns a 304 to send as-is, or None after tagging
+    `response` with the ETag for a full 200."""
+    etag = _character_etag(ch)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
 
 
 @router.get("/me")
@@ -40,7 +75,7 @@ async def redeem_subscription_code(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok, result = await crud.redeem_access_code(db, u.id, body.code)
+    ok, result = await run_write(db, crud.redeem_access_code, u.id, body.code)
     if not ok:
         raise HTTPException(400, result)
     return {"status": "ok", "subscription_expires_at": result}
@@ -58,7 +93,7 @@ async def send_feedback(
     if not text:
         raise HTTPException(400, "Text is required")
 
-    await crud.create_feedback_report(db, u.id, kind, text)
+    await run_write(db, crud.create_feedback_report, u.id, kind, text)
 
     display_name = profile.get("first_name") or profile.get("username") or f"Пользователь #{u.id}"
     emoji = "🐛" if kind == "bug" else "💡"
@@ -92,7 +127,7 @@ async def send_feedback(
 
 @router.get("/characters")
 async def list_characters(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
 
@@ -114,8 +149,14 @@ async def list_characters(
 
 @router.get("/characters/{ch_id}")
 async def get_character(
+    response: Response,
     ch: Character = Depends(get_owned_or_dm_character),
+    if_none_match: str | None = Header(default=None),
 ):
+    not_modified = _not_modified_or_tag(response, ch, if_none_match)
+    if not_modified:
+        return not_modified
+    combat_buffer.overlay(ch)
 
     # отдаём расширенный лист (чтобы webapp мог рисовать все поля)
     return {
@@ -170,6 +211,7 @@ async def get_character(
         "dodges": ch.dodges,
 
         "level_up_rules": ch.level_up_rules,
+        "version": ch.version,
     }
 
 @router.patch("/characters/{ch_id}")
@@ -180,16 +222,30 @@ async def update_character(
     ch: Character = Depends(get_owned_or_dm_character),
 ):
 
-    ch = await crud.update_character(db, ch, u.id, body)
+    ch = await run_write(db, crud.update_character, ch, u.id, body)
     return ch
 
+@router.post("/characters/{ch_id}/resources")
+async def apply_resource_deltas(
+    ch_id: int,
+    body: schemas.ResourceDeltas,
+    db: AsyncSession = Depends(get_db),
+    ch: CharacterHandle = Depends(get_character_handle),
+):
+    """Relative HUD change ({"hp": -7}) applied atomically server-side, so
+    concurrent edits from a DM and the player don't overwrite each other."""
+    row = await run_write(db, crud.apply_resource_deltas, ch_id, body.model_dump())
+    if not row:
+        raise HTTPException(404, "Character not found")
+    return row
+
 @router.post("/characters")
 async def create_character(
     body: schemas.CharacterCreate,
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ch = await crud.create_character(db, u.id, body.name)
+    ch = await run_write(db, crud.create_character, u.id, body.name)
     return {"id": ch.id, "name": ch.name}
 
 
@@ -199,7 +255,7 @@ async def delete_character(
     db: AsyncSession = Depends(get_db),
     u: User = Depends(get_current_user),
 ):
-    ok = await crud.delete_character(db, u.id, ch_id)
+    ok = await run_write(db, crud.delete_character, u.id, ch_id)
     if not ok:
         raise HTTPException(404, "Character not found")
     return {"status": "ok"}
@@ -210,16 +266,16 @@ async def add_item(
     ch_id: int,
     body: schemas.ItemCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    it = await crud.add_item(db, ch_id, body.name, body.description, body.stats, body.qty)
+    it = await run_write(db, crud.add_item, ch_id, body.name, body.description, body.stats, body.qty)
     return {"id": it.id, "name": it.name, "description": it.description, "stats": it.stats, "qty": it.qty}
 
 @router.get("/characters/{ch_id}/items")
 async def list_items(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     items = await crud.list_items(db, ch_id)
 
@@ -239,9 +295,9 @@ async def delete_item(
     ch_id: int,
     item_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ok = await crud.delete_item(db, item_id)
+    ok = await run_write(db, crud.delete_item, item_id)
     if not ok:
         raise HTTPException(404, "Item not found")
 
@@ -253,9 +309,9 @@ async def patch_item(
     item_id: int,
     data: schemas.ItemUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.update_item(db, ch_id, item_id, data)
+    obj = await run_write(db, crud.update_item, ch_id, item_id, data)
     if not obj:
         raise HTTPException(status_code=404, detail="Item not found")
 
@@ -270,8 +326,8 @@ async def patch_item(
 @router.get("/characters/{ch_id}/spells")
 async def list_spells(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     spells = await crud.list_spells(db, ch_id)
     return [
@@ -294,9 +350,9 @@ async def add_spell(
     ch_id: int,
     body: schemas.SpellCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    sp = await crud.add_spell(db, ch_id, body.model_dump())
+    sp = await run_write(db, crud.add_spell, ch_id, body.model_dump())
     return {"id": sp.id}
 
 
@@ -305,9 +361,9 @@ async def delete_spell(
     ch_id: int,
     spell_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ok = await crud.delete_spell(db, spell_id)
+    ok = await run_write(db, crud.delete_spell, spell_id)
     if not ok:
         raise HTTPException(404, "Spell not found")
     return {"status": "deleted"}
@@ -320,8 +376,8 @@ async def delete_spell(
 @router.get("/characters/{ch_id}/abilities")
 async def list_abilities(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     abilities = await crud.list_abilities(db, ch_id)
     return [
@@ -344,9 +400,9 @@ async def add_ability(
     ch_id: int,
     body: schemas.AbilityCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ab = await crud.add_ability(db, ch_id, body.model_dump())
+    ab = await run_write(db, crud.add_ability, ch_id, body.model_dump())
     return {"id": ab.id}
 
 
@@ -355,9 +411,9 @@ async def delete_ability(
     ch_id: int,
     ability_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ok = await crud.delete_ability(db, ability_id)
+    ok = await run_write(db, crud.delete_ability, ability_id)
     if not ok:
         raise HTTPException(404, "Ability not found")
     return {"status": "deleted"}
@@ -370,8 +426,8 @@ async def delete_ability(
 @router.get("/characters/{ch_id}/states")
 async def list_states(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     states = await crud.list_states(db, ch_id)
     return [
@@ -391,9 +447,9 @@ async def patch_spell(
     spell_id: int,
     data: schemas.SpellUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.update_spell(db, ch_id, spell_id, data)
+    obj = await run_write(db, crud.update_spell, ch_id, spell_id, data)
     if not obj:
         raise HTTPException(404, "Spell not found")
 
@@ -406,9 +462,9 @@ async def patch_ability(
     ability_id: int,
     data: schemas.AbilityUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.update_ability(db, ch_id, ability_id, data)
+    obj = await run_write(db, crud.update_ability, ch_id, ability_id, data)
     if not obj:
         raise HTTPException(404, "Ability not found")
 
@@ -421,9 +477,9 @@ async def patch_state(
     state_id: int,
     data: schemas.StateUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.update_state(db, ch_id, state_id, data)
+    obj = await run_write(db, crud.update_state, ch_id, state_id, data)
     if not obj:
         raise HTTPException(404, "State not found")
 
@@ -435,9 +491,9 @@ async def add_state(
     ch_id: int,
     body: schemas.StateCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    st = await crud.add_state(db, ch_id, body.model_dump())
+    st = await run_write(db, crud.add_state, ch_id, body.model_dump())
     return {"id": st.id}
 
 
@@ -446,9 +502,9 @@ async def delete_state(
     ch_id: int,
     state_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ok = await crud.delete_state(db, state_id)
+    ok = await run_write(db, crud.delete_state, state_id)
     if not ok:
         raise HTTPException(404, "State not found")
     return {"status": "deleted"}
@@ -462,9 +518,12 @@ async def delete_state(
 async def get_equipment(
     ch_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    eq = await crud.get_or_create_equipment(db, ch_id)
+    eq = await crud.get_equipment(db, ch_id)
+    if eq is None:
+        # first open of a fresh character
+        eq = await run_write(db, crud.get_or_create_equipment, ch_id)
     return {
         "head": eq.head,
         "armor": eq.armor,
@@ -488,9 +547,9 @@ async def update_equipment(
     ch_id: int,
     body: schemas.EquipmentUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    eq = await crud.update_equipment(db, ch_id, body.model_dump(exclude_unset=True))
+    eq = await run_write(db, crud.update_equipment, ch_id, body.model_dump(exclude_unset=True))
     return {"status": "ok", "equipment": {"id": eq.id}}
 
 # =========================
@@ -500,8 +559,8 @@ async def update_equipment(
 @router.get("/characters/{ch_id}/summons")
 async def list_summons(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     rows = await crud.list_summons(db, ch_id)
     return [
@@ -524,9 +583,9 @@ async def add_summon(
     ch_id: int,
     body: schemas.SummonCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.add_summon(db, ch_id, body.model_dump())
+    obj = await run_write(db, crud.add_summon, ch_id, body.model_dump())
     return {"id": obj.id}
 
 
@@ -536,9 +595,9 @@ async def patch_summon(
     summon_id: int,
     body: schemas.SummonUpdate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    obj = await crud.update_summon(db, ch_id, summon_id, body)
+    obj = await run_write(db, crud.update_summon, ch_id, summon_id, body)
     if not obj:
         raise HTTPException(404, "Summon not found")
     return {"status": "ok"}
@@ -549,9 +608,9 @@ async def delete_summon(
     ch_id: int,
     summon_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    ok = await crud.delete_summon(db, summon_id)
+    ok = await run_write(db, crud.delete_summon, summon_id)
     if not ok:
         raise HTTPException(404, "Summon not found")
     return {"status": "deleted"}
@@ -563,8 +622,8 @@ async def delete_summon(
 @router.get("/characters/{ch_id}/log")
 async def list_action_log(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    db: AsyncSession = Depends(get_read_db),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
     entries = await crud.list_action_log(db, ch_id)
     return [
@@ -578,9 +637,9 @@ async def add_action_log(
     ch_id: int,
     body: schemas.ActionLogCreate,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    entry = await crud.add_action_log(db, ch_id, body.text)
+    entry = await run_write(db, crud.add_action_log, ch_id, body.text)
     return {"id": entry.id, "text": entry.text, "created_at": entry.created_at.isoformat()}
 
 
@@ -588,157 +647,276 @@ async def add_action_log(
 async def clear_action_log(
     ch_id: int,
     db: AsyncSession = Depends(get_db),
-    ch: Character = Depends(get_owned_or_dm_character),
+    ch: CharacterHandle = Depends(get_character_handle),
 ):
-    await crud.clear_action_log(db, ch_id)
+    await run_write(db, crud.clear_action_log, ch_id)
     return {"status": "ok"}
 
 # =========================
 # FULL SHEET (one call for webapp)
 # =========================
 
+def _sheet_character_out(character: Character) -> dict:
+    return {
+        "id": character.id,
+        "name": character.name,
+        "race": character.race,
+        "gender": character.gender,
+        "klass": character.klass,
+        "level": character.level,
+        "xp": character.xp,
+        "xp_per_level": character.xp_per_level,
+        "gold": getattr(character, "gold", 0),
+        "silver": getattr(character, "silver", 0),
+        "copper": getattr(character, "copper", 0),
+        "hp": character.hp,
+        "mana": character.mana,
+        "energy": character.energy,
+        "hp_max": character.hp_max,
+        "mana_max": character.mana_max,
+        "energy_max": character.energy_max,
+        "hp_per_level": character.hp_per_level,
+        "mana_per_level": character.mana_per_level,
+        "energy_per_level": character.energy_per_level,
+        "aggression": character.aggression,
+        "kindness": character.kindness,
+        "intellect": character.intellect,
+        "confidence": character.confidence,
+        "fearlessness": character.fearlessness,
+        "humor": character.humor,
+        "emotionality": character.emotionality,
+        "sociability": character.sociability,
+        "responsibility": character.responsibility,
+        "intimidation": character.intimidation,
+        "attentiveness": character.attentiveness,
+        "learnability": character.learnability,
+        "luck": character.luck,
+        "stealth": character.stealth,
+        "initiative": character.initiative,
+        "attack": character.attack,
+        "counterattack": character.counterattack,
+        "steps": character.steps,
+        "defense": character.defense,
+        "perm_armor": character.perm_armor,
+        "temp_armor": character.temp_armor,
+        "action_points": character.action_points,
+        "dodges": character.dodges,
+        "level_up_rules": character.level_up_rules,
+        "template_id": character.template_id,
+        "campaign_id": character.campaign_id,
+        "version": character.version,
+    }
+
+
+def _sheet_item_out(i) -> dict:
+    return {
+        "id": i.id,
+        "name": i.name,
+        "description": i.description,
+        "stats": i.stats,
+        "qty": i.qty,   # ← ОБЯЗАТЕЛЬНО
+    }
+
+
+def _sheet_spell_out(s) -> dict:
+    # spells and abilities share a shape
+    return {
+        "id": s.id,
+        "name": s.name,
+        "level": s.level,
+        "description": s.description,
+        "range": s.range,
+        "duration": s.duration,
+        "cost": s.cost,
+        "ap_cost": s.ap_cost,
+    }
+
+
+def _sheet_state_out(st) -> dict:
+    return {"id": st.id, "name": st.name, "hp_cost": st.hp_cost, "duration": st.duration, "is_active": st.is_active}
+
+
+def _sheet_equipment_out(equipment) -> dict:
+    return {
+        "head": equipment.head,
+        "armor": equipment.armor,
+        "back": equipment.back,
+        "hands": equipment.hands,
+        "legs": equipment.legs,
+        "feet": equipment.feet,
+        "weapon1": equipment.weapon1,
+        "weapon2": equipment.weapon2,
+        "belt": equipment.belt,
+        "ring1": equipment.ring1,
+        "ring2": equipment.ring2,
+        "ring3": equipment.ring3,
+        "ring4": equipment.ring4,
+        "jewelry": equipment.jewelry,
+    }
+
+
+def _sheet_summon_out(s) -> dict:
+    return {
+        "id": s.id,
+        "name": s.name,
+        "description": s.description,
+        "duration": s.duration,
+        "hp_ratio": s.hp_ratio,
+        "attack_ratio": s.attack_ratio,
+        "defense_ratio": s.defense_ratio,
+        "count": s.count,
+        "mana_ratio": s.mana_ratio,
+        "energy_ratio": s.energy_ratio,
+        "initiative_ratio": s.initiative_ratio,
+        "luck_ratio": s.luck_ratio,
+        "steps_ratio": s.steps_ratio,
+        "attack_range_ratio": s.attack_range_ratio,
+    }
+
+
+_SHEET_CHILD_OUT = {
+    "items": _sheet_item_out,
+    "spells": _sheet_spell_out,
+    "abilities": _sheet_spell_out,
+    "states": _sheet_state_out,
+    "summons": _sheet_summon_out,
+}
+
+
 @router.get("/characters/{ch_id}/sheet")
 async def get_full_sheet(
     ch_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    ch: Character = Depends(get_owned_or_dm_character),
+    if_none_match: str | None = Header(default=None),
+):
+    """For WebApp: one request returns everything, including template + custom values.
+
+    Tagged with Character.version, so the reload after every autosave is a
+    bodiless 304 whenever nothing actually changed."""
+    not_modified = _not_modified_or_tag(response, ch, if_none_match)
+    if not_modified:
+        return not_modified
+
+    # reuse the row the access check already loaded instead of re-fetching it
+    sheet = await crud.load_sheet(db, ch)
+
+    out = {"character": _sheet_character_out(sheet["character"])}
+    for kind, serialize in _SHEET_CHILD_OUT.items():
+        out[kind] = [serialize(row) for row in sheet.get(kind, [])]
+    out["equipment"] = _sheet_equipment_out(sheet["equipment"])
+    out["template"] = sheet.get("template")
+    out["custom_values"] = sheet.get("custom_values", {})
+    return out
+
+
+@router.get("/characters/{ch_id}/changes")
+async def get_sheet_changes(
+    ch_id: int,
+    since: int,
+    db: AsyncSession = Depends(get_read_db),
+    ch: Character = Depends(get_owned_or_dm_character),
+):
+    """Delta sync: only what changed after `since` (a `version` from a previous
+    /sheet or /changes response). Sections are omitted when untouched, child
+    lists carry changed/added rows only, `deleted` lists removed ids per kind.
+    With `full: true` every section is there and replaces what the client has
+    (since=0, or too far behind to delta)."""
+    changes = await crud.get_sheet_changes(db, ch, since)
+
+    out = {"version": changes["version"]}
+    if changes.get("full"):
+        out["full"] = True
+    if "character" in changes:
+        out["character"] = _sheet_character_out(changes["character"])
+    if "custom_values" in changes:
+        out["template"] = changes["template"]
+        out["custom_values"] = changes["custom_values"]
+    for kind, serialize in _SHEET_CHILD_OUT.items():
+        if kind in changes:
+            out[kind] = [serialize(row) for row in changes[kind]]
+    if "equipment" in changes:
+        out["equipment"] = _sheet_equipment_out(changes["equipment"])
+    if "deleted" in changes:
+        out["deleted"] = changes["deleted"]
+    return out
+
+
+# =========================
+# BATCH (combat HUD)
+# =========================
+
+_BATCH_MAX_OPS = 100
+
+_BATCH_CREATE_SCHEMAS = {
+    "items": schemas.ItemCreate,
+    "spells": schemas.SpellCreate,
+    "abilities": schemas.AbilityCreate,
+    "states": schemas.StateCreate,
+    "summons": schemas.SummonCreate,
+}
+
+_BATCH_UPDATE_SCHEMAS = {
+    "items": schemas.ItemUpdate,
+    "spells": schemas.SpellUpdate,
+    "abilities": schemas.AbilityUpdate,
+    "states": schemas.StateUpdate,
+    "summons": schemas.SummonUpdate,
+}
+
+
+def _validate_batch_op(op: schemas.BatchOp) -> dict:
+    """Turn a raw BatchOp into the typed form crud.apply_sheet_batch expects.
+    Raises ValueError (pydantic's ValidationError is one) on a malformed op."""
+    if op.op == "patch_character":
+        return {"op": op.op, "data": schemas.CharacterUpdate.model_validate(op.data)}
+    if op.op == "log":
+        if not (op.text or "").strip():
+            raise ValueError("text is required")
+        return {"op": op.op, "text": op.text}
+    if op.op not in ("add", "update", "delete"):
+        raise ValueError(f"unknown op {op.op!r}")
+    if op.kind not in _BATCH_CREATE_SCHEMAS:
+        raise ValueError(f"unknown kind {op.kind!r}")
+    if op.op == "add":
+        return {"op": op.op, "kind": op.kind, "data": _BATCH_CREATE_SCHEMAS[op.kind].model_validate(op.data)}
+    if op.id is None:
+        raise ValueError("id is required")
+    if op.op == "update":
+        return {"op": op.op, "kind": op.kind, "id": op.id, "data": _BATCH_UPDATE_SCHEMAS[op.kind].model_validate(op.data)}
+    return {"op": op.op, "kind": op.kind, "id": op.id}
+
+
+@router.post("/characters/{ch_id}/batch")
+async def apply_batch(
+    ch_id: int,
+    body: schemas.CharacterBatch,
     db: AsyncSession = Depends(get_db),
+    u: User = Depends(get_current_user),
     ch: Character = Depends(get_owned_or_dm_character),
 ):
-    """For WebApp: one request returns everything, including template + custom values."""
-    sheet = await crud.get_sheet(db, ch_id, ch.owner_user_id)
-    if not sheet:
-        raise HTTPException(404, "Character not found")
+    """Several sheet edits + action-log lines in one request and one commit
+    (HP patch, state ticks, log lines of a single combat action)."""
+    if len(body.ops) > _BATCH_MAX_OPS:
+        raise HTTPException(400, f"At most {_BATCH_MAX_OPS} ops per batch")
 
-    # serialize ORM objects
-    character = sheet["character"]
-    equipment = sheet["equipment"]
+    ops = []
+    for i, op in enumerate(body.ops):
+        try:
+            ops.append(_validate_batch_op(op))
+        except ValueError as e:
+            raise HTTPException(422, f"ops[{i}]: {e}")
 
-    return {
-        "character": {
-            "id": character.id,
-            "name": character.name,
-            "race": character.race,
-            "gender": character.gender,
-            "klass": character.klass,
-            "level": character.level,
-            "xp": character.xp,
-            "xp_per_level": character.xp_per_level,
-            "gold": getattr(character, "gold", 0),
-            "silver": getattr(character, "silver", 0),
-            "copper": getattr(character, "copper", 0),
-            "hp": character.hp,
-            "mana": character.mana,
-            "energy": character.energy,
-            "hp_max": character.hp_max,
-            "mana_max": character.mana_max,
-            "energy_max": character.energy_max,
-            "hp_per_level": character.hp_per_level,
-            "mana_per_level": character.mana_per_level,
-            "energy_per_level": character.energy_per_level,
-            "aggression": character.aggression,
-            "kindness": character.kindness,
-            "intellect": character.intellect,
-            "confidence": character.confidence,
-            "fearlessness": character.fearlessness,
-            "humor": character.humor,
-            "emotionality": character.emotionality,
-            "sociability": character.sociability,
-            "responsibility": character.responsibility,
-            "intimidation": character.intimidation,
-            "attentiveness": character.attentiveness,
-            "learnability": character.learnability,
-            "luck": character.luck,
-            "stealth": character.stealth,
-            "initiative": character.initiative,
-            "attack": character.attack,
-            "counterattack": character.counterattack,
-            "steps": character.steps,
-            "defense": character.defense,
-            "perm_armor": character.perm_armor,
-            "temp_armor": character.temp_armor,
-            "action_points": character.action_points,
-            "dodges": character.dodges,
-            "level_up_rules": character.level_up_rules,
-            "template_id": character.template_id,
-            "campaign_id": character.campaign_id,
-        },
-        "items": [
-            {
-                "id": i.id,
-                "name": i.name,
-                "description": i.description,
-                "stats": i.stats,
-                "qty": i.qty,   # ← ОБЯЗАТЕЛЬНО
-            }
-            for i in sheet["items"]
-        ],
-        "spells": [
-            {
-                "id": s.id,
-                "name": s.name,
-                "level": s.level,
-                "description": s.description,
-                "range": s.range,
-                "duration": s.duration,
-                "cost": s.cost,
-                "ap_cost": s.ap_cost,
-            }
-            for s in sheet["spells"]
-        ],
-        "abilities": [
-            {
-                "id": a.id,
-                "name": a.name,
-                "level": a.level,
-                "description": a.description,
-                "range": a.range,
-                "duration": a.duration,
-                "cost": a.cost,
-                "ap_cost": a.ap_cost,
-            }
-            for a in sheet["abilities"]
-        ],
-        "states": [
-            {"id": st.id, "name": st.name, "hp_cost": st.hp_cost, "duration": st.duration, "is_active": st.is_active}
-            for st in sheet["states"]
-        ],
-        "equipment": {
-            "head": equipment.head,
-            "armor": equipment.armor,
-            "back": equipment.back,
-            "hands": equipment.hands,
-            "legs": equipment.legs,
-            "feet": equipment.feet,
-            "weapon1": equipment.weapon1,
-            "weapon2": equipment.weapon2,
-            "belt": equipment.belt,
-            "ring1": equipment.ring1,
-            "ring2": equipment.ring2,
-            "ring3": equipment.ring3,
-            "ring4": equipment.ring4,
-            "jewelry": equipment.jewelry,
-        },
-        "summons": [
-            {
-                "id": s.id,
-                "name": s.name,
-                "description": s.description,
-                "duration": s.duration,
-                "hp_ratio": s.hp_ratio,
-                "attack_ratio": s.attack_ratio,
-                "defense_ratio": s.defense_ratio,
-                "count": s.count,
-                "mana_ratio": s.mana_ratio,
-                "energy_ratio": s.energy_ratio,
-                "initiative_ratio": s.initiative_ratio,
-                "luck_ratio": s.luck_ratio,
-                "steps_ratio": s.steps_ratio,
-                "attack_range_ratio": s.attack_range_ratio,
-            }
-            for s in sheet.get("summons", [])
-        ],
-        "template": sheet.get("template"),
-        "custom_values": sheet.get("custom_values", {}),
-    }
+    async def _apply(session: AsyncSession, character: Character):
+        ok, results = await crud.apply_sheet_batch(session, character, u.id, ops)
+        # after a failed batch the row is rolled back/expired — nothing to report
+        return ok, results, character.version if ok else None
+
+    ok, results, version = await run_write(db, _apply, ch)
+    if not ok:
+        raise HTTPException(404, results)
+    return {"status": "ok", "version": version, "results": results}
 
 
 # =========================
@@ -748,7 +926,7 @@ async def get_full_sheet(
 @router.get("/characters/{ch_id}/export")
 async def export_character_sheet(
     ch_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
 
@@ -765,7 +943,7 @@ async def import_character_sheet(
     u: User = Depends(get_current_user),
 ):
 
-    ch = await crud.import_sheet(db, u.id, body.model_dump())
+    ch = await run_write(db, crud.import_sheet, u.id, body.model_dump())
     return {"status": "ok", "character_id": ch.id}
 
 
@@ -775,7 +953,7 @@ async def import_character_sheet(
 
 @router.get("/templates")
 async def list_templates(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     u: User = Depends(get_current_user),
 ):
 
@@ -797,7 +975,7 @@ async def create_template(
     u: User = Depends(require_subscription),
 ):
 
-    t = await crud.create_template(db, u.id, body.name, body.config)
+    t = await run_write(db, crud.create_template, u.id, body.name, body.config)
     return {"status": "ok", "template_id": t.id}
 
 
@@ -808,7 +986,7 @@ async def delete_template(
     u: User = Depends(get_current_user),
 ):
 
-    ok = await crud.delete_template(db, u.id, template_id)
+    ok = await run_write(db, crud.delete_template, u.id, template_id)
     if not ok:
         raise HTTPException(404, "Template not found")
     return {"status": "ok"}
@@ -822,7 +1000,7 @@ async def create_character_from_template(
     u: User = Depends(get_current_user),
 ):
 
-    ch = await crud.create_character_from_template(db, u.id, template_id, body.name)
+    ch = await run_write(db, crud.create_character_from_template, u.id, template_id, body.name)
     if not ch:
         raise HTTPException(404, "Template not found")
     return {"status": "ok", "character_id": ch.id}
@@ -844,7 +1022,7 @@ async def apply_template(
     if not ch:
         raise HTTPException(404, "Character not found")
 
-    updated = await crud.apply_template_to_character(db, ch_id, u.id, body.template_id)
+    updated = await run_write(db, crud.apply_template_to_character, ch_id, u.id, body.template_id)
     if not updated:
         raise HTTPException(404, "Template not found")
 
@@ -863,7 +1041,7 @@ async def patch_custom_values(
     if not ch:
         raise HTTPException(404, "Character not found")
 
-    ok = await crud.update_custom_values(db, ch_id, u.id, body.values)
+    ok = await run_write(db, crud.update_custom_values, ch_id, u.id, body.values)
     if not ok:
         raise HTTPException(404, "Character not found")
 
@@ -65,6 +65,13 @@ class CharacterUpdate(BaseModel):
     campaign_id: Optional[int] = None
 
 
+class ResourceDeltas(BaseModel):
+    # относительные изменения: {"hp": -7, "mana": 3}
+    hp: int = 0
+    mana: int = 0
+    energy: int = 0
+
+
 class ItemCreate(BaseModel):
     name: str
     description: str = ""
@@ -229,6 +236,21 @@ class ActionLogCreate(BaseModel):
     text: str
 
 
+class BatchOp(BaseModel):
+    # "patch_character" | "add" | "update" | "delete" | "log"
+    op: str
+    # items | spells | abilities | states | summons (for add/update/delete)
+    kind: Optional[str] = None
+    id: Optional[int] = None
+    # CharacterUpdate for patch_character, <Kind>Create / <Kind>Update for add / update
+    data: Dict[str, Any] = {}
+    text: Optional[str] = None
+
+
+class CharacterBatch(BaseModel):
+    ops: list[BatchOp]
+
+
 class GenerateAccessCode(BaseModel):
     duration_days: int = 30
 
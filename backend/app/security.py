@@ -1,6 +1,7 @@
 import hmac
 import hashlib
 import time
+from collections import OrderedDict
 from urllib.parse import parse_qsl
 
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
@@ -13,10 +14,47 @@ _serializer = URLSafeTimedSerializer(settings.SESSION_SECRET, salt="dnd-session"
 _vk_state_serializer = URLSafeTimedSerializer(settings.SESSION_SECRET, salt="dnd-vk-state")
 
 
+# Both Telegram signing secrets depend on BOT_TOKEN alone — derive them once.
+# WebApp initData: HMAC("WebAppData", bot_token) (the current official scheme)
+_WEBAPP_SECRET_KEY = hmac.new(
+    key=b"WebAppData",
+    msg=settings.BOT_TOKEN.encode(),
+    digestmod=hashlib.sha256
+).digest()
+# Login Widget: sha256(bot_token)
+_LOGIN_WIDGET_SECRET_KEY = hashlib.sha256(settings.BOT_TOKEN.encode()).digest()
+
+# The Mini App sends the very same X-TG-INIT-DATA string with every request of
+# a session, so remember the ones that already passed verification:
+# sha256(init_data) -> (valid until, verified fields)
+_VERIFIED_INIT_DATA_MAX = 4096
+_verified_init_data: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+
+
 def verify_telegram_init_data(init_data: str) -> dict:
     if not init_data:
         raise ValueError("Empty initData")
 
+    digest = hashlib.sha256(init_data.encode()).digest()
+    cached = _verified_init_data.get(digest)
+    if cached is not None:
+        valid_until, data = cached
+        if time.time() > valid_until:
+            del _verified_init_data[digest]
+            raise ValueError("Telegram initData expired")
+        _verified_init_data.move_to_end(digest)
+        return dict(data)
+
+    data = _verify_telegram_init_data(init_data)
+
+    valid_until = int(data["auth_date"]) + settings.TELEGRAM_AUTH_MAX_AGE_SECONDS
+    _verified_init_data[digest] = (valid_until, data)
+    if len(_verified_init_data) > _VERIFIED_INIT_DATA_MAX:
+        _verified_init_data.popitem(last=False)
+    return dict(data)
+
+
+def _verify_telegram_init_data(init_data: str) -> dict:
     data = dict(parse_qsl(init_data, keep_blank_values=True))
 
     if "hash" not in data:
@@ -24,19 +62,12 @@ def verify_telegram_init_data(init_data: str) -> dict:
 
     hash_from_telegram = data.pop("hash")
 
-    # ✅ ВАЖНО: новый официальный способ
-    secret_key = hmac.new(
-        key=b"WebAppData",
-        msg=settings.BOT_TOKEN.encode(),
-        digestmod=hashlib.sha256
-    ).digest()
-
     data_check_string = "\n".join(
         f"{k}={v}" for k, v in sorted(data.items())
     )
 
     hmac_hash = hmac.new(
-        secret_key,
+        _WEBAPP_SECRET_KEY,
         data_check_string.encode(),
         hashlib.sha256
     ).hexdigest()
@@ -68,10 +99,8 @@ def verify_telegram_login_widget(data: dict) -> dict:
         f"{k}={v}" for k, v in sorted(data.items()) if v is not None
     )
 
-    secret_key = hashlib.sha256(settings.BOT_TOKEN.encode()).digest()
-
     hmac_hash = hmac.new(
-        secret_key,
+        _LOGIN_WIDGET_SECRET_KEY,
         data_check_string.encode(),
         hashlib.sha256
     ).hexdigest()
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+
+# set on reader-pool sessions by deps.get_read_db
+READ_ONLY = "read_only"
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls: while one call for a key is in
+    flight, later callers await its result instead of running their own.
+
+    A follower can get a result whose queries started a moment before its
+    own request — fine for polling reads, which is why only functions marked
+    with @coalesced_read take part, and only on reader sessions (nothing on
+    them writes or lazy-loads). The leader's ORM objects are detached from
+    its session before anyone gets them, so no caller holds objects another
+    session may still refresh.
+    """
+
+    def __init__(self):
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        # function name -> [hits, misses]
+        self._counters: dict[str, list[int]] = {}
+
+    async def run(self, name: str, key: tuple, fn):
+        counters = self._counters.setdefault(name, [0, 0])
+        fut = self._inflight.get(key)
+        if fut is not None:
+            counters[0] += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # the leader's client went away mid-query: do it ourselves
+                return await fn()
+
+        counters[1] += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # followers still get it; this only keeps asyncio from logging
+            # it as never retrieved when there are none
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.SINGLE_FLIGHT_READS,
+            "functions": {
+                name: {"hits": hits, "misses": misses}
+                for name, (hits, misses) in sorted(self._counters.items())
+            },
+        }
+
+
+single_flight = SingleFlight()
+
+
+def _detach(db: AsyncSession, result):
+    """Expunge the ORM objects in `result` (an object, a list/tuple of them,
+    or None) and everything already loaded off them from `db`. What was
+    loaded stays readable; nothing is loaded any more."""
+    seen = set()
+    stack = [result]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+            continue
+        state = inspect(value, raiseerr=False)
+        if state is None or not hasattr(state, "unloaded") or id(value) in seen:
+            continue
+        seen.add(id(value))
+        for rel in state.mapper.relationships:
+            if rel.key not in state.unloaded:
+                stack.append(state.dict.get(rel.key))
+        if value in db:
+            db.expunge(value)
+    return result
+
+
+def coalesced_read(fn):
+    """Opt a crud read `fn(db, *args, **kwargs)` into single_flight, keyed by
+    its name and arguments, when `db` is a reader session."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        if not settings.SINGLE_FLIGHT_READS or not db.info.get(READ_ONLY):
+            return await fn(db, *args, **kwargs)
+
+        async def leader():
+            return _detach(db, await fn(db, *args, **kwargs))
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        return await single_flight.run(name, key, leader)
+
+    return wrapper
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from itertools import count
+
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .config import settings
+from .db import SessionLocal
+from .db_writer import sqlite_writer
+from .models import Character
+
+log = logging.getLogger("dnd.write_behind")
+
+# Fields the combat HUD autosave hammers (see scheduleCombatAutosave in the
+# webapp). Only these are ever buffered; everything else is written through.
+HOT_FIELDS = ("hp", "mana", "energy", "temp_armor", "action_points", "dodges")
+_FLOORED = ("hp", "mana", "energy")
+
+# session.info key: what take() handed to a transaction that hasn't committed yet
+TAKEN = "combat_taken"
+
+
+class CombatWriteBehind:
+    """Optional in-process write-behind buffer for HOT_FIELDS.
+
+    A PATCH that only moves hot fields is parked here instead of being
+    committed; a background task writes everything parked so far in one
+    executemany UPDATE per flush interval, so a burst of HUD clicks on six
+    characters becomes one write instead of dozens — and values that get
+    overwritten before the flush are never written at all.
+
+    Per-process by design: reads in *this* worker see buffered values
+    through overlay(), other workers don't. Only enable it for a
+    single-worker deployment (the SQLite setup it's meant for).
+    """
+
+    def __init__(self, enabled: bool, interval_seconds: float):
+        self.enabled = enabled
+        self.interval_seconds = interval_seconds
+        # character_id -> (generation, {field: value})
+        self._pending: dict[int, tuple[int, dict[str, int]]] = {}
+        self._generations = count(1)
+        # campaign_id -> generation of the last change absorbed for one of its
+        # characters; only ever grows, unlike _pending, which a flush empties
+        self._campaign_generations: dict[int, int] = {}
+        # held for the whole of a flush's write, so a writer that take()s a
+        # character's pending values can't commit before an in-flight flush
+        # of older values for the same character lands
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def absorb(self, ch: Character, payload: dict) -> bool:
+        """Buffer `payload` (a CharacterUpdate dump) if it changes nothing but
+        hot fields; returns False when it has to be written through instead.
+        On success `ch` is overlaid with the new values for the response."""
+        if not self.enabled:
+            return False
+
+        values = {}
+        for key, value in payload.items():
+            if key in HOT_FIELDS:
+                if value is None:
+                    return False
+                values[key] = max(0, int(value)) if key in _FLOORED else int(value)
+            elif getattr(ch, key, None) != value:
+                return False
+        if not values:
+            return False
+
+        _, merged = self._pending.get(ch.id, (0, {}))
+        generation = next(self._generations)
+        self._pending[ch.id] = (generation, {**merged, **values})
+        if ch.campaign_id is not None:
+            self._campaign_generations[ch.campaign_id] = generation
+        self.overlay(ch)
+        return True
+
+    def overlay(self, ch: Character) -> None:
+        """Show buffered values on a freshly loaded row without marking it dirty."""
+        entry = self._pending.get(ch.id)
+        if entry:
+            for key, value in entry[1].items():
+                set_committed_value(ch, key, value)
+
+    def generation(self, character_id: int) -> int | None:
+        """Changes whenever the buffered values for a character do — folded into
+        the sheet ETag, since buffered writes don't bump Character.version."""
+        entry = self._pending.get(character_id)
+        return entry[0] if entry else None
+
+    def campaign_generation(self, campaign_id: int) -> int:
+        """Grows whenever a buffered change lands on one of the campaign's
+        characters — folded into the battle version (battle_cache.battle_version),
+        since buffered writes don't bump CampaignBattle.version either."""
+        return self._campaign_generations.get(campaign_id, 0)
+
+    async def take(self, db, character_id: int) -> dict[str, int]:
+        """Hand a character's buffered values to a writer that is about to write
+        the row itself on `db` (so a later flush can't clobber it with older
+        values). They stay with the session until it commits: a rollback — or a
+        rewound writer unit — gives them back to the buffer."""
+        if not self._pending:
+            return {}
+        async with self._lock:
+            entry = self._pending.pop(character_id, None)
+        if not entry:
+            return {}
+        db.info.setdefault(TAKEN, []).append((self, character_id, dict(entry[1])))
+        return entry[1]
+
+    def give_back(self, character_id: int, values: dict[str, int]) -> None:
+        """Re-buffer values whose write didn't commit; anything absorbed since wins."""
+        _, current = self._pending.get(character_id, (0, {}))
+        self._pending[character_id] = (next(self._generations), {**values, **current})
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        if sqlite_writer.enabled:
+            # a unit like any other write; units run one at a time, so a
+            # take() in another unit can't land between snapshot and UPDATE
+            written = await sqlite_writer.run(self._write)
+        else:
+            async with SessionLocal() as db:
+                written = await self._write(db)
+
+        # keep anything re-buffered while we were writing for the next round
+        for character_id, generation in written.items():
+            current = self._pending.get(character_id)
+            if current and current[0] == generation:
+                del self._pending[character_id]
+
+    async def _write(self, db) -> dict[int, int]:
+        """Write everything buffered so far; returns {character_id: generation}
+        of what was written."""
+        async with self._lock:
+            if not self._pending:
+                return {}
+            snapshot = dict(self._pending)
+
+            # one executemany per distinct set of buffered fields
+            groups: dict[tuple[str, ...], list[dict]] = {}
+            for character_id, (_, values) in snapshot.items():
+                keys = tuple(sorted(values))
+                groups.setdefault(keys, []).append({"_id": character_id, **values})
+
+            table = Character.__table__
+            for keys, rows in groups.items():
+                stmt = (
+                    update(table)
+                    .where(table.c.id == bindparam("_id"))
+                    .values({
+                        **{key: bindparam(key) for key in keys},
+                        "version": table.c.version + 1,
+                        "fields_version": table.c.version + 1,
+                    })
+                )
+                await db.execute(stmt, rows)
+            # crud imports this module, hence the late import
+            from .crud import touch_battles
+            await touch_battles(db, list(snapshot))
+            await db.commit()
+        return {character_id: generation for character_id, (generation, _) in snapshot.items()}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                # values stay buffered and are retried on the next tick
+                log.exception("write-behind flush failed")
+
+    def start(self) -> None:
+        if self.enabled and settings.WEB_CONCURRENCY > 1:
+            # other workers would neither see the buffered values nor agree
+            # on battle versions (battle_cache.battle_version)
+            raise RuntimeError("COMBAT_WRITE_BEHIND needs a single worker (WEB_CONCURRENCY=1)")
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+def taken_mark(db) -> int:
+    """Position in the session's taken values, for give_back_taken_since."""
+    return len(db.info.get(TAKEN, ()))
+
+
+def give_back_taken_since(db, mark: int) -> None:
+    """Re-buffer what was taken after `mark` — for a rewound SAVEPOINT whose
+    outer transaction goes on to commit."""
+    taken = db.info.get(TAKEN, [])
+    for buffer, character_id, values in taken[mark:]:
+        buffer.give_back(character_id, values)
+    del taken[mark:]
+
+
+# like events.py: SAVEPOINTs fire these too, only the outermost transaction counts
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_taken(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop(TAKEN, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _give_back_taken(session: Session, transaction) -> None:
+    # still here: the transaction ended without committing
+    if transaction.parent is None:
+        give_back_taken_since(session, 0)
+
+
+combat_buffer = CombatWriteBehind(
+    enabled=settings.COMBAT_WRITE_BEHIND,
+    interval_seconds=settings.COMBAT_WRITE_BEHIND_INTERVAL_MS / 1000,
+)
@@ -0,0 +1,160 @@
+"""Load test of the cross-worker campaign event bus (EVENTS_BACKEND=sqlite).
+
+Starts WORKERS separate uvicorn processes on consecutive ports, all sharing
+one temp database and one events file, spreads SUBSCRIBERS SSE streams of a
+single campaign round-robin across them, then has the DM post MESSAGES
+campaign messages through the workers in turn. Every subscriber must see
+every message-created event, whichever worker it is connected to; the
+script reports delivery and publish-to-receive latency per worker.
+
+    python scripts/bench_events.py [--workers 4] [--subscribers 200] [--messages 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("SESSION_SECRET", "bench")
+
+from app.security import SESSION_COOKIE_NAME, create_session_cookie
+
+
+def start_worker(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def wait_healthy(port: int) -> None:
+    for _ in range(100):
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"worker on :{port} did not start")
+
+
+def client(port: int, tg_id: int) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        cookies={SESSION_COOKIE_NAME: create_session_cookie("telegram", tg_id, first_name=f"u{tg_id}")},
+        limits=httpx.Limits(max_connections=None),
+        timeout=httpx.Timeout(10, read=None),
+    )
+
+
+async def subscribe(c: httpx.AsyncClient, campaign_id: int, received: dict, ready: asyncio.Event) -> None:
+    async with c.stream("GET", f"/api/campaigns/{campaign_id}/events") as r:
+        r.raise_for_status()
+        event_type = None
+        async for line in r.aiter_lines():
+            if line.startswith("retry:"):
+                ready.set()
+            elif line.startswith("event: "):
+                event_type = line[7:]
+            elif line.startswith("data: ") and event_type == "message-created":
+                received[json.loads(line[6:])["id"]] = time.perf_counter()
+
+
+async def run(ports: list[int], subscribers: int, messages: int) -> None:
+    dm_clients = [client(port, 1) for port in ports]
+    dm = dm_clients[0]
+    campaign = (await dm.post("/api/campaigns", json={"name": "bench"})).json()
+    campaign_id = campaign["id"]
+
+    # subscriber i listens on worker i % len(ports)
+    received = [dict() for _ in range(subscribers)]
+    readies = [asyncio.Event() for _ in range(subscribers)]
+    tasks = [
+        asyncio.create_task(subscribe(dm_clients[i % len(ports)], campaign_id, received[i], readies[i]))
+        for i in range(subscribers)
+    ]
+    await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), 30)
+    print(f"{subscribers} subscribers connected across {len(ports)} workers")
+
+    sent_at = {}
+    for n in range(messages):
+        publisher = dm_clients[n % len(ports)]
+        started = time.perf_counter()
+        r = await publisher.post(f"/api/campaigns/{campaign_id}/messages", json={"text": f"bench {n}"})
+        sent_at[r.json()["id"]] = started
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(1.0)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for c in dm_clients:
+        await c.aclose()
+
+    print(f"{messages} messages published round-robin through the workers")
+    for w, port in enumerate(ports):
+        latencies = []
+        missing = 0
+        for i in range(w, subscribers, len(ports)):
+            for message_id, started in sent_at.items():
+                if message_id in received[i]:
+                    latencies.append((received[i][message_id] - started) * 1000)
+                else:
+                    missing += 1
+        latencies.sort()
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float("nan")
+        print(
+            f"worker :{port}  delivered {len(latencies):6d}  missing {missing:4d}  "
+            f"p50 {p(0.5):6.1f} ms  p95 {p(0.95):6.1f} ms  max {p(1.0):6.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8700)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_events_")
+    env = dict(
+        os.environ,
+        SQLITE_PATH=f"sqlite+aiosqlite:///{tmp}/app.sqlite3",
+        SQLITE_PROFILE="production",
+        EVENTS_BACKEND="sqlite",
+        EVENTS_SQLITE_PATH=f"{tmp}/events.sqlite3",
+        EVENTS_STREAM_MAX_SECONDS="600",
+        COOKIE_SECURE="false",
+        DEV_USER_IDS="1",
+    )
+    ports = [args.port + i for i in range(args.workers)]
+    workers = []
+    try:
+        # the first worker creates the schema before the others start
+        workers.append(start_worker(ports[0], env))
+        wait_healthy(ports[0])
+        workers += [start_worker(port, env) for port in ports[1:]]
+        for port in ports[1:]:
+            wait_healthy(port)
+        asyncio.run(run(ports, args.subscribers, args.messages))
+    finally:
+        for w in workers:
+            w.terminate()
+        for w in workers:
+            w.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
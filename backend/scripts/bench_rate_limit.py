@@ -0,0 +1,52 @@
+"""Flood the rate limiter with unique client IPs and watch its footprint.
+
+Every request comes from a new IP (the worst case for the old per-process
+defaultdict, which kept one deque per IP forever). Prints the number of
+tracked keys and traced memory as the flood goes on — both should level
+off at RATE_LIMIT_MAX_KEYS — plus the per-hit cost.
+
+    python scripts/bench_rate_limit.py [--backend memory|sqlite] [--requests 200000] [--max-keys 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("SESSION_SECRET", "bench")
+
+from app.rate_limit import MemoryRateLimiter, SqliteRateLimiter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--max-keys", type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(), "rate_limit.sqlite3")
+        limiter = SqliteRateLimiter(path, args.max_keys, sweep_interval=0.5)
+    else:
+        limiter = MemoryRateLimiter(args.max_keys)
+
+    tracemalloc.start()
+    checkpoint = max(1, args.requests // 10)
+    started = time.perf_counter()
+    print(f"{'requests':>10} {'keys':>8} {'traced KiB':>11}")
+    for i in range(1, args.requests + 1):
+        ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}:{i}"
+        limiter.hit(f"telegram-login:{ip}", 20, 60)
+        if i % checkpoint == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{i:>10} {len(limiter):>8} {current / 1024:>11.0f}")
+    elapsed = time.perf_counter() - started
+    print(f"{elapsed / args.requests * 1e6:.1f} µs/hit ({args.backend})")
+
+
+if __name__ == "__main__":
+    main()
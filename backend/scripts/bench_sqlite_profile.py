@@ -0,0 +1,124 @@
+"""Compare the "default" and "production" SQLITE_PROFILE under concurrent load.
+
+Each profile gets a fresh temp database with a few characters; WRITERS tasks
+then autosave random characters (UPDATE + commit, like PATCH /characters/{id})
+while READERS tasks keep loading rows, and the script reports throughput and
+how many operations failed with "database is locked".
+
+    python scripts/bench_sqlite_profile.py [--seconds 10] [--writers 8] [--readers 8]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# settings are only needed for the PRAGMA values; don't require a real .env
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("SESSION_SECRET", "bench")
+
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.db import apply_sqlite_pragmas, sqlite_pragmas
+from app.models import Base, Character, User
+
+CHARACTERS = 24
+
+
+def make_engine(path: str, profile: str):
+    url = f"sqlite+aiosqlite:///{path}"
+    if profile != "production":
+        return create_async_engine(url)
+    engine = create_async_engine(
+        url, pool_size=settings.SQLITE_POOL_SIZE, max_overflow=settings.SQLITE_POOL_SIZE,
+    )
+    pragmas = sqlite_pragmas()
+    event.listen(
+        engine.sync_engine, "connect",
+        lambda dbapi_connection, _record: apply_sqlite_pragmas(dbapi_connection, pragmas),
+    )
+    return engine
+
+
+async def seed(Session) -> list[int]:
+    async with Session() as db:
+        user = User(tg_id=1, first_name="bench")
+        db.add(user)
+        await db.flush()
+        chars = [Character(owner_user_id=user.id, name=f"bench {i}") for i in range(CHARACTERS)]
+        db.add_all(chars)
+        await db.commit()
+        return [c.id for c in chars]
+
+
+async def run_profile(profile: str, seconds: float, writers: int, readers: int) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    engine = make_engine(path, profile)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        ids = await seed(Session)
+
+        stats = {"writes": 0, "reads": 0, "locked": 0}
+        deadline = time.perf_counter() + seconds
+
+        async def writer():
+            while time.perf_counter() < deadline:
+                async with Session() as db:
+                    try:
+                        await db.execute(
+                            update(Character)
+                            .where(Character.id == random.choice(ids))
+                            .values(hp=random.randint(0, 100), mana=random.randint(0, 100))
+                        )
+                        await db.commit()
+                        stats["writes"] += 1
+                    except OperationalError as e:
+                        if "locked" not in str(e):
+                            raise
+                        stats["locked"] += 1
+
+        async def reader():
+            while time.perf_counter() < deadline:
+                async with Session() as db:
+                    try:
+                        await db.scalar(select(Character).where(Character.id == random.choice(ids)))
+                        stats["reads"] += 1
+                    except OperationalError as e:
+                        if "locked" not in str(e):
+                            raise
+                        stats["locked"] += 1
+
+        await asyncio.gather(*[writer() for _ in range(writers)], *[reader() for _ in range(readers)])
+        return {k: v / seconds if k != "locked" else v for k, v in stats.items()}
+    finally:
+        await engine.dispose()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile")
+    for profile in ("default", "production"):
+        r = await run_profile(profile, args.seconds, args.writers, args.readers)
+        print(f"{profile:>10}: {r['writes']:8.1f} writes/s  {r['reads']:8.1f} reads/s  "
+              f"{r['locked']} locked")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# settings are read at import time: point the app at a throwaway database
+# before anything imports it
+_tmp = tempfile.mkdtemp(prefix="dndsheet-tests-")
+os.environ["SQLITE_PATH"] = f"sqlite+aiosqlite:///{_tmp}/app.sqlite3"
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("SESSION_SECRET", "test")
+os.environ.setdefault("COOKIE_SECURE", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import perf  # noqa: E402
+from app.db import ReadSessionLocal, SessionLocal, _db_url, _make_writer_engine, init_db  # noqa: E402
+from app.db_writer import GroupCommitWriter, _UnitSession  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def schema(anyio_backend):
+    await init_db()
+
+
+@pytest.fixture
+async def db(schema):
+    async with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+async def read_db(schema):
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+async def writer(schema):
+    """A group-commit writer set up like SQLITE_WRITER_QUEUE's (its own
+    connection, driver autocommit, BEGIN IMMEDIATE); start() it to run."""
+    engine = _make_writer_engine(_db_url())
+    w = GroupCommitWriter(
+        async_sessionmaker(engine, expire_on_commit=False, class_=_UnitSession),
+        window_seconds=0.05,
+        max_group=10,
+    )
+    yield w
+    await w.stop()
+    await engine.dispose()
+
+
+@contextmanager
+def _counting():
+    stats = perf.RequestStats()
+    with perf.attribute_to(stats):
+        yield stats
+
+
+@pytest.fixture
+def count_queries():
+    """`with count_queries() as stats:` — statements run inside the block,
+    counted by the perf cursor hooks (stats.queries)."""
+    return _counting
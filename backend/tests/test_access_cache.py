@@ -0,0 +1,74 @@
+import itertools
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import crud
+from app.access_cache import CharacterHandle, access_cache
+from app.db import ReadSessionLocal, SessionLocal
+from app.deps import get_character_handle, get_owned_or_dm_character
+from app.schemas import CharacterUpdate
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(7000)
+
+
+def _request(method: str) -> Request:
+    return Request({"type": "http", "method": method, "headers": []})
+
+
+async def _resolve(dependency, ch_id: int, user, method: str = "GET"):
+    """The dependency as a request of its own would run it."""
+    async with SessionLocal() as db, ReadSessionLocal() as read_db:
+        return await dependency(ch_id, _request(method), db, read_db, user)
+
+
+async def _campaign_character(db):
+    """(DM, player, the player's character in the DM's campaign)."""
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    player = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="p")
+    campaign = await crud.create_campaign(db, dm.id, "access")
+    await crud.join_campaign(db, player.id, campaign.invite_code)
+    ch = await crud.create_character(db, player.id, "sheet")
+    await crud.update_character(db, ch, player.id, CharacterUpdate(campaign_id=campaign.id))
+    return dm, player, ch.id
+
+
+async def test_cache_hit_loads_the_campaign(db):
+    dm, _, ch_id = await _campaign_character(db)
+    await _resolve(get_owned_or_dm_character, ch_id, dm)
+    assert access_cache.get(dm.id, ch_id) is not None
+
+    ch = await _resolve(get_owned_or_dm_character, ch_id, dm)
+
+    # loaded with the row, not lazily (which raises outside a greenlet)
+    assert ch.campaign.dm_user_id == dm.id
+
+
+async def test_leaving_the_campaign_revokes_the_dm(db):
+    dm, player, ch_id = await _campaign_character(db)
+    await _resolve(get_character_handle, ch_id, dm)
+
+    async with SessionLocal() as session:
+        ch = await crud.get_character_by_id(session, ch_id)
+        await crud.update_character(session, ch, player.id, CharacterUpdate(campaign_id=None))
+
+    assert access_cache.get(dm.id, ch_id) is None
+    with pytest.raises(HTTPException) as e:
+        await _resolve(get_character_handle, ch_id, dm)
+    assert e.value.status_code == 403
+
+
+async def test_writes_ignore_cached_decisions(db):
+    dm, _, ch_id = await _campaign_character(db)
+    stranger = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="x")
+    # a grant another worker has since revoked
+    access_cache.put(stranger.id, CharacterHandle(ch_id, dm.id, None))
+
+    assert await _resolve(get_character_handle, ch_id, stranger, "GET")
+    for dependency in (get_character_handle, get_owned_or_dm_character):
+        with pytest.raises(HTTPException) as e:
+            await _resolve(dependency, ch_id, stranger, "PATCH")
+        assert e.value.status_code == 403
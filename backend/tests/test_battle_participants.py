@@ -0,0 +1,60 @@
+import itertools
+
+import pytest
+
+from app import crud
+from app.battle_cache import BattleSnapshot
+from app.db import SessionLocal
+from app.schemas import CharacterUpdate
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(5000)
+
+
+async def _call(fn, *args):
+    """One crud call in a session of its own, like one request."""
+    async with SessionLocal() as db:
+        return await fn(db, *args)
+
+
+async def _battle(db, initiatives: list[int]):
+    """A campaign whose DM owns one character per initiative, all in a battle."""
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    campaign = await crud.create_campaign(db, dm.id, "fight")
+    ids = []
+    for initiative in initiatives:
+        ch = await crud.create_character(db, dm.id, f"c{initiative}")
+        await crud.update_character(db, ch, dm.id, CharacterUpdate(campaign_id=campaign.id, initiative=initiative))
+        ids.append(ch.id)
+    assert await _call(crud.start_campaign_battle, campaign.id, dm.id, ids, True)
+    return dm.id, campaign.id, ids
+
+
+async def _view(campaign_id: int) -> dict | None:
+    battle = await _call(crud.get_campaign_battle, campaign_id)
+    return battle and BattleSnapshot(battle).view(0, is_dm=True)
+
+
+async def test_deleting_the_current_participant(db):
+    dm_id, campaign_id, (a, b, c) = await _battle(db, [30, 20, 10])
+    assert await _call(crud.advance_battle_turn, campaign_id, dm_id)
+    assert (await _view(campaign_id))["current_turn_character_id"] == b
+
+    # the turn passes to whoever came next
+    assert await _call(crud.delete_character, dm_id, b)
+    view = await _view(campaign_id)
+    assert [p["character_id"] for p in view["participants"]] == [a, c]
+    assert view["current_turn_character_id"] == c
+    assert [p["is_current_turn"] for p in view["participants"]] == [False, True]
+
+    # the last one: into the next round
+    assert await _call(crud.delete_character, dm_id, c)
+    view = await _view(campaign_id)
+    assert view["current_turn_character_id"] == a
+    assert view["round"] == 2
+    assert await _call(crud.advance_battle_turn, campaign_id, dm_id)
+
+    # nobody left: the battle is over
+    assert await _call(crud.delete_character, dm_id, a)
+    assert await _view(campaign_id) is None
@@ -0,0 +1,85 @@
+import asyncio
+import itertools
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import Update
+
+from app import crud
+from app.battle_cache import battle_cache
+from app.db import SessionLocal
+from app.schemas import CharacterUpdate
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(6000)
+
+
+async def _call(fn, *args):
+    """One crud call in a session of its own, like one request."""
+    async with SessionLocal() as db:
+        return await fn(db, *args)
+
+
+async def _battle(db):
+    """A battle of a player's character (first in turn) and two of the DM's."""
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    player = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="p")
+    campaign = await crud.create_campaign(db, dm.id, "turns")
+    await crud.join_campaign(db, player.id, campaign.invite_code)
+    ids = []
+    for owner, initiative in ((player, 30), (dm, 20), (dm, 10)):
+        ch = await crud.create_character(db, owner.id, f"c{initiative}")
+        await crud.update_character(db, ch, owner.id, CharacterUpdate(campaign_id=campaign.id, initiative=initiative))
+        ids.append(ch.id)
+    assert await _call(crud.start_campaign_battle, campaign.id, dm.id, ids, True)
+    return dm.id, player.id, campaign.id, ids
+
+
+async def test_racing_clicks_advance_once(db):
+    _, player_id, campaign_id, ids = await _battle(db)
+
+    results = await asyncio.gather(*(_call(crud.advance_battle_turn, campaign_id, player_id) for _ in range(8)))
+
+    advanced = [r for r in results if r is not None]
+    assert len(advanced) == 1
+    snapshot, is_dm = advanced[0]
+    assert not is_dm
+    assert snapshot.full["current_turn_character_id"] == ids[1]
+
+
+async def test_stale_turn_is_refused(db):
+    dm_id, player_id, campaign_id, _ = await _battle(db)
+    assert await _call(crud.advance_battle_turn, campaign_id, dm_id)
+
+    # the player's turn is over: a late click doesn't move the DM's on
+    assert await _call(crud.advance_battle_turn, campaign_id, player_id) is None
+
+
+async def test_cached_snapshot_is_not_reused_after_a_change(db):
+    dm_id, _, campaign_id, ids = await _battle(db)
+    battle_cache.put(campaign_id, await _call(crud.get_campaign_battle, campaign_id))
+    # bumps the version behind the cached snapshot's back
+    await _call(crud.apply_resource_deltas, ids[1], {"hp": -1})
+    hp = (await _call(crud.get_character_by_id, ids[1])).hp
+
+    snapshot, _ = await _call(crud.advance_battle_turn, campaign_id, dm_id)
+
+    assert snapshot.full["participants"][1]["hp"] == hp
+    assert snapshot.full["current_turn_character_id"] == ids[1]
+
+
+async def test_lock_error_is_a_lost_race(db, monkeypatch):
+    dm_id, _, campaign_id, _ = await _battle(db)
+
+    async with SessionLocal() as session:
+        execute = session.execute
+
+        async def locked(statement, *args, **kwargs):
+            if isinstance(statement, Update):
+                raise OperationalError("UPDATE", {}, sqlite3.OperationalError("database is locked"))
+            return await execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(session, "execute", locked)
+        assert await crud.advance_battle_turn(session, campaign_id, dm_id) is None
@@ -0,0 +1,67 @@
+import itertools
+
+import pytest
+
+from app import crud
+from app.battle_cache import battle_version
+from app.config import settings
+from app.db import SessionLocal
+from app.schemas import CharacterUpdate
+from app.write_behind import CombatWriteBehind, combat_buffer
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(9000)
+
+
+async def _battle(db):
+    """(campaign id, the DM's character) of a one-participant battle."""
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    campaign = await crud.create_campaign(db, dm.id, "versions")
+    ch = await crud.create_character(db, dm.id, "hud")
+    await crud.update_character(db, ch, dm.id, CharacterUpdate(campaign_id=campaign.id))
+    async with SessionLocal() as session:
+        assert await crud.start_campaign_battle(session, campaign.id, dm.id, [ch.id], True)
+    return campaign.id, ch
+
+
+async def _version(campaign_id: int) -> int:
+    async with SessionLocal() as db:
+        battle = await crud.get_campaign_battle(db, campaign_id)
+        return battle_version(campaign_id, battle.version)
+
+
+async def test_buffered_change_moves_the_battle_version(db, monkeypatch):
+    monkeypatch.setattr(combat_buffer, "enabled", True)
+    campaign_id, ch = await _battle(db)
+    owner, hp = ch.owner_user_id, ch.hp
+
+    before = await _version(campaign_id)
+    await crud.update_character(db, ch, owner, CharacterUpdate(hp=hp - 1))
+    assert combat_buffer.generation(ch.id) is not None
+    after = await _version(campaign_id)
+    assert after > before
+    await crud.update_character(db, ch, owner, CharacterUpdate(hp=hp - 2))
+    assert await _version(campaign_id) > after
+    after = await _version(campaign_id)
+
+    # the flush writes the row and bumps the battle: never back down
+    await combat_buffer.flush()
+    assert await _version(campaign_id) > after
+    # "no battle" is left alone
+    assert battle_version(campaign_id, 0) == 0
+
+
+async def test_without_the_buffer_it_is_the_stored_version(db):
+    campaign_id, _ = await _battle(db)
+    async with SessionLocal() as session:
+        stored = (await crud.get_campaign_battle(session, campaign_id)).version
+    assert await _version(campaign_id) == stored
+
+
+async def test_buffer_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 2)
+    with pytest.raises(RuntimeError):
+        CombatWriteBehind(enabled=True, interval_seconds=60).start()
+    # off, it doesn't care
+    CombatWriteBehind(enabled=False, interval_seconds=60).start()
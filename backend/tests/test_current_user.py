@@ -0,0 +1,59 @@
+import itertools
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app import crud
+from app.db import ReadSessionLocal, SessionLocal
+from app.deps import get_current_user
+from app.identity_cache import identity_cache
+from app.models import User
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(9700)
+
+
+def _profile(tg_id: int, first_name: str) -> dict:
+    return {"provider": "telegram", "user_key": tg_id, "first_name": first_name, "username": None}
+
+
+async def _resolve(profile: dict, tasks: BackgroundTasks) -> User:
+    """get_current_user as a request of its own would run it."""
+    async with ReadSessionLocal() as read_db:
+        return await get_current_user(tasks, read_db, profile)
+
+
+async def _stored_name(user_id: int) -> str:
+    async with SessionLocal() as db:
+        return (await db.get(User, user_id)).first_name
+
+
+def _no_write_session():
+    raise AssertionError("opened a write session")
+
+
+async def test_first_login_creates_the_user(schema):
+    tg_id = next(_tg_ids)
+
+    user = await _resolve(_profile(tg_id, "new"), BackgroundTasks())
+
+    assert user.tg_id == tg_id
+    assert await _stored_name(user.id) == "new"
+
+
+async def test_known_user_is_only_read(db, monkeypatch):
+    tg_id = next(_tg_ids)
+    known = await crud.get_or_create_user(db, tg_id=tg_id, first_name="old")
+    identity_cache.invalidate_user(known.id)
+    tasks = BackgroundTasks()
+
+    with monkeypatch.context() as m:
+        m.setattr("app.deps.SessionLocal", _no_write_session)
+        user = await _resolve(_profile(tg_id, "renamed"), tasks)
+
+    # the new name now, saved after the response
+    assert (user.id, user.first_name) == (known.id, "renamed")
+    assert await _stored_name(known.id) == "old"
+    await tasks()
+    assert await _stored_name(known.id) == "renamed"
@@ -0,0 +1,37 @@
+import itertools
+
+import pytest
+
+from app import crud
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(9500)
+
+
+async def _campaign(db, n_messages: int):
+    """(DM, player, message ids oldest first) of a fresh campaign."""
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    player = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="p")
+    campaign = await crud.create_campaign(db, dm.id, "inbox")
+    await crud.join_campaign(db, player.id, campaign.invite_code)
+    ids = [(await crud.send_campaign_message(db, campaign.id, dm.id, None, f"m{i}")).id for i in range(n_messages)]
+    return dm, player, ids
+
+
+async def _page(db, user_id: int, before_id: int | None) -> list[int]:
+    return [m.id for m, _, _ in await crud.list_inbox_messages(db, user_id, before_id=before_id, limit=2)]
+
+
+async def test_pages_back_through_the_inbox(db):
+    _, player, ids = await _campaign(db, 3)
+
+    assert await _page(db, player.id, None) == [ids[2], ids[1]]
+    assert await _page(db, player.id, ids[1]) == [ids[0]]
+
+
+async def test_foreign_cursor_gives_an_empty_page(db):
+    _, player, _ = await _campaign(db, 3)
+    _, _, foreign = await _campaign(db, 1)
+
+    assert await _page(db, player.id, foreign[0]) == []
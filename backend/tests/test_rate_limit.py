@@ -0,0 +1,31 @@
+import pytest
+
+from app.rate_limit import MemoryRateLimiter, SqliteRateLimiter
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_limiter(request, tmp_path):
+    def make(max_keys: int):
+        if request.param == "sqlite":
+            # no sweep during the test: the cap has to hold on its own
+            return SqliteRateLimiter(str(tmp_path / "rl.sqlite3"), max_keys, sweep_interval=3600)
+        return MemoryRateLimiter(max_keys, sweep_interval=3600)
+
+    return make
+
+
+def test_key_cap_holds_between_sweeps(make_limiter):
+    limiter = make_limiter(max_keys=3)
+
+    for ip in range(10):
+        assert limiter.hit(f"login:{ip}", limit=5, window_seconds=60)
+
+    assert len(limiter) == 3
+
+
+def test_bucket_runs_dry(make_limiter):
+    limiter = make_limiter(max_keys=10)
+
+    assert [limiter.hit("login:1", limit=2, window_seconds=60) for _ in range(3)] == [True, True, False]
+    # other clients have budgets of their own
+    assert limiter.hit("login:2", limit=2, window_seconds=60)
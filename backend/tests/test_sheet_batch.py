@@ -0,0 +1,90 @@
+import itertools
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from app import crud
+from app.db import SessionLocal
+from app.deps import get_current_user
+from app.models import Character, Item
+from app.routes import router
+
+pytestmark = pytest.mark.anyio
+
+# just the sheet routes: app.main also serves ../webapp, relative to the cwd
+app = FastAPI()
+app.include_router(router)
+
+_tg_ids = itertools.count(4300)
+
+
+@pytest.fixture(params=["session", "writer"])
+async def client(request, writer, monkeypatch):
+    """The API, with the request's own session or (SQLITE_WRITER_QUEUE)
+    the group-commit writer doing the writes."""
+    if request.param == "writer":
+        writer.start()
+        monkeypatch.setattr("app.deps.sqlite_writer", writer)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _character(db) -> Character:
+    user = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="p", username=None)
+    app.dependency_overrides[get_current_user] = lambda: user
+    return await crud.create_character(db, user.id, "batch")
+
+
+async def _stored(character_id: int) -> tuple[Character, list[str]]:
+    async with SessionLocal() as db:
+        ch = await db.get(Character, character_id)
+        q = await db.execute(select(Item.name).where(Item.character_id == character_id).order_by(Item.id))
+        return ch, list(q.scalars())
+
+
+async def test_ops_apply_in_one_version(db, client):
+    ch = await _character(db)
+
+    r = await client.post(f"/api/characters/{ch.id}/batch", json={"ops": [
+        {"op": "patch_character", "data": {"hp": 4}},
+        {"op": "add", "kind": "items", "data": {"name": "potion"}},
+        {"op": "log", "text": "drank a potion"},
+    ]})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body["results"]) == 3
+    stored, items = await _stored(ch.id)
+    assert (stored.hp, items) == (4, ["potion"])
+    # one bump for the whole batch
+    assert body["version"] == stored.version == ch.version + 1
+
+
+async def test_missing_row_rolls_everything_back(db, client):
+    ch = await _character(db)
+
+    r = await client.post(f"/api/characters/{ch.id}/batch", json={"ops": [
+        {"op": "patch_character", "data": {"name": "renamed"}},
+        {"op": "add", "kind": "items", "data": {"name": "potion"}},
+        {"op": "delete", "kind": "items", "id": 999999},
+    ]})
+
+    assert r.status_code == 404
+    stored, items = await _stored(ch.id)
+    assert (stored.name, stored.version, items) == ("batch", ch.version, [])
+
+
+async def test_malformed_op_is_refused_up_front(db, client):
+    ch = await _character(db)
+
+    r = await client.post(f"/api/characters/{ch.id}/batch", json={"ops": [
+        {"op": "add", "kind": "items", "data": {"name": "potion"}},
+        {"op": "update", "kind": "items", "data": {"name": "no id"}},
+    ]})
+
+    assert r.status_code == 422
+    assert "ops[1]" in r.json()["detail"]
+    assert (await _stored(ch.id))[1] == []
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import func, select
+
+from app import crud
+from app.config import settings
+from app.models import Character, Item, SheetTombstone
+
+pytestmark = pytest.mark.anyio
+
+
+async def _character(db, tg_id: int) -> Character:
+    user = await crud.get_or_create_user(db, tg_id=tg_id, first_name="p", username=None)
+    return await crud.create_character(db, user.id, "delta")
+
+
+async def _changes(read_db, character_id: int, since: int) -> dict:
+    ch = await read_db.get(Character, character_id, populate_existing=True)
+    return await crud.get_sheet_changes(read_db, ch, since)
+
+
+async def test_since_zero_is_a_full_sync(db, read_db):
+    ch = await _character(db, 2001)
+    await crud.add_item(db, ch.id, "sword", "")
+
+    changes = await _changes(read_db, ch.id, 0)
+
+    assert changes["full"] is True
+    assert changes["character"].id == ch.id
+    assert [i.name for i in changes["items"]] == ["sword"]
+    assert "equipment" in changes and "custom_values" in changes
+
+
+async def test_delta_lists_deleted_rows(db, read_db):
+    ch = await _character(db, 2002)
+    item = await crud.add_item(db, ch.id, "sword", "")
+    since = (await _changes(read_db, ch.id, 0))["version"]
+
+    await crud.delete_item(db, item.id)
+    changes = await _changes(read_db, ch.id, since)
+
+    assert "full" not in changes
+    assert changes["deleted"]["items"] == [item.id]
+
+
+async def test_tombstones_are_pruned_and_old_clients_resync(db, read_db, monkeypatch):
+    monkeypatch.setattr(settings, "SHEET_TOMBSTONE_VERSIONS", 3)
+    ch = await _character(db, 2003)
+    since = (await _changes(read_db, ch.id, 0))["version"]
+    items = [await crud.add_item(db, ch.id, f"item {i}", "") for i in range(6)]
+    for item in items[:5]:
+        await crud.delete_item(db, item.id)
+
+    kept = await db.scalar(select(func.count()).where(SheetTombstone.character_id == ch.id))
+    assert kept <= 3
+
+    stale = await _changes(read_db, ch.id, since)
+    assert stale["full"] is True
+    assert [i.id for i in stale["items"]] == [items[5].id]
+
+    recent = await _changes(read_db, ch.id, stale["version"] - 1)
+    assert "full" not in recent
+    assert recent["deleted"]["items"] == [items[4].id]
+
+
+async def test_deleting_a_character_drops_its_tombstones(db):
+    ch = await _character(db, 2004)
+    item = await crud.add_item(db, ch.id, "sword", "")
+    await crud.delete_item(db, item.id)
+
+    assert await crud.delete_character(db, ch.owner_user_id, ch.id)
+    assert await db.scalar(select(func.count()).where(SheetTombstone.character_id == ch.id)) == 0
+    assert await db.get(Item, item.id) is None
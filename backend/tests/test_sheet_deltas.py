@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app import crud
+from app.db import SessionLocal
+from app.models import Character
+from app.schemas import CharacterUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+async def _character(db, tg_id: int, **values) -> Character:
+    user = await crud.get_or_create_user(db, tg_id=tg_id, first_name="p", username=None)
+    ch = await crud.create_character(db, user.id, "deltas")
+    await crud.update_character(db, ch, user.id, CharacterUpdate(**values))
+    return ch
+
+
+async def _deltas(character_id: int, deltas: dict) -> dict | None:
+    """apply_resource_deltas in a session of its own, like one request."""
+    async with SessionLocal() as db:
+        return await crud.apply_resource_deltas(db, character_id, deltas)
+
+
+async def test_returns_the_new_values(db):
+    ch = await _character(db, 4101, hp=10, mana=5, energy=3)
+
+    out = await _deltas(ch.id, {"hp": -4, "mana": 2})
+
+    assert (out["hp"], out["mana"], out["energy"]) == (6, 7, 3)
+    assert out["version"] > ch.version
+    stored = await db.get(Character, ch.id, populate_existing=True)
+    assert (stored.hp, stored.mana, stored.version) == (6, 7, out["version"])
+
+
+async def test_floored_at_zero_without_an_upper_clamp(db):
+    ch = await _character(db, 4102, hp=3, hp_max=10, mana=1)
+
+    out = await _deltas(ch.id, {"hp": -20, "mana": 50})
+
+    assert out["hp"] == 0
+    assert out["mana"] == 51
+
+
+async def test_concurrent_deltas_both_land(db):
+    ch = await _character(db, 4103, hp=20)
+
+    await asyncio.gather(*(_deltas(ch.id, {"hp": -1}) for _ in range(5)))
+
+    assert (await db.get(Character, ch.id, populate_existing=True)).hp == 15
+
+
+async def test_missing_character(schema):
+    assert await _deltas(999999, {"hp": -1}) is None
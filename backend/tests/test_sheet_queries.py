@@ -0,0 +1,35 @@
+import pytest
+
+from app import crud
+from app.models import Character
+
+pytestmark = pytest.mark.anyio
+
+# character (+ equipment, template joined in) and one selectin per collection:
+# items, spells, abilities, states, summons
+SHEET_QUERIES = 6
+
+
+async def _fill(db, character_id: int, n: int) -> None:
+    for i in range(n):
+        await crud.add_item(db, character_id, f"item {i}", "")
+        await crud.add_spell(db, character_id, {"name": f"spell {i}"})
+        await crud.add_ability(db, character_id, {"name": f"ability {i}"})
+        await crud.add_state(db, character_id, {"name": f"state {i}"})
+        await crud.add_summon(db, character_id, {"name": f"summon {i}"})
+
+
+@pytest.mark.parametrize("rows", [0, 1, 20])
+async def test_sheet_load_runs_fixed_queries(db, read_db, count_queries, rows):
+    user = await crud.get_or_create_user(db, tg_id=1000 + rows, first_name="p", username=None)
+    ch = await crud.create_character(db, user.id, "sheet")
+    await crud.get_or_create_equipment(db, ch.id)
+    await _fill(db, ch.id, rows)
+
+    ch = await read_db.get(Character, ch.id)
+    with count_queries() as stats:
+        sheet = await crud.load_sheet(read_db, ch)
+
+    assert stats.queries == SHEET_QUERIES
+    assert len(sheet["items"]) == rows
+    assert len(sheet["summons"]) == rows
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app import crud
+from app.db import SessionLocal
+from app.models import Character, Item
+from app.schemas import CharacterUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+async def _character(db, tg_id: int) -> Character:
+    user = await crud.get_or_create_user(db, tg_id=tg_id, first_name="p", username=None)
+    ch = await crud.create_character(db, user.id, "grouped")
+    await crud.update_character(db, ch, user.id, CharacterUpdate(hp=10))
+    return ch
+
+
+async def _item_names(character_id: int) -> list[str]:
+    async with SessionLocal() as db:
+        q = await db.execute(select(Item.name).where(Item.character_id == character_id))
+        return list(q.scalars())
+
+
+async def _stored_hp(character_id: int) -> int:
+    async with SessionLocal() as db:
+        return (await db.get(Character, character_id)).hp
+
+
+async def test_failed_unit_rolls_back_alone(db, writer):
+    a = await _character(db, 4201)
+    b = await _character(db, 4202)
+
+    async def add_to_a(wdb):
+        return (await crud.add_item(wdb, a.id, "kept", "")).name
+
+    async def add_to_b_then_fail(wdb):
+        await crud.add_item(wdb, b.id, "lost", "")
+        await crud.apply_resource_deltas(wdb, b.id, {"hp": -5})
+        raise LookupError
+
+    async def hit_a(wdb):
+        return await crud.apply_resource_deltas(wdb, a.id, {"hp": -3})
+
+    # queued before the writer starts: one group, one commit
+    runs = [asyncio.ensure_future(writer.run(u)) for u in (add_to_a, add_to_b_then_fail, hit_a)]
+    await asyncio.sleep(0)
+    writer.start()
+    results = await asyncio.gather(*runs, return_exceptions=True)
+
+    assert results[0] == "kept"
+    assert isinstance(results[1], LookupError)
+    assert results[2]["hp"] == 7
+    assert await _item_names(a.id) == ["kept"]
+    assert await _stored_hp(a.id) == 7
+    # b's savepoint went, with both of its writes
+    assert await _item_names(b.id) == []
+    assert await _stored_hp(b.id) == 10
+
+
+async def test_unit_rolling_back_itself_keeps_the_group(db, writer):
+    a = await _character(db, 4203)
+
+    async def retried(wdb):
+        await crud.add_item(wdb, a.id, "first try", "")
+        await wdb.rollback()
+        return (await crud.add_item(wdb, a.id, "second try", "")).name
+
+    async def after(wdb):
+        return await crud.apply_resource_deltas(wdb, a.id, {"hp": 1})
+
+    runs = [asyncio.ensure_future(writer.run(u)) for u in (retried, after)]
+    await asyncio.sleep(0)
+    writer.start()
+    results = await asyncio.gather(*runs)
+
+    assert results[0] == "second try"
+    assert results[1]["hp"] == 11
+    assert await _item_names(a.id) == ["second try"]
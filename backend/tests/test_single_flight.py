@@ -0,0 +1,66 @@
+import asyncio
+import itertools
+
+import pytest
+from sqlalchemy import inspect
+
+from app import crud
+from app.config import settings
+from app.db import ReadSessionLocal
+from app.single_flight import single_flight
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(8000)
+
+
+@pytest.fixture
+def coalescing(monkeypatch):
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_READS", True)
+
+
+async def _read(fn, *args, **kwargs):
+    """One crud read on a reader session of its own, like one request."""
+    async with ReadSessionLocal() as db:
+        return await fn(db, *args, **kwargs)
+
+
+async def _read_campaign(campaign_id: int):
+    """get_campaign_by_id, plus which of the objects it returned belong to
+    some session (looked at while the caller's is still open)."""
+    async with ReadSessionLocal() as db:
+        campaign = await crud.get_campaign_by_id(db, campaign_id)
+        objects = [campaign, *campaign.members, *(m.user for m in campaign.members)]
+        return campaign, [o for o in objects if inspect(o).session is not None]
+
+
+def _hits() -> int:
+    return single_flight.stats()["functions"].get("get_campaign_by_id", {}).get("hits", 0)
+
+
+async def test_concurrent_readers_share_a_detached_result(db, coalescing):
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    campaign = await crud.create_campaign(db, dm.id, "shared")
+    hits = _hits()
+
+    results = await asyncio.gather(*(_read_campaign(campaign.id) for _ in range(5)))
+
+    assert _hits() > hits
+    for r, attached in results:
+        # nobody's session owns them, and what the query loaded is still there
+        assert attached == []
+        assert r.id == campaign.id
+        assert [m.user.id for m in r.members] == [dm.id]
+
+
+async def test_keyword_arguments_are_part_of_the_key(db, coalescing):
+    dm = await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="dm")
+    first = await crud.create_campaign(db, dm.id, "first")
+    second = await crud.create_campaign(db, dm.id, "second")
+
+    a, b = await asyncio.gather(
+        _read(crud.get_campaign_by_id, campaign_id=first.id),
+        _read(crud.get_campaign_by_id, campaign_id=second.id),
+    )
+
+    assert (a.name, b.name) == ("first", "second")
@@ -0,0 +1,108 @@
+import itertools
+
+import pytest
+from sqlalchemy import func, select
+
+from app import crud
+from app.db import SessionLocal
+from app.models import CampaignMember, CampaignMessage
+
+pytestmark = pytest.mark.anyio
+
+_tg_ids = itertools.count(3000)
+
+
+async def _call(fn, *args):
+    """One crud call in a session of its own, like one request."""
+    async with SessionLocal() as db:
+        return await fn(db, *args)
+
+
+async def _users(db, n: int):
+    return [await crud.get_or_create_user(db, tg_id=next(_tg_ids), first_name="u") for _ in range(n)]
+
+
+async def _count_by_scan(db, user_id: int) -> dict[int, int]:
+    """What the unread counters must agree with: messages visible to the user
+    since last_read_at, not sent by them."""
+    q = await db.execute(
+        select(CampaignMessage.campaign_id, func.count())
+        .join(
+            CampaignMember,
+            (CampaignMember.campaign_id == CampaignMessage.campaign_id) & (CampaignMember.user_id == user_id),
+        )
+        .where(
+            CampaignMember.last_read_at.is_(None) | (CampaignMessage.created_at > CampaignMember.last_read_at),
+            CampaignMessage.target_user_id.is_(None) | (CampaignMessage.target_user_id == user_id),
+            CampaignMessage.sender_user_id != user_id,
+        )
+        .group_by(CampaignMessage.campaign_id)
+    )
+    return dict(q.all())
+
+
+@pytest.mark.parametrize("campaigns", [1, 10, 50])
+async def test_unread_by_campaign_is_one_query(db, count_queries, campaigns):
+    dm, player, other = await _users(db, 3)
+    for i in range(campaigns):
+        campaign = await _call(crud.create_campaign, dm.id, f"c{i}")
+        if i % 4 == 0:
+            # messages sent before the player joined count as unread too
+            await _call(crud.send_campaign_message, campaign.id, dm.id, None, "before")
+        for user in (player, other):
+            await _call(crud.join_campaign, user.id, campaign.invite_code)
+        for m in range(i % 5 + 1):
+            target = (None, player.id, other.id)[m % 3]
+            assert await _call(crud.send_campaign_message, campaign.id, dm.id, target, "hi")
+            if i % 3 == 0 and m == 1:
+                await _call(crud.mark_campaign_messages_read, campaign.id, player.id)
+
+    with count_queries() as stats:
+        grouped = await crud.count_unread_by_campaign(db, player.id)
+
+    assert stats.queries == 1
+    assert grouped == await _count_by_scan(db, player.id)
+
+
+async def test_unread_counters_follow_send_read_and_mark_all(db):
+    dm, player, other = await _users(db, 3)
+    first = await _call(crud.create_campaign, dm.id, "first")
+    second = await _call(crud.create_campaign, dm.id, "second")
+
+    async def send(campaign, target, text):
+        assert await _call(crud.send_campaign_message, campaign.id, dm.id, target, text)
+
+    async def unread(campaign, user):
+        return await _call(crud.count_unread_campaign_messages, campaign.id, user.id)
+
+    async def unread_by_campaign(user):
+        return await _call(crud.count_unread_by_campaign, user.id)
+
+    await send(first, None, "before join")
+    for campaign in (first, second):
+        await _call(crud.join_campaign, player.id, campaign.invite_code)
+        await _call(crud.join_campaign, other.id, campaign.invite_code)
+    assert await unread(first, player) == 1
+
+    await send(first, None, "all")
+    await send(first, other.id, "not for the player")
+    await send(first, player.id, "for the player")
+    await send(second, None, "elsewhere")
+
+    assert await unread(first, player) == 3
+    assert await unread_by_campaign(player) == {first.id: 3, second.id: 1}
+    assert await unread_by_campaign(player) == await _call(_count_by_scan, player.id)
+    assert await unread(first, other) == 3
+    assert await unread(first, dm) == 0
+
+    await _call(crud.mark_campaign_messages_read, first.id, player.id)
+    assert await unread_by_campaign(player) == {second.id: 1}
+
+    await send(first, None, "after read")
+    assert await unread_by_campaign(player) == {first.id: 1, second.id: 1}
+
+    await _call(crud.mark_all_campaign_messages_read, player.id)
+    assert await unread_by_campaign(player) == {}
+    assert await _call(_count_by_scan, player.id) == {}
+    # someone else's counters are left alone
+    assert await unread(first, other) == 4
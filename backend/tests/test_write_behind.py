@@ -0,0 +1,52 @@
+import pytest
+
+from app import crud
+from app.db import SessionLocal
+from app.models import Character
+from app.schemas import CharacterUpdate
+from app.write_behind import combat_buffer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def buffered(monkeypatch):
+    monkeypatch.setattr(combat_buffer, "enabled", True)
+    return combat_buffer
+
+
+async def _character(db, tg_id: int) -> Character:
+    user = await crud.get_or_create_user(db, tg_id=tg_id, first_name="p", username=None)
+    return await crud.create_character(db, user.id, "hud")
+
+
+async def _stored_hp(character_id: int) -> int:
+    async with SessionLocal() as db:
+        return (await db.get(Character, character_id)).hp
+
+
+async def test_failed_batch_keeps_buffered_values(db, buffered):
+    ch = await _character(db, 4001)
+    cid, owner, stored = ch.id, ch.owner_user_id, ch.hp
+    await crud.update_character(db, ch, owner, CharacterUpdate(hp=stored + 5))
+    assert buffered.generation(cid) is not None
+
+    ok, _ = await crud.apply_sheet_batch(db, ch, owner, [
+        {"op": "patch_character", "data": CharacterUpdate(name="renamed")},
+        {"op": "delete", "kind": "items", "id": 999999},
+    ])
+
+    # the batch took the buffered hp to write it, then rolled back: still buffered
+    assert not ok
+    assert buffered.generation(cid) is not None
+    assert await _stored_hp(cid) == stored
+
+    ch = await db.get(Character, cid, populate_existing=True)
+    ok, _ = await crud.apply_sheet_batch(db, ch, owner, [
+        {"op": "patch_character", "data": CharacterUpdate(name="renamed")},
+    ])
+
+    # this one committed it
+    assert ok
+    assert buffered.generation(cid) is None
+    assert await _stored_hp(cid) == stored + 5
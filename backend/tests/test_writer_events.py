@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app import crud, events
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def published(monkeypatch):
+    sent = []
+    monkeypatch.setattr(events.broker, "publish", lambda cid, type_, data: sent.append((cid, type_, data)))
+    return sent
+
+
+async def test_failed_unit_events_are_dropped(writer, published):
+    async def ok(db):
+        await crud.get_or_create_user(db, tg_id=3001, first_name="ok", username=None)
+        events.publish_after_commit(db, 1, "ok", {})
+
+    async def fails(db):
+        await crud.get_or_create_user(db, tg_id=3002, first_name="fails", username=None)
+        events.publish_after_commit(db, 2, "lost", {})
+        raise LookupError
+
+    async def rolls_back(db):
+        events.publish_after_commit(db, 3, "lost", {})
+        await db.rollback()
+        events.publish_after_commit(db, 3, "kept", {})
+
+    async def also_ok(db):
+        events.publish_after_commit(db, 4, "ok", {})
+        # nothing goes out before the group commits
+        assert published == []
+
+    # queued before the writer starts, so they all land in one group, in
+    # order: the failures only rewind their own savepoints
+    runs = [asyncio.ensure_future(writer.run(u)) for u in (ok, fails, rolls_back, also_ok)]
+    await asyncio.sleep(0)
+    writer.start()
+    results = await asyncio.gather(*runs, return_exceptions=True)
+
+    assert isinstance(results[1], LookupError)
+    assert results[3] is None
+    assert published == [(1, "ok", {}), (3, "kept", {}), (4, "ok", {})]
@@ -231,22 +231,109 @@ function syncKnownUnreadTotal() {
   lastKnownUnreadTotal = totalUnreadMessages();
 }
 
-function wireMessagesPolling() {
-  syncKnownUnreadTotal();
+async function refreshUnreadFromServer() {
+  await loadCampaigns();
+  const nextUnread = totalUnreadMessages();
+  if (nextUnread > lastKnownUnreadTotal) {
+    showBattleToast("📨 Новое сообщение от ДМ", "success");
+  }
+  lastKnownUnreadTotal = nextUnread;
+}
 
-  setInterval(async () => {
-    if (document.hidden) return;
-    try {
-      await loadCampaigns();
-      const nextUnread = totalUnreadMessages();
-      if (nextUnread > lastKnownUnreadTotal) {
-        showBattleToast("📨 Новое сообщение от ДМ", "success");
+// ===== Campaign events (SSE: GET /inbox/events — все компании одним потоком)
+// fetch + ReadableStream вместо EventSource: EventSource не умеет слать
+// заголовок X-TG-INIT-DATA, а в Mini App другой авторизации нет.
+// Один поток на пользователя: по потоку на компанию быстро съедают лимит
+// соединений браузера на origin, и обычные запросы встают в очередь за ними
+
+let campaignStream = null; // { key, ctrl }
+
+function syncCampaignStreams() {
+  // сервер берёт список компаний при подключении — при его смене переподключаемся
+  const ids = (state.campaigns || []).map((c) => c.id).sort((a, b) => a - b);
+  const key = ids.join(",");
+  if (campaignStream?.key === key) return;
+  campaignStream?.ctrl.abort();
+  campaignStream = ids.length ? { key, ctrl: openCampaignStream() } : null;
+}
+
+function openCampaignStream() {
+  const ctrl = new AbortController();
+  (async () => {
+    let connected = false;
+    while (!ctrl.signal.aborted) {
+      try {
+        const headers = new Headers();
+        const init = tgInitData();
+        if (init) headers.set("X-TG-INIT-DATA", init);
+        const res = await fetch(`${API_BASE}/api/inbox/events`, {
+          headers,
+          credentials: "include",
+          signal: ctrl.signal,
+        });
+        if (!res.ok || !res.body) throw new Error(`events ${res.status}`);
+        // сервер периодически закрывает поток — всё, что пришло между
+        // переподключениями, добираем обычными запросами
+        // (непрочитанное — по всем компаниям, бой — только у открытого персонажа)
+        if (connected) handleCampaignEvent(state.sheet?.character?.campaign_id, "resync", {});
+        connected = true;
+
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buf = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buf += value;
+          let sep;
+          while ((sep = buf.indexOf("\n\n")) >= 0) {
+            const chunk = buf.slice(0, sep);
+            buf = buf.slice(sep + 2);
+            let type = "message";
+            let data = "";
+            chunk.split("\n").forEach((line) => {
+              if (line.startsWith("event: ")) type = line.slice(7);
+              else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            if (data) {
+              const payload = JSON.parse(data);
+              handleCampaignEvent(payload.campaign_id, type, payload);
+            }
+          }
+        }
+      } catch (e) {
+        if (ctrl.signal.aborted) return;
+        console.error("Campaign events failed:", e);
+        await new Promise((r) => setTimeout(r, 3000));
       }
-      lastKnownUnreadTotal = nextUnread;
-    } catch (e) {
-      console.error("Messages poll failed:", e);
     }
-  }, 15000);
+  })();
+  return ctrl;
+}
+
+let groupBattleRefreshTimer = null;
+
+function scheduleGroupBattleRefresh(campaignId) {
+  if (getCombatInnerTabActive() !== "group") return;
+  if (state.sheet?.character?.campaign_id !== campaignId) return;
+  // HUD-автосейв шлёт событие на каждый клик — не перерисовываем на каждое
+  clearTimeout(groupBattleRefreshTimer);
+  groupBattleRefreshTimer = setTimeout(() => {
+    renderGroupBattlePanel().catch((e) => console.error("Group battle refresh failed:", e));
+  }, 300);
+}
+
+function handleCampaignEvent(campaignId, type, data) {
+  if (type === "message-created" || type === "resync") {
+    refreshUnreadFromServer().catch((e) => console.error("Messages refresh failed:", e));
+  }
+  if (type !== "message-created") {
+    scheduleGroupBattleRefresh(campaignId);
+  }
+}
+
+function wireCampaignEvents() {
+  syncKnownUnreadTotal();
+  syncCampaignStreams();
 }
 
 function renderMessagesBadge() {
@@ -274,6 +361,49 @@ function populateMessageTargets(campaignId) {
   });
 }
 
+const INBOX_PAGE_SIZE = 50;
+
+function renderInboxMessage(m) {
+  const row = document.createElement("div");
+  row.className = `item message-item${m.is_unread ? " is-unread" : ""}`;
+  const who = m.target_name ? `лично ${escapeHtml(m.target_name)}` : "всей компании";
+  const time = new Date(m.created_at).toLocaleString();
+  row.innerHTML = `
+    <div class="item-head">
+      <div class="min-w-0">
+        <div class="item-title">
+          ${m.is_unread ? `<span class="message-unread-dot" title="Непрочитано"></span>` : ""}
+          <span>${escapeHtml(m.campaign_name)}</span>
+        </div>
+        <div class="item-sub">${escapeHtml(m.sender_name)} → ${who} · ${escapeHtml(time)}</div>
+        <div class="item-sub">${escapeHtml(m.text)}</div>
+      </div>
+      <button class="btn btn-sm btn-outline-light message-delete-btn" type="button" data-msg-campaign="${m.campaign_id}" data-msg-id="${m.id}" title="Удалить у себя" aria-label="Удалить сообщение у себя">
+        <i class="bi bi-x-lg"></i>
+      </button>
+    </div>
+  `;
+  return row;
+}
+
+// дописывает в ленту страницу сообщений старше beforeId (null — с самых новых);
+// если страница полная, в конце остаётся кнопка за следующей
+async function appendInboxPage(root, beforeId) {
+  const params = new URLSearchParams({ limit: String(INBOX_PAGE_SIZE) });
+  if (beforeId) params.set("before_id", String(beforeId));
+  const page = await api(`/inbox?${params}`);
+  page.forEach((m) => root.appendChild(renderInboxMessage(m)));
+  if (page.length === INBOX_PAGE_SIZE) {
+    const more = document.createElement("button");
+    more.className = "btn btn-sm btn-outline-light w-100 messages-more-btn";
+    more.type = "button";
+    more.textContent = "Показать более старые";
+    more.setAttribute("data-before-id", String(page[page.length - 1].id));
+    root.appendChild(more);
+  }
+  return page.length;
+}
+
 async function renderMessagesModal() {
   const dmCampaigns = (state.campaigns || []).filter((c) => c.is_dm);
   const composeSection = el("msgComposeSection");
@@ -295,49 +425,35 @@ async function renderMessagesModal() {
     return;
   }
 
-  const perCampaign = await Promise.all(
-    myCampaigns.map(async (c) => {
-      const messages = await api(`/campaigns/${c.id}/messages`);
-      return messages.map((m) => ({ ...m, campaignId: c.id, campaignName: c.name }));
-    })
-  );
-  const all = perCampaign.flat().sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-
+  // одна лента по всем компаниям, уже отсортированная сервером (новые первыми);
+  // грузим страницами, более старые — по кнопке
   root.innerHTML = "";
-  if (all.length === 0) {
+  const count = await appendInboxPage(root, null);
+  if (count === 0) {
     root.innerHTML = `<div class="muted">Сообщений пока нет.</div>`;
-  } else {
-    all.forEach((m) => {
-      const row = document.createElement("div");
-      row.className = `item message-item${m.is_unread ? " is-unread" : ""}`;
-      const who = m.target_name ? `лично ${escapeHtml(m.target_name)}` : "всей компании";
-      const time = new Date(m.created_at).toLocaleString();
-      row.innerHTML = `
-        <div class="item-head">
-          <div class="min-w-0">
-            <div class="item-title">
-              ${m.is_unread ? `<span class="message-unread-dot" title="Непрочитано"></span>` : ""}
-              <span>${escapeHtml(m.campaignName)}</span>
-            </div>
-            <div class="item-sub">${escapeHtml(m.sender_name)} → ${who} · ${escapeHtml(time)}</div>
-            <div class="item-sub">${escapeHtml(m.text)}</div>
-          </div>
-          <button class="btn btn-sm btn-outline-light message-delete-btn" type="button" data-msg-campaign="${m.campaignId}" data-msg-id="${m.id}" title="Удалить у себя" aria-label="Удалить сообщение у себя">
-            <i class="bi bi-x-lg"></i>
-          </button>
-        </div>
-      `;
-      root.appendChild(row);
-    });
   }
 
   // отмечаем прочитанным всё, что видели в этой сессии просмотра
-  await Promise.all(myCampaigns.map((c) => api(`/campaigns/${c.id}/messages/read`, { method: "POST" })));
-  await loadCampaigns();
+  await api("/inbox/read", { method: "POST" });
+  myCampaigns.forEach((c) => { c.unread_count = 0; });
+  renderMessagesBadge();
   syncKnownUnreadTotal();
 }
 
 el("messagesList")?.addEventListener("click", async (e) => {
+  const more = e.target.closest(".messages-more-btn");
+  if (more) {
+    more.disabled = true;
+    const beforeId = more.getAttribute("data-before-id");
+    try {
+      await appendInboxPage(el("messagesList"), beforeId);
+      more.remove();
+    } finally {
+      more.disabled = false;
+    }
+    return;
+  }
+
   const btn = e.target.closest(".message-delete-btn");
   if (!btn) return;
 
@@ -459,15 +575,6 @@ el("btnEndGroupBattle")?.addEventListener("click", async () => {
   await renderGroupBattlePanel();
 });
 
-function wireGroupBattlePolling() {
-  setInterval(() => {
-    if (document.hidden) return;
-    if (getCombatInnerTabActive() !== "group") return;
-    if (!state.sheet?.character?.campaign_id) return;
-    renderGroupBattlePanel().catch((e) => console.error("Group battle poll failed:", e));
-  }, 6000);
-}
-
 el("btnCreateTpl")?.addEventListener("click", async () => {
   const name = el("tplName").value.trim();
   if (!name) return alert("Название шаблона обязательно");
@@ -2627,6 +2734,7 @@ async function loadCampaigns() {
   state.campaigns = await api("/campaigns");
   renderCampaignSelectOptions();
   renderMessagesBadge();
+  syncCampaignStreams();
 }
 
 function renderCampaignSelectOptions() {
@@ -3057,8 +3165,7 @@ async function boot() {
     await loadMe();
     await loadTemplates();
     await loadCampaigns();
-    wireMessagesPolling();
-    wireGroupBattlePolling();
+    wireCampaignEvents();
     await loadCharacters();
     if (state.characters.length === 0) setStatus("Персонажей нет. Создай нового 👆");
     await loadSheet();